@@ -0,0 +1,97 @@
+"""
+This file (bench_portfolio_reads.py) compares the throughput of concurrent views of
+portfolios (8 threads, each viewing the portfolio of its own user with 50 stocks)
+when applying the current prices to the stocks:
+    orm (before) - add every stock to the session, update each changed stock and
+                   commit on every view (previous implementation of `list_stocks`)
+    bulk (after) - apply the changed prices in a single conditional UPDATE statement,
+                   without a transaction if there is nothing to update (Stock.update_current_prices)
+
+The views are measured with the current prices already stored (the common case), and
+with every price changed on every view (the worst case), using a SQLite database file.
+
+Run from the top-level folder of the project:
+    python -m benchmarks.bench_portfolio_reads
+"""
+from datetime import datetime
+from threading import Barrier, Thread
+import os
+import tempfile
+import time
+
+
+NUMBER_OF_THREADS = 8
+NUMBER_OF_VIEWS = 100
+NUMBER_OF_STOCKS = 50
+
+
+def view_portfolio_orm(user_id: int, current_prices: dict):
+    stocks = database.session.execute(database.select(Stock).where(Stock.user_id == user_id)).scalars().all()
+    for stock in stocks:
+        # Previous implementation of `Stock.update_current_price()` (the totals of the portfolio
+        # are updated on flush, see `update_portfolio_summaries()`)
+        current_price = current_prices.get(stock.stock_symbol, 0.0)
+        if current_price > 0.0:
+            stock.current_price = int(current_price * 100)
+            stock.current_price_date = datetime.now()
+            stock.position_value = stock.current_price * stock.number_of_shares
+        database.session.add(stock)
+    database.session.commit()
+
+
+def view_portfolio_bulk(user_id: int, current_prices: dict):
+    stocks = database.session.execute(database.select(Stock).where(Stock.user_id == user_id)).scalars().all()
+    if Stock.update_current_prices(stocks, current_prices):
+        database.session.commit()
+
+
+def run_views(app, view, changed_prices: bool) -> float:
+    """Return the number of views per second with each thread viewing the portfolio of its own user."""
+    barrier = Barrier(NUMBER_OF_THREADS + 1)
+
+    def run(user_id: int):
+        with app.app_context():
+            barrier.wait()
+            for index in range(NUMBER_OF_VIEWS):
+                # The current prices are already stored, unless every price changes on each view
+                price = 100.0 + (index if changed_prices else 0)
+                current_prices = {f'S{number}': price for number in range(NUMBER_OF_STOCKS)}
+                view(user_id, current_prices if changed_prices else {})
+                database.session.remove()
+
+    threads = [Thread(target=run, args=(user_id,)) for user_id in range(1, NUMBER_OF_THREADS + 1)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return NUMBER_OF_THREADS * NUMBER_OF_VIEWS / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    database_file = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ['CONFIG_TYPE'] = 'config.TestingConfig'
+    os.environ['TEST_DATABASE_URI'] = f'sqlite:///{database_file}'
+
+    from project import create_app, database
+    from project.models import Stock
+
+    app = create_app()
+    with app.app_context():
+        database.create_all()
+        for user_id in range(1, NUMBER_OF_THREADS + 1):
+            for number in range(NUMBER_OF_STOCKS):
+                stock = Stock(f'S{number}', '10', '90.00', user_id, datetime(2020, 7, 1))
+                stock.current_price = 10000
+                stock.current_price_date = datetime.now()
+                stock.position_value = 100000
+                database.session.add(stock)
+        database.session.commit()
+
+    print(f'{NUMBER_OF_THREADS} threads x {NUMBER_OF_VIEWS} views of {NUMBER_OF_STOCKS} stocks')
+    for changed_prices in (False, True):
+        for name, view in [('orm (before)', view_portfolio_orm), ('bulk (after)', view_portfolio_bulk)]:
+            views_per_second = run_views(app, view, changed_prices)
+            scenario = 'prices changed' if changed_prices else 'prices current'
+            print(f'{scenario:>14}, {name:>12}: {views_per_second:8.0f} views per second')
@@ -0,0 +1,71 @@
+"""
+This file (bench_time_series_formats.py) compares the size and the time to parse
+20 years of weekly (adjusted) prices retrieved from Alpha Vantage as:
+    json - nested JSON payload (datatype=json) loaded with `json.loads()`
+    json (stream) - nested JSON payload parsed in chunks (parse_time_series)
+    csv (stream) - CSV payload (datatype=csv) parsed in chunks (parse_time_series_csv)
+
+The size is reported both uncompressed and gzip-compressed, as the responses
+are requested with 'Accept-Encoding: gzip'.
+
+Run from the top-level folder of the project:
+    python -m benchmarks.bench_time_series_formats
+"""
+from project.market_data.series import parse_time_series, parse_time_series_csv
+from datetime import datetime, timedelta
+import gzip
+import json
+import timeit
+
+
+SERIES_KEY = 'Weekly Adjusted Time Series'
+CHUNK_SIZE = 16 * 1024
+CSV_HEADER = 'timestamp,open,high,low,close,adjusted close,volume,dividend amount'
+
+
+def create_weeks(number_of_weeks: int) -> list:
+    """Create the weekly prices ordered latest to oldest, like the Alpha Vantage response."""
+    weeks = []
+    date = datetime(2024, 1, 5)
+    for week in range(number_of_weeks):
+        close = f'{100 + week % 50}.1200'
+        weeks.append((date.strftime('%Y-%m-%d'), [close, close, close, close, close, '123456789', '0.0000']))
+        date -= timedelta(weeks=1)
+    return weeks
+
+
+def create_json_payload(weeks: list) -> bytes:
+    fields = ['1. open', '2. high', '3. low', '4. close', '5. adjusted close', '6. volume', '7. dividend amount']
+    payload = {'Meta Data': {'1. Information': 'Weekly Adjusted Prices and Volumes', '2. Symbol': 'AAPL'},
+               SERIES_KEY: {date: dict(zip(fields, values)) for date, values in weeks}}
+    return json.dumps(payload, indent=4).encode()
+
+
+def create_csv_payload(weeks: list) -> bytes:
+    rows = [CSV_HEADER] + [','.join([date] + values) for date, values in weeks]
+    return '\r\n'.join(rows).encode() + b'\r\n'
+
+
+def iter_chunks(content: bytes):
+    for index in range(0, len(content), CHUNK_SIZE):
+        yield content[index:index + CHUNK_SIZE]
+
+
+if __name__ == '__main__':
+    weeks = create_weeks(20 * 52)
+    json_payload = create_json_payload(weeks)
+    csv_payload = create_csv_payload(weeks)
+    number = 50
+
+    assert parse_time_series(iter_chunks(json_payload), SERIES_KEY) == \
+        parse_time_series_csv(iter_chunks(csv_payload), SERIES_KEY)
+
+    print(f'{len(weeks)} weeks')
+    for name, content, function in [
+        ('json', json_payload, lambda: json.loads(json_payload)[SERIES_KEY]),
+        ('json (stream)', json_payload, lambda: parse_time_series(iter_chunks(json_payload), SERIES_KEY)),
+        ('csv (stream)', csv_payload, lambda: parse_time_series_csv(iter_chunks(csv_payload), SERIES_KEY)),
+    ]:
+        elapsed = min(timeit.repeat(function, number=number, repeat=5))
+        print(f'{name:>13}: {len(content) / 1024:6.0f} KB ({len(gzip.compress(content)) / 1024:4.0f} KB gzip), '
+              f'{elapsed / number * 1000:6.2f} ms per parse')
@@ -0,0 +1,115 @@
+"""
+This file (bench_time_series_parse.py) compares the time and peak memory to retrieve
+and parse the JSON payload of 20 years of weekly (adjusted) prices, end to end (the
+payload is served by a local HTTP server, so the download of the body is included):
+    json - download the entire body and load it with `json.loads()` (original implementation)
+    buffered stream - download the entire body, and then parse it in chunks, keeping
+                      only the closing prices (parse_time_series without stream=True)
+    stream - parse the body in chunks as it is received (stream=True)
+    stream (12 weeks) - parse the body in chunks as it is received, stopping at the start date
+
+Run from the top-level folder of the project:
+    python -m benchmarks.bench_time_series_parse
+"""
+from project.market_data.series import parse_time_series
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+import json
+import requests
+import timeit
+import tracemalloc
+
+
+SERIES_KEY = 'Weekly Adjusted Time Series'
+CHUNK_SIZE = 16 * 1024
+
+
+def create_payload(number_of_weeks: int) -> bytes:
+    """Create the response body of a weekly adjusted time series ordered latest to oldest, like Alpha Vantage."""
+    time_series = {}
+    date = datetime(2024, 1, 5)
+    for week in range(number_of_weeks):
+        close = f'{100 + week % 50}.1200'
+        time_series[date.strftime('%Y-%m-%d')] = {
+            '1. open': close, '2. high': close, '3. low': close, '4. close': close,
+            '5. adjusted close': close, '6. volume': '123456789', '7. dividend amount': '0.0000',
+        }
+        date -= timedelta(weeks=1)
+    payload = {'Meta Data': {'1. Information': 'Weekly Adjusted Prices and Volumes', '2. Symbol': 'AAPL'},
+               SERIES_KEY: time_series}
+    return json.dumps(payload, indent=4).encode()
+
+
+def start_server(content: bytes) -> ThreadingHTTPServer:
+    class PayloadHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            for index in range(0, len(content), CHUNK_SIZE):
+                self.wfile.write(content[index:index + CHUNK_SIZE])
+
+        def log_message(self, format, *args):
+            pass
+
+    class PayloadServer(ThreadingHTTPServer):
+        def handle_error(self, request, client_address):
+            # A streamed response is closed as soon as the start date is reached
+            pass
+
+    server = PayloadServer(('127.0.0.1', 0), PayloadHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def parse_with_json(session: requests.Session, url: str):
+    return session.get(url).json()[SERIES_KEY]
+
+
+def parse_with_buffered_stream(session: requests.Session, url: str):
+    r = session.get(url)
+    return parse_time_series(r.iter_content(chunk_size=CHUNK_SIZE), SERIES_KEY)[SERIES_KEY]
+
+
+def parse_with_stream(session: requests.Session, url: str, start_date: datetime = None):
+    r = session.get(url, stream=True)
+    try:
+        return parse_time_series(r.iter_content(chunk_size=CHUNK_SIZE), SERIES_KEY, start_date=start_date)[SERIES_KEY]
+    finally:
+        r.close()
+
+
+def measure_peak_memory(function) -> int:
+    # The memory is traced from before the call is made, so the downloaded body is included
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+if __name__ == '__main__':
+    content = create_payload(20 * 52)
+    start_date = datetime(2024, 1, 5) - timedelta(weeks=12)
+    number = 20
+    server = start_server(content)
+    url = f'http://127.0.0.1:{server.server_address[1]}/query'
+    session = requests.Session()
+
+    assert {date: prices['4. close'] for date, prices in parse_with_json(session, url).items()} == \
+        {date: prices['4. close'] for date, prices in parse_with_stream(session, url).items()}
+
+    print(f'Payload: {len(content) / 1024:.0f} KB ({20 * 52} weeks)')
+    for name, function in [('json', lambda: parse_with_json(session, url)),
+                           ('buffered stream', lambda: parse_with_buffered_stream(session, url)),
+                           ('stream', lambda: parse_with_stream(session, url)),
+                           ('stream (12 weeks)', lambda: parse_with_stream(session, url, start_date))]:
+        elapsed = min(timeit.repeat(function, number=number, repeat=5))
+        peak = measure_peak_memory(function)
+        print(f'{name:>17}: {elapsed / number * 1000:8.2f} ms per call, {peak / 1024:8.0f} KB peak memory')
+
+    server.shutdown()
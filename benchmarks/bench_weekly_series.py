@@ -0,0 +1,52 @@
+"""
+This file (bench_weekly_series.py) compares the time to select the weeks since
+a start date from 20 years of weekly prices:
+    loop - parse every date and then reverse the lists (previous implementation)
+    series - sort the dates, then binary search and slice (WeeklySeries)
+
+Run from the top-level folder of the project:
+    python -m benchmarks.bench_weekly_series
+"""
+from project.market_data.series import WeeklySeries
+from datetime import datetime, timedelta
+import timeit
+
+
+def create_time_series(number_of_weeks: int) -> dict:
+    """Create a weekly time series ordered latest to oldest, like the Alpha Vantage response."""
+    time_series = {}
+    date = datetime(2024, 1, 5)
+    for week in range(number_of_weeks):
+        time_series[date.strftime('%Y-%m-%d')] = {'4. close': f'{100 + week % 50}.1200'}
+        date -= timedelta(weeks=1)
+    return time_series
+
+
+def select_with_loop(time_series: dict, start_date: datetime):
+    labels = []
+    values = []
+    for element in time_series:
+        date = datetime.fromisoformat(element)
+        if date.date() > start_date.date():
+            labels.append(date)
+            values.append(time_series[element]['4. close'])
+    labels.reverse()
+    values.reverse()
+    return labels, values
+
+
+def select_with_series(time_series: dict, start_date: datetime):
+    weekly_series = WeeklySeries.from_time_series(time_series, start_date)
+    return weekly_series.labels(), weekly_series.values()
+
+
+if __name__ == '__main__':
+    time_series = create_time_series(20 * 52)
+    start_date = datetime(2024, 1, 5) - timedelta(weeks=12)
+    number = 2000
+
+    assert select_with_loop(time_series, start_date)[0] == select_with_series(time_series, start_date)[0]
+
+    for name, function in [('loop', select_with_loop), ('series', select_with_series)]:
+        elapsed = min(timeit.repeat(lambda: function(time_series, start_date), number=number, repeat=5))
+        print(f'{name:>6}: {elapsed / number * 1_000_000:8.1f} us per call ({len(time_series)} weeks)')
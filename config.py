@@ -6,6 +6,14 @@ from datetime import timedelta
 BASEDIR = os.path.abspath(os.path.dirname(__file__))
 
 
+def getenv_bool(name: str, default: bool) -> bool:
+    """Return the environment variable as a boolean ('1', 'true', 'yes' and 'on' are true)."""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
 class Config(object):
     FLASK_ENV = 'development'
     DEBUG = False
@@ -19,9 +27,25 @@ class Config(object):
     else:
         SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(BASEDIR, 'instance', 'app.db')}"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Read replicas of the database (comma-separated URLs), which are used for the queries of
+    # the pages that mostly read and of the background refresh of the stock prices. After a
+    # user writes to the database, the user's pages are read from the primary database for
+    # DATABASE_READ_YOUR_WRITES_SECONDS seconds, as a replica may not have caught up yet.
+    DATABASE_REPLICA_URLS = [url.replace("postgres://", "postgresql://", 1)
+                             for url in os.getenv('DATABASE_REPLICA_URLS', default='').split(',') if url]
+    SQLALCHEMY_BINDS = {f'replica_{index}': url for index, url in enumerate(DATABASE_REPLICA_URLS)}
+    DATABASE_READ_YOUR_WRITES_SECONDS = float(os.getenv('DATABASE_READ_YOUR_WRITES_SECONDS', default=10))
+
     WTF_CSRF_ENABLED = True
     REMEMBER_COOKIE_DURATION = timedelta(days=14)
 
+    # Number of users shown on each page of the list of users (admin)
+    ADMIN_USERS_PER_PAGE = int(os.getenv('ADMIN_USERS_PER_PAGE', default=50))
+
+    # Number of stocks shown on each page of a portfolio or watchlist
+    STOCKS_PER_PAGE = int(os.getenv('STOCKS_PER_PAGE', default=50))
+
     # Flask-Mail Configuration - GMail
     MAIL_SERVER = 'smtp.gmail.com'
     MAIL_PORT = 465
@@ -34,6 +58,107 @@ class Config(object):
     # Alpha Vantage API Key
     ALPHA_VANTAGE_API_KEY = os.getenv('ALPHA_VANTAGE_API_KEY', default='demo')
 
+    # Client-side rate limits for the Alpha Vantage API key (0 to disable).  When the
+    # application runs with multiple processes, divide the limits by the number of processes.
+    ALPHA_VANTAGE_CALLS_PER_MINUTE = int(os.getenv('ALPHA_VANTAGE_CALLS_PER_MINUTE', default=5))
+    ALPHA_VANTAGE_CALLS_PER_DAY = int(os.getenv('ALPHA_VANTAGE_CALLS_PER_DAY', default=500))
+
+    # Quote Cache - current stock prices shared across all users (TTL in seconds)
+    QUOTE_CACHE_MAX_SIZE = int(os.getenv('QUOTE_CACHE_MAX_SIZE', default=1024))
+    QUOTE_CACHE_TTL = int(os.getenv('QUOTE_CACHE_TTL', default=900))
+
+    # Maximum number of concurrent calls to Alpha Vantage when refreshing the prices on a page
+    MARKET_DATA_MAX_CONCURRENCY = int(os.getenv('MARKET_DATA_MAX_CONCURRENCY', default=8))
+
+    # Refresh of the stock prices:
+    #   'request' - stale prices are refreshed when the portfolio or watchlist page is requested
+    #   'scheduler' - prices are refreshed by a background thread started by the first request of
+    #                 each process, where only the process holding the lock on PRICE_REFRESH_LOCK_PATH
+    #                 refreshes the prices (the lock only applies to the processes on the same host)
+    #   'cli' - prices are refreshed by the 'flask stocks refresh_prices --loop' command, which must
+    #           be run once for the deployment (such as when the application runs on several hosts)
+    # With 'scheduler' or 'cli', the portfolio and watchlist pages only read from the database.
+    PRICE_REFRESH_MODE = os.getenv('PRICE_REFRESH_MODE', default='request')
+    PRICE_REFRESH_INTERVAL = int(os.getenv('PRICE_REFRESH_INTERVAL', default=900))
+    PRICE_REFRESH_LOCK_PATH = os.getenv('PRICE_REFRESH_LOCK_PATH',
+                                        default=os.path.join(BASEDIR, 'instance', 'price_refresh.lock'))
+
+    # Live price stream (Server-Sent Events) shown on the portfolio and watchlist pages, where
+    # the current prices of the streamed stocks are polled by a single thread per process (in
+    # seconds). Each open stream holds a worker for up to PRICE_STREAM_MAX_DURATION seconds
+    # (the browser then reconnects), so the stream is disabled by default and must only be
+    # enabled with threaded or async workers (such as gunicorn --threads or --worker-class gevent),
+    # as a few open pages would otherwise hold every sync worker.
+    PRICE_STREAM_ENABLED = getenv_bool('PRICE_STREAM_ENABLED', default=False)
+    PRICE_STREAM_INTERVAL = int(os.getenv('PRICE_STREAM_INTERVAL', default=60))
+    PRICE_STREAM_HEARTBEAT = int(os.getenv('PRICE_STREAM_HEARTBEAT', default=15))
+    PRICE_STREAM_MAX_DURATION = int(os.getenv('PRICE_STREAM_MAX_DURATION', default=300))
+
+    # Bulk quotes (REALTIME_BULK_QUOTES) require a premium Alpha Vantage API key
+    ALPHA_VANTAGE_BULK_QUOTES = getenv_bool('ALPHA_VANTAGE_BULK_QUOTES', default=False)
+    ALPHA_VANTAGE_BULK_QUOTES_MAX_SYMBOLS = min(int(os.getenv('ALPHA_VANTAGE_BULK_QUOTES_MAX_SYMBOLS', default=100)), 100)
+
+    # HTTP connection pool for Alpha Vantage (timeouts in seconds)
+    MARKET_DATA_POOL_SIZE = int(os.getenv('MARKET_DATA_POOL_SIZE', default=10))
+    MARKET_DATA_CONNECT_TIMEOUT = float(os.getenv('MARKET_DATA_CONNECT_TIMEOUT', default=3.05))
+    MARKET_DATA_READ_TIMEOUT = float(os.getenv('MARKET_DATA_READ_TIMEOUT', default=10.0))
+
+    # Resilience of the calls to Alpha Vantage:
+    #   MARKET_DATA_DEADLINE - maximum seconds that a request waits for the market data (0 to disable)
+    #   MARKET_DATA_CIRCUIT_* - calls are suspended for RESET_TIMEOUT seconds after FAILURE_THRESHOLD
+    #                           consecutive failures (0 to disable)
+    #   MARKET_DATA_STALE_WHILE_REVALIDATE - show the stored (stale) market data immediately and
+    #                                        refresh it in the background
+    #   MARKET_DATA_PREFETCH_ON_LOGIN - refresh the stale prices of a user's stocks in the background
+    #                                   when the user logs in
+    MARKET_DATA_DEADLINE = float(os.getenv('MARKET_DATA_DEADLINE', default=8.0))
+    MARKET_DATA_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('MARKET_DATA_CIRCUIT_FAILURE_THRESHOLD', default=5))
+    MARKET_DATA_CIRCUIT_RESET_TIMEOUT = float(os.getenv('MARKET_DATA_CIRCUIT_RESET_TIMEOUT', default=60.0))
+    MARKET_DATA_STALE_WHILE_REVALIDATE = getenv_bool('MARKET_DATA_STALE_WHILE_REVALIDATE', default=True)
+    MARKET_DATA_PREFETCH_ON_LOGIN = getenv_bool('MARKET_DATA_PREFETCH_ON_LOGIN', default=True)
+
+    # Response cache for Alpha Vantage stored (compressed) in the instance folder, which is
+    # shared by all the worker processes (TTLs in seconds; the weekly prices are valid until
+    # the next weekly close)
+    MARKET_DATA_RESPONSE_CACHE = getenv_bool('MARKET_DATA_RESPONSE_CACHE', default=True)
+    MARKET_DATA_RESPONSE_CACHE_PATH = os.getenv('MARKET_DATA_RESPONSE_CACHE_PATH',
+                                                default=os.path.join(BASEDIR, 'instance', 'market_data_cache.sqlite'))
+    MARKET_DATA_RESPONSE_CACHE_MAX_BYTES = int(os.getenv('MARKET_DATA_RESPONSE_CACHE_MAX_BYTES', default=50 * 1024 * 1024))
+    MARKET_DATA_RESPONSE_CACHE_QUOTE_TTL = int(os.getenv('MARKET_DATA_RESPONSE_CACHE_QUOTE_TTL', default=300))
+    MARKET_DATA_RESPONSE_CACHE_OVERVIEW_TTL = int(os.getenv('MARKET_DATA_RESPONSE_CACHE_OVERVIEW_TTL', default=86400))
+
+    # Negative cache - stock symbols with no data available (such as an invalid symbol) are not
+    # retrieved again for BASE_TTL seconds, doubling after each invalid response up to MAX_TTL
+    NEGATIVE_CACHE_MAX_SIZE = int(os.getenv('NEGATIVE_CACHE_MAX_SIZE', default=1024))
+    NEGATIVE_CACHE_BASE_TTL = int(os.getenv('NEGATIVE_CACHE_BASE_TTL', default=3600))
+    NEGATIVE_CACHE_MAX_TTL = int(os.getenv('NEGATIVE_CACHE_MAX_TTL', default=604800))
+
+    # Cache of the users loaded for each request of a logged in user (TTL in seconds):
+    #   'memory' - stored in each worker process, so a change to a user by another process (such as
+    #              deleting a user) only applies to this process once the cached user expires
+    #   'sqlite' - stored in USER_CACHE_PATH and shared by all the worker processes on the same host
+    USER_CACHE_BACKEND = os.getenv('USER_CACHE_BACKEND', default='memory')
+    USER_CACHE_PATH = os.getenv('USER_CACHE_PATH', default=os.path.join(BASEDIR, 'instance', 'user_cache.sqlite'))
+    USER_CACHE_MAX_SIZE = int(os.getenv('USER_CACHE_MAX_SIZE', default=1024))
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', default=60))
+
+    # Market data provider:
+    #   'alpha_vantage' - market data is retrieved from the Alpha Vantage API
+    #   'replay' - recorded JSON payloads are served from MARKET_DATA_REPLAY_PATH (no network calls),
+    #              with a simulated latency (in seconds) and fraction of calls failing (0.0 to 1.0)
+    # Set MARKET_DATA_RECORD to save the payloads from Alpha Vantage to MARKET_DATA_REPLAY_PATH.
+    MARKET_DATA_PROVIDER = os.getenv('MARKET_DATA_PROVIDER', default='alpha_vantage')
+    MARKET_DATA_REPLAY_PATH = os.getenv('MARKET_DATA_REPLAY_PATH',
+                                        default=os.path.join(BASEDIR, 'instance', 'market_data'))
+    MARKET_DATA_REPLAY_LATENCY = float(os.getenv('MARKET_DATA_REPLAY_LATENCY', default=0.0))
+    MARKET_DATA_REPLAY_ERROR_RATE = float(os.getenv('MARKET_DATA_REPLAY_ERROR_RATE', default=0.0))
+    MARKET_DATA_RECORD = getenv_bool('MARKET_DATA_RECORD', default=False)
+
+    # Format of the time series (such as the weekly prices) retrieved from Alpha Vantage:
+    #   'csv' - smaller payload that is faster to parse (retrieved as JSON if the CSV cannot be parsed)
+    #   'json' - nested JSON payload
+    MARKET_DATA_TIME_SERIES_DATATYPE = os.getenv('MARKET_DATA_TIME_SERIES_DATATYPE', default='csv')
+
     # Logging
     LOG_WITH_GUNICORN = os.getenv('LOG_WITH_GUNICORN', default=False)
 
@@ -63,3 +188,13 @@ class TestingConfig(Config):
     SQLALCHEMY_DATABASE_URI = os.getenv('TEST_DATABASE_URI',
                                         default=f"sqlite:///{os.path.join(BASEDIR, 'instance', 'test.db')}")
     WTF_CSRF_ENABLED = False
+
+    # Disable the client-side rate limits, as the calls to Alpha Vantage are mocked
+    ALPHA_VANTAGE_CALLS_PER_MINUTE = 0
+    ALPHA_VANTAGE_CALLS_PER_DAY = 0
+
+    # Retrieve the market data within the request, so that the responses are deterministic
+    MARKET_DATA_CIRCUIT_FAILURE_THRESHOLD = 0
+    MARKET_DATA_STALE_WHILE_REVALIDATE = False
+    MARKET_DATA_PREFETCH_ON_LOGIN = False
+    MARKET_DATA_RESPONSE_CACHE = False
@@ -0,0 +1,80 @@
+"""add security_fundamentals table
+
+Revision ID: 56d7bcc6a805
+Revises: 65d0c2330caa
+Create Date: 2026-10-18 04:00:02.287878
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '56d7bcc6a805'
+down_revision = '65d0c2330caa'
+branch_labels = None
+depends_on = None
+
+
+# Columns of the stock analysis data moved from the `watchstocks` table
+FUNDAMENTALS_COLUMNS = ('company_name', 'fiftytwo_week_low', 'fiftytwo_week_high', 'market_cap',
+                        'dividend_per_share', 'pe_ratio', 'peg_ratio', 'profit_margin', 'beta',
+                        'price_to_book_ratio', 'stock_data_date')
+
+
+def upgrade():
+    op.create_table('security_fundamentals',
+    sa.Column('stock_symbol', sa.String(), nullable=False),
+    sa.Column('company_name', sa.String(), nullable=True),
+    sa.Column('fiftytwo_week_low', sa.Integer(), nullable=True),
+    sa.Column('fiftytwo_week_high', sa.Integer(), nullable=True),
+    sa.Column('market_cap', sa.String(), nullable=True),
+    sa.Column('dividend_per_share', sa.Integer(), nullable=True),
+    sa.Column('pe_ratio', sa.Integer(), nullable=True),
+    sa.Column('peg_ratio', sa.Integer(), nullable=True),
+    sa.Column('profit_margin', sa.Integer(), nullable=True),
+    sa.Column('beta', sa.Integer(), nullable=True),
+    sa.Column('price_to_book_ratio', sa.Integer(), nullable=True),
+    sa.Column('stock_data_date', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('stock_symbol', name=op.f('pk_security_fundamentals'))
+    )
+
+    # Backfill the stock analysis data from the most recently retrieved watchstock for each stock
+    columns = ', '.join(FUNDAMENTALS_COLUMNS)
+    op.execute(
+        f'INSERT INTO security_fundamentals (stock_symbol, {columns}) '
+        f'SELECT w.stock_symbol, {", ".join("w." + column for column in FUNDAMENTALS_COLUMNS)} '
+        'FROM watchstocks w '
+        'WHERE w.company_name IS NOT NULL AND w.id = ('
+        '    SELECT w2.id FROM watchstocks w2 '
+        '    WHERE w2.stock_symbol = w.stock_symbol AND w2.company_name IS NOT NULL '
+        '    ORDER BY w2.stock_data_date IS NULL, w2.stock_data_date DESC, w2.id DESC LIMIT 1)'
+    )
+
+    with op.batch_alter_table('watchstocks', schema=None) as batch_op:
+        for column in FUNDAMENTALS_COLUMNS:
+            batch_op.drop_column(column)
+
+
+def downgrade():
+    with op.batch_alter_table('watchstocks', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('company_name', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('fiftytwo_week_low', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('fiftytwo_week_high', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('market_cap', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('dividend_per_share', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('pe_ratio', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('peg_ratio', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('profit_margin', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('beta', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('price_to_book_ratio', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('stock_data_date', sa.DateTime(), nullable=True))
+
+    # Copy the stock analysis data back to every watchstock for the stock
+    assignments = ', '.join(
+        f'{column} = (SELECT f.{column} FROM security_fundamentals f WHERE f.stock_symbol = watchstocks.stock_symbol)'
+        for column in FUNDAMENTALS_COLUMNS
+    )
+    op.execute(f'UPDATE watchstocks SET {assignments}')
+
+    op.drop_table('security_fundamentals')
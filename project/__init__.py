@@ -9,6 +9,13 @@ from flask_migrate import Migrate
 from flask_wtf.csrf import CSRFProtect
 from flask_login import LoginManager
 from flask_mail import Mail
+from project.cache import TTLCache
+from project.database_routing import RoutingSession, database_router
+from project.user_cache import UserCache
+from project.market_data.client import MarketDataClient
+from project.market_data.resilience import BackgroundRevalidator
+from project.market_data.response_cache import ResponseCache
+from project.market_data.negative_cache import NegativeCache
 
 
 # -------------
@@ -28,12 +35,18 @@ metadata = MetaData(naming_convention=convention)
 # Create the instances of the Flask extensions in the global scope,
 # but without any arguments passed in. These instances are not
 # attached to the Flask application at this point.
-database = SQLAlchemy(metadata=metadata)
+database = SQLAlchemy(metadata=metadata, session_options={'class_': RoutingSession})
 db_migration = Migrate()
 csrf_protection = CSRFProtect()
 login = LoginManager()
 login.login_view = "users.login"
 mail = Mail()
+quote_cache = TTLCache('QUOTE_CACHE')
+market_data_client = MarketDataClient()
+market_data_revalidator = BackgroundRevalidator()
+response_cache = ResponseCache()
+negative_cache = NegativeCache()
+user_cache = UserCache()
 
 
 # ----------------------------
@@ -53,6 +66,7 @@ def create_app():
     configure_logging(app)
     register_app_callbacks(app)
     register_error_pages(app)
+    register_background_tasks(app)
 
     ##############################################################################
     # This section is only necessary in production when a command-line interface #
@@ -82,18 +96,27 @@ def initialize_extensions(app):
     # Since the application instance is now created, pass it to each Flask
     # extension instance to bind it to the Flask application instance (app)
     database.init_app(app)
+    database_router.init_app(app)
     db_migration.init_app(app, database)
     csrf_protection.init_app(app)
     login.init_app(app)
     mail.init_app(app)
+    quote_cache.init_app(app)
+    market_data_client.init_app(app)
+    market_data_revalidator.init_app(app)
+    response_cache.init_app(app)
+    negative_cache.init_app(app)
+    user_cache.init_app(app)
+
+    from project.market_data.providers import init_market_data_provider
+    init_market_data_provider(app)
 
     # Flask-Login configuration
     from project.models import User
 
     @login.user_loader
     def load_user(user_id):
-        query = database.select(User).where(User.id == int(user_id))
-        return database.session.execute(query).scalar_one()
+        return user_cache.load(User, int(user_id))
 
 
 def register_blueprints(app):
@@ -158,6 +181,20 @@ def register_app_callbacks(app):
     pass
 
 
+def register_background_tasks(app):
+    # Start the background refresh of the stock prices, so that the
+    # request handlers only need to read the prices from the database.
+    # The refresh is started by the first request of each process, so the
+    # `flask` commands (such as `flask db upgrade`) do not start it and the
+    # thread is started after gunicorn has forked the worker processes.
+    if app.config['PRICE_REFRESH_MODE'] == 'scheduler':
+        from project.market_data.refresh import price_refresh_scheduler
+
+        @app.before_request
+        def start_price_refresh_scheduler():
+            price_refresh_scheduler.start(app)
+
+
 def register_error_pages(app):
     @app.errorhandler(404)
     def page_not_found(e):
@@ -1,12 +1,52 @@
 import click
 from . import admin_blueprint
-from project import database
-from project.models import User, Stock, WatchStock
+from project import database, quote_cache, market_data_client, negative_cache, response_cache, user_cache
+from project.models import PortfolioSummary, User, WatchStock
 from flask import render_template, current_app, abort, flash, redirect, url_for, request
 from flask_login import login_required, current_user
+from project.database_routing import reads_from_replica
+from project.pagination import SortOption, paginate
+from sqlalchemy import func
 from .forms import PasswordForm, EmailForm
 
 
+# Columns that the list of users can be sorted by
+USER_SORT_OPTIONS = ('id', 'stocks', 'watchstocks')
+
+
+#################
+#### helpers ####
+#################
+
+def get_users_with_stock_counts(sort: str = 'id', after: str = None, per_page: int = 50) -> tuple:
+    """Return a page of the users with the number of stocks in their portfolio and watchlist.
+
+    The number of stocks in each portfolio is read from the portfolio totals, and the
+    number of stocks in each watchlist is counted by grouping the watchstocks by user
+    in the same query, instead of querying the stocks of each user. The pages are
+    selected by keyset pagination, so `after` is the cursor returned for the previous page.
+
+    Returns a tuple of (list of (User, number of stocks in portfolio, number of stocks
+    in watchlist), cursor for the next page or None if it is the last page).
+    """
+    watchstock_counts = (database.select(WatchStock.user_id, func.count().label('count'))
+                         .group_by(WatchStock.user_id).subquery())
+    number_of_stocks = func.coalesce(PortfolioSummary.number_of_positions, 0)
+    number_of_watchstocks = func.coalesce(watchstock_counts.c.count, 0)
+
+    query = (database.select(User, number_of_stocks, number_of_watchstocks)
+             .outerjoin(PortfolioSummary, PortfolioSummary.user_id == User.id)
+             .outerjoin(watchstock_counts, watchstock_counts.c.user_id == User.id))
+
+    # The counts are sorted from highest to lowest
+    sort_options = {
+        'id': SortOption(User.id),
+        'stocks': SortOption(number_of_stocks, descending=True),
+        'watchstocks': SortOption(number_of_watchstocks, descending=True),
+    }
+    return paginate(query, sort_options[sort], User.id, after, per_page)
+
+
 ######################
 #### cli commands ####
 ######################
@@ -40,12 +80,29 @@ def admin_before_request():
 ################
 
 @admin_blueprint.route('/users')
+@reads_from_replica
 def admin_list_users():
-    users = User.query.order_by(User.id).all()
-    for user in users:
-        user.number_of_stocks_in_portfolio = len(Stock.query.filter_by(user_id=user.id).all())
-        user.number_of_stocks_in_watchlist = len(WatchStock.query.filter_by(user_id=user.id).all())
-    return render_template('admin/users.html', users=users)
+    sort = request.args.get('sort', default='id')
+    if sort not in USER_SORT_OPTIONS:
+        abort(400)
+
+    try:
+        rows, next_cursor = get_users_with_stock_counts(sort, request.args.get('after'),
+                                                        current_app.config['ADMIN_USERS_PER_PAGE'])
+    except ValueError:
+        abort(400)
+
+    users = []
+    for user, number_of_stocks, number_of_watchstocks in rows:
+        user.number_of_stocks_in_portfolio = number_of_stocks
+        user.number_of_stocks_in_watchlist = number_of_watchstocks
+        users.append(user)
+
+    next_page_url = None
+    if next_cursor is not None:
+        next_page_url = url_for('admin.admin_list_users', sort=sort, after=next_cursor)
+
+    return render_template('admin/users.html', users=users, sort=sort, next_page_url=next_page_url)
 
 
 @admin_blueprint.route('/users/<id>/delete')
@@ -57,6 +114,7 @@ def admin_delete_user(id):
     else:
         database.session.delete(user)
         database.session.commit()
+        user_cache.invalidate(user.id)
         flash(f'User ({user.id}: {user.email}) was deleted!', 'success')
         current_app.logger.info(
             f'User ({user.id}: {user.email}) was deleted by admin user: {current_user.id}!')
@@ -70,6 +128,7 @@ def admin_confirm_email_address(id):
     user.confirm_email_address()
     database.session.add(user)
     database.session.commit()
+    user_cache.invalidate(user.id)
     flash(f"User's email address ({user.id}: {user.email}) was confirmed!", 'success')
     current_app.logger.info(
         f"User's email address ({user.id}: {user.email}) was confirmed by admin user: {current_user.id}!")
@@ -82,6 +141,7 @@ def admin_unconfirm_email_address(id):
     user.unconfirm_email_address()
     database.session.add(user)
     database.session.commit()
+    user_cache.invalidate(user.id)
     flash(f"User's email address ({user.id}: {user.email}) was un-confirmed!", 'success')
     current_app.logger.info(
         f"User's email address ({user.id}: {user.email}) was un-confirmed by admin user: {current_user.id}!")
@@ -97,6 +157,7 @@ def admin_change_password(id):
         user.set_password(form.password.data)
         database.session.add(current_user)
         database.session.commit()
+        user_cache.invalidate(user.id)
         flash(f"User's password ({user.id}: {user.email}) was updated!", 'success')
         current_app.logger.info(
             f"User's password ({user.id}: {user.email}) was updated by admin user: {current_user.id}!")
@@ -114,9 +175,19 @@ def admin_change_email(id):
         user.email = form.email.data
         database.session.add(current_user)
         database.session.commit()
+        user_cache.invalidate(user.id)
         flash(f"User's email ({user.id}: {user.email}) was updated!", 'success')
         current_app.logger.info(
             f"User's email ({user.id}: {user.email}) was updated by admin user: {current_user.id}!")
         return redirect(url_for('admin.admin_list_users'))
 
     return render_template('admin/change_email.html', form=form)
+
+
+@admin_blueprint.route('/market_data')
+def admin_market_data():
+    return render_template('admin/market_data.html',
+                           quote_cache_stats=quote_cache.stats(),
+                           response_cache_stats=response_cache.stats(),
+                           negative_cache_stats=negative_cache.stats(),
+                           api_stats=market_data_client.stats())
@@ -0,0 +1,235 @@
+"""
+This module (cache.py) provides a thread-safe, in-process cache with a
+time-to-live (TTL) for each entry and least-recently-used (LRU) eviction
+once the maximum number of entries is reached.
+
+The cache follows the same pattern as the Flask extensions used by this
+application: the instance is created in the global scope and then
+configured from the Flask application configuration via `init_app()`.
+
+`SQLiteTTLCache` provides the same interface with the entries stored (as JSON)
+in an SQLite database, so that the cache is shared by all the worker processes.
+The connections to the SQLite databases are opened once per thread by
+`SQLiteConnections`.
+"""
+from collections import OrderedDict
+from threading import Lock, local
+import json
+import os
+import sqlite3
+import time
+
+
+class TTLCache(object):
+    """
+    Class that represents a bounded cache shared by all requests within a process.
+
+    The following configuration variables are read by `init_app()`, where
+    the prefix is specified when the cache is created:
+        <prefix>_MAX_SIZE - maximum number of entries stored in the cache
+        <prefix>_TTL - number of seconds that an entry is considered valid
+
+    The number of hits, misses, and evictions are counted so that the
+    effectiveness of the cache can be monitored.
+    """
+
+    def __init__(self, config_prefix: str, max_size: int = 1024, ttl: float = 300.0):
+        self.config_prefix = config_prefix
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def init_app(self, app):
+        self.max_size = app.config.get(f'{self.config_prefix}_MAX_SIZE', self.max_size)
+        self.ttl = app.config.get(f'{self.config_prefix}_TTL', self.ttl)
+
+    def get(self, key):
+        """Return the value stored for `key`, or None if it is missing or has expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                self.misses += 1
+                return None
+
+            # Mark the entry as the most recently used
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def get_last_known(self, key):
+        """Return the value stored for `key` even if it has expired, or None if it is missing.
+
+        Expired entries are kept until they are evicted, so they can still be used
+        when a new value cannot be retrieved.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            return None if entry is None else entry[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+
+            # Evict the least recently used entries to keep the memory usage bounded
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+class SQLiteConnections(object):
+    """
+    Class that represents the connections to an SQLite database, opened once per thread.
+
+    A connection cannot be shared between threads, so each thread reuses its own
+    connection instead of connecting (and setting the journal mode) for every
+    operation. A connection opened before the process was forked is not reused
+    by the new process.
+    """
+
+    def __init__(self):
+        self._local = local()
+
+    def get(self, path: str) -> sqlite3.Connection:
+        key = (os.getpid(), path)
+        if getattr(self._local, 'key', None) != key:
+            connection = sqlite3.connect(path, timeout=5.0)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+            self._local.key = key
+        return self._local.connection
+
+
+class SQLiteTTLCache(object):
+    """
+    Class that represents a bounded cache shared by all the processes via an SQLite database.
+
+    The following configuration variables are read by `init_app()`, where
+    the prefix is specified when the cache is created:
+        <prefix>_PATH - path of the SQLite database storing the entries
+        <prefix>_MAX_SIZE - maximum number of entries stored in the cache
+        <prefix>_TTL - number of seconds that an entry is considered valid
+
+    The values must be serializable as JSON. The number of hits, misses, and
+    evictions are counted for the current process. Once the maximum number of
+    entries is exceeded, the entries are evicted in the order that they expire
+    (expired entries first), so a hit is only a read of the database.
+    """
+
+    def __init__(self, config_prefix: str, path: str = None, max_size: int = 1024, ttl: float = 300.0):
+        self.config_prefix = config_prefix
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = Lock()
+        self._connections = SQLiteConnections()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def init_app(self, app):
+        self.path = app.config.get(f'{self.config_prefix}_PATH', self.path)
+        self.max_size = app.config.get(f'{self.config_prefix}_MAX_SIZE', self.max_size)
+        self.ttl = app.config.get(f'{self.config_prefix}_TTL', self.ttl)
+        self._create_table()
+
+    def _connect(self) -> sqlite3.Connection:
+        # The database is locked by SQLite across processes, so each write is a transaction
+        return self._connections.get(self.path)
+
+    def _create_table(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS entries ('
+                               'key TEXT PRIMARY KEY, '
+                               'value TEXT NOT NULL, '
+                               'expires_at REAL NOT NULL, '
+                               'accessed_at REAL NOT NULL)')
+
+    def get(self, key):
+        """Return the value stored for `key`, or None if it is missing or has expired."""
+        now = time.time()
+        row = self._connect().execute('SELECT value FROM entries WHERE key = ? AND expires_at > ?',
+                                      (str(key), now)).fetchone()
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        with self._connect() as connection:
+            # The access time is only set when the entry is stored, so a hit does not write to the database
+            connection.execute('INSERT OR REPLACE INTO entries (key, value, expires_at, accessed_at) '
+                               'VALUES (?, ?, ?, ?)',
+                               (str(key), json.dumps(value, separators=(',', ':')), now + self.ttl, now))
+
+            # Evict the expired entries first, and then the entries that expire first
+            evicted = connection.execute('DELETE FROM entries WHERE key IN ('
+                                         'SELECT key FROM entries ORDER BY expires_at '
+                                         'LIMIT MAX((SELECT COUNT(*) FROM entries) - ?, 0))',
+                                         (self.max_size,)).rowcount
+
+        with self._lock:
+            self.evictions += evicted
+
+    def delete(self, key):
+        with self._connect() as connection:
+            connection.execute('DELETE FROM entries WHERE key = ?', (str(key),))
+
+    def clear(self):
+        with self._connect() as connection:
+            connection.execute('DELETE FROM entries')
+
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def __len__(self):
+        return self._connect().execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def stats(self) -> dict:
+        size = len(self)
+        with self._lock:
+            return {
+                'size': size,
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
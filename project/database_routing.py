@@ -0,0 +1,117 @@
+"""
+This module (database_routing.py) routes the database queries between the primary
+database (SQLALCHEMY_DATABASE_URI) and any read replicas (DATABASE_REPLICA_URLS),
+which are configured as the Flask-SQLAlchemy binds 'replica_0', 'replica_1', etc.
+
+By default, every query uses the primary database. A session can be switched to
+read from a replica (such as for the pages decorated with `reads_from_replica`),
+in which case:
+    - SELECT statements are executed on a replica (the same one for the whole session)
+    - any other statement (INSERT, UPDATE, DELETE, flush) is executed on the primary
+      database, and every query after a write in the same session also uses the primary
+      database, so the session reads its own writes
+
+Only the statements that write (INSERT, UPDATE, DELETE, or a flush of changed objects)
+count as a write. A view that writes to the database as part of the request should not
+read from a replica, as the writes would be based on reads that may be out of date.
+
+After a request that writes to the database, the time of the write is stored in the
+user's session (cookie), so that the pages viewed by that user within the next
+DATABASE_READ_YOUR_WRITES_SECONDS seconds are read from the primary database instead
+of a replica that may not have caught up with the write yet.
+"""
+from flask import current_app, has_request_context, session as flask_session
+from flask_sqlalchemy.session import Session
+from functools import wraps
+from sqlalchemy import event
+import random
+import sqlalchemy as sa
+import time
+
+
+REPLICA_BIND_PREFIX = 'replica_'
+
+
+def is_read(clause, **kwargs) -> bool:
+    # A SELECT ... FOR UPDATE locks the rows on the primary database
+    is_select = isinstance(clause, sa.Select) and clause._for_update_arg is None
+    return is_select and not kwargs.get('_flushing', False)
+
+
+class RoutingSession(Session):
+    """Class that represents a session that can execute the SELECT statements on a read replica."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and is_read(clause, **kwargs):
+            if self.info.get('use_replica') and not self.info.get('has_written'):
+                replica_key = self.info.get('replica_key')
+                if replica_key is None:
+                    replica_keys = [key for key in self._db.engines if key and key.startswith(REPLICA_BIND_PREFIX)]
+                    replica_key = self.info['replica_key'] = random.choice(replica_keys) if replica_keys else ''
+                if replica_key:
+                    return self._db.engines[replica_key]
+
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def record_statement_write(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['has_written'] = True
+
+
+@event.listens_for(RoutingSession, 'before_flush')
+def record_flush_write(session, flush_context, instances):
+    if session.new or session.deleted or any(session.is_modified(obj) for obj in session.dirty):
+        session.info['has_written'] = True
+
+
+class DatabaseRouter(object):
+    """
+    Class that switches the sessions to read from a replica and tracks the writes of each user.
+
+    The following configuration variables are used:
+        SQLALCHEMY_BINDS - the read replicas are the binds named 'replica_<n>'
+        DATABASE_READ_YOUR_WRITES_SECONDS - seconds after a write that the user's pages use the primary database
+    """
+
+    def init_app(self, app):
+        app.after_request(self._record_write)
+
+    @staticmethod
+    def _get_session():
+        return current_app.extensions['sqlalchemy'].session
+
+    def _record_write(self, response):
+        if self._get_session().info.get('has_written'):
+            flask_session['last_database_write'] = time.time()
+        return response
+
+    def use_replica(self) -> bool:
+        """Switch the current session to read from a replica.
+
+        Returns False if the reads stay on the primary database, as there are no replicas
+        configured or the user has written to the database within the read-your-writes window.
+        """
+        if has_request_context():
+            last_write = flask_session.get('last_database_write')
+            if last_write is not None and time.time() - last_write < current_app.config['DATABASE_READ_YOUR_WRITES_SECONDS']:
+                return False
+
+        if not any(key.startswith(REPLICA_BIND_PREFIX) for key in current_app.config.get('SQLALCHEMY_BINDS', {})):
+            return False
+
+        self._get_session().info['use_replica'] = True
+        return True
+
+
+database_router = DatabaseRouter()
+
+
+def reads_from_replica(function):
+    """Decorator for the views that mostly read, so that their queries are executed on a read replica."""
+    @wraps(function)
+    def decorated_function(*args, **kwargs):
+        database_router.use_replica()
+        return function(*args, **kwargs)
+    return decorated_function
@@ -0,0 +1,4 @@
+"""
+The market_data package handles the retrieval of the stock data from the
+Alpha Vantage API for this application.
+"""
@@ -0,0 +1,138 @@
+"""
+This module (client.py) provides the HTTP client used for all the calls to the
+market data API (Alpha Vantage).
+
+A single `requests.Session` is used per process so that the TCP connections
+(and TLS sessions) are pooled and kept alive between calls, instead of paying
+for a new handshake on each call.
+
+Every call is checked against the client-side rate limiter and the circuit
+breaker, and concurrent calls for the same URL are coalesced into a single call.
+A large response (such as a time series) can be streamed to a parser, in which
+case the parsed result is shared with the coalesced calls, as the body of a
+streamed response can only be read once.
+"""
+from project.market_data.rate_limit import QuotaExceededError, RateLimiter, SingleFlight
+from project.market_data.resilience import CircuitBreaker, CircuitOpenError
+from requests.adapters import HTTPAdapter
+from threading import Lock
+import os
+import requests
+
+
+class MarketDataClient(object):
+    """
+    Class that represents the HTTP client for retrieving market data.
+
+    The following configuration variables are read by `init_app()`:
+        MARKET_DATA_POOL_SIZE - maximum number of connections kept alive per host
+        MARKET_DATA_CONNECT_TIMEOUT - seconds to wait to establish a connection
+        MARKET_DATA_READ_TIMEOUT - seconds to wait for data to be received from the server
+
+    The rate limiter and circuit breaker are also configured by `init_app()`
+    (see `RateLimiter` and `CircuitBreaker`).
+    """
+
+    def __init__(self):
+        self.pool_size = 10
+        self.connect_timeout = 3.05
+        self.read_timeout = 10.0
+        self._session = None
+        self._session_pid = None
+        self._lock = Lock()
+        self.rate_limiter = RateLimiter()
+        self.single_flight = SingleFlight()
+        self.circuit_breaker = CircuitBreaker()
+
+    def init_app(self, app):
+        self.pool_size = app.config.get('MARKET_DATA_POOL_SIZE', self.pool_size)
+        self.connect_timeout = app.config.get('MARKET_DATA_CONNECT_TIMEOUT', self.connect_timeout)
+        self.read_timeout = app.config.get('MARKET_DATA_READ_TIMEOUT', self.read_timeout)
+        self.rate_limiter.init_app(app)
+        self.circuit_breaker.init_app(app)
+        self.close()
+
+    @property
+    def session(self) -> requests.Session:
+        # The connection pool cannot be shared across processes (such as gunicorn
+        # workers forked after the application is created), so each process
+        # creates its own session the first time that it is needed
+        with self._lock:
+            if self._session is None or self._session_pid != os.getpid():
+                self._session = self._create_session()
+                self._session_pid = os.getpid()
+            return self._session
+
+    def _create_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({'Accept-Encoding': 'gzip, deflate',
+                                'Connection': 'keep-alive'})
+        return session
+
+    def get(self, url: str) -> requests.Response:
+        """Perform a GET call using the pooled session.
+
+        If a call for the same URL is already in flight, wait for it and return
+        its response instead of making another call.
+
+        Raises a `QuotaExceededError` if the call was not made because the API
+        budget has run out, a `CircuitOpenError` if the call was not made because
+        the API has been failing, or a `requests.exceptions.RequestException` if
+        the call fails due to a network issue or a timeout.
+        """
+        return self.single_flight.do(url, lambda: self._get(url))
+
+    def get_parsed(self, url: str, parse, key: str):
+        """Perform a GET call using the pooled session, streaming the response body to `parse`.
+
+        The response body is not downloaded before `parse(response)` is called, so it
+        can be parsed as it is received (such as with `response.iter_content()`), and the
+        response is closed once it is parsed. Concurrent calls with the same `key` (which
+        must identify both the URL and the parsing) receive the same parsed result.
+
+        Raises the same exceptions as `get()`, along with any exception raised by `parse`.
+        """
+        return self.single_flight.do(key, lambda: self._get_parsed(url, parse))
+
+    def _get_parsed(self, url: str, parse):
+        r = self._get(url, stream=True)
+        try:
+            return parse(r)
+        finally:
+            r.close()
+
+    def _get(self, url: str, stream: bool = False) -> requests.Response:
+        if not self.circuit_breaker.allow_request():
+            raise CircuitOpenError('Alpha Vantage API calls are suspended after repeated failures')
+
+        if not self.rate_limiter.try_acquire():
+            self.circuit_breaker.release_trial()
+            raise QuotaExceededError('Alpha Vantage API budget has been exhausted')
+
+        try:
+            r = self.session.get(url, timeout=(self.connect_timeout, self.read_timeout), stream=stream)
+        except requests.exceptions.RequestException:
+            self.circuit_breaker.record_failure()
+            raise
+
+        # A server error indicates that the API is unavailable, while any other
+        # status code indicates that the API is responding
+        if r.status_code >= 500:
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_success()
+        return r
+
+    def stats(self) -> dict:
+        return dict(self.rate_limiter.stats(), **self.circuit_breaker.stats(),
+                    coalesced=self.single_flight.coalesced)
+
+    def close(self):
+        with self._lock:
+            if self._session is not None and self._session_pid == os.getpid():
+                self._session.close()
+            self._session = None
+            self._session_pid = None
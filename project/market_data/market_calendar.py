@@ -0,0 +1,149 @@
+"""
+This module (market_calendar.py) provides the trading calendar of the stock
+exchange (NYSE), which is used to decide when the market data can change.
+
+The market data only changes when the market is open, so a price retrieved
+after the latest close of the market is still current during the evening,
+over the weekend, and on market holidays. Similarly, the weekly prices only
+change once the last trading day of the week has closed.
+"""
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+
+def get_easter_sunday(year: int) -> date:
+    """Return the date of Easter Sunday (Anonymous Gregorian algorithm)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    el = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * el) // 451
+    month, day = divmod(h + el - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def get_nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    """Return the nth (1-based, or -1 for the last) weekday (Monday = 0) of the month."""
+    if n > 0:
+        first_day = date(year, month, 1)
+        return first_day + timedelta(days=(weekday - first_day.weekday()) % 7 + 7 * (n - 1))
+
+    last_day = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last_day - timedelta(days=(last_day.weekday() - weekday) % 7)
+
+
+def get_observed_date(holiday: date) -> date:
+    """Return the date that a holiday is observed, as a holiday on a weekend is observed on the nearest weekday."""
+    if holiday.weekday() == 5:
+        return holiday - timedelta(days=1)
+    if holiday.weekday() == 6:
+        return holiday + timedelta(days=1)
+    return holiday
+
+
+@lru_cache(maxsize=32)
+def get_market_holidays(year: int) -> frozenset:
+    """Return the dates that the market is closed for a holiday in the specified year."""
+    holidays = {
+        get_nth_weekday(year, 1, 0, 3),                     # Martin Luther King Jr. Day
+        get_nth_weekday(year, 2, 0, 3),                     # Washington's Birthday
+        get_easter_sunday(year) - timedelta(days=2),        # Good Friday
+        get_nth_weekday(year, 5, 0, -1),                    # Memorial Day
+        get_observed_date(date(year, 7, 4)),                # Independence Day
+        get_nth_weekday(year, 9, 0, 1),                     # Labor Day
+        get_nth_weekday(year, 11, 3, 4),                    # Thanksgiving Day
+        get_observed_date(date(year, 12, 25)),              # Christmas Day
+    }
+
+    # New Year's Day is not observed on the previous Friday (which is in the prior year) if it falls on a Saturday
+    new_years_day = get_observed_date(date(year, 1, 1))
+    if new_years_day.year == year:
+        holidays.add(new_years_day)
+
+    if year >= 2022:
+        holidays.add(get_observed_date(date(year, 6, 19)))  # Juneteenth National Independence Day
+
+    return frozenset(holidays)
+
+
+class MarketCalendar(object):
+    """
+    Class that represents the trading sessions of the stock exchange.
+
+    The datetimes passed in can either be timezone-aware or naive, where a
+    naive datetime (such as from `datetime.now()`, as stored in the database)
+    is in the local time of the server.
+    """
+
+    def __init__(self, timezone: str = 'America/New_York', close_time: time = time(16, 0)):
+        self.timezone = ZoneInfo(timezone)
+        self.close_time = close_time
+
+    def _to_market_time(self, value: datetime = None) -> datetime:
+        if value is None:
+            return datetime.now(self.timezone)
+        return value.astimezone(self.timezone)
+
+    @staticmethod
+    def is_trading_day(day: date) -> bool:
+        return day.weekday() < 5 and day not in get_market_holidays(day.year)
+
+    def is_last_trading_day_of_week(self, day: date) -> bool:
+        return self.is_trading_day(day) and not any(self.is_trading_day(day + timedelta(days=offset))
+                                                    for offset in range(1, 5 - day.weekday()))
+
+    def get_session_close(self, day: date) -> datetime:
+        return datetime.combine(day, self.close_time, tzinfo=self.timezone)
+
+    def get_last_close(self, now: datetime = None) -> datetime:
+        """Return the latest close of the market at or before `now`."""
+        now = self._to_market_time(now)
+        day = now.date()
+        if not (self.is_trading_day(day) and now >= self.get_session_close(day)):
+            day -= timedelta(days=1)
+            while not self.is_trading_day(day):
+                day -= timedelta(days=1)
+        return self.get_session_close(day)
+
+    def get_next_close(self, now: datetime = None) -> datetime:
+        """Return the next close of the market after `now`."""
+        now = self._to_market_time(now)
+        day = now.date()
+        while not (self.is_trading_day(day) and now < self.get_session_close(day)):
+            day += timedelta(days=1)
+        return self.get_session_close(day)
+
+    def get_last_week_close(self, now: datetime = None) -> datetime:
+        """Return the latest close of the last trading day of a week at or before `now`."""
+        last_close = self.get_last_close(now)
+        while not self.is_last_trading_day_of_week(last_close.date()):
+            last_close = self.get_last_close(last_close - timedelta(seconds=1))
+        return last_close
+
+    def get_next_week_close(self, now: datetime = None) -> datetime:
+        """Return the next close of the last trading day of a week after `now`."""
+        next_close = self.get_next_close(now)
+        while not self.is_last_trading_day_of_week(next_close.date()):
+            next_close = self.get_next_close(next_close)
+        return next_close
+
+    def is_current(self, retrieved_on: datetime, now: datetime = None) -> bool:
+        """Return True if the market data retrieved at `retrieved_on` cannot have changed since then."""
+        return retrieved_on is not None and self._to_market_time(retrieved_on) >= self.get_last_close(now)
+
+    def is_current_weekly(self, retrieved_on: datetime, now: datetime = None) -> bool:
+        """Return True if the weekly market data retrieved at `retrieved_on` cannot have changed since then."""
+        return retrieved_on is not None and self._to_market_time(retrieved_on) >= self.get_last_week_close(now)
+
+    def get_last_close_local(self, now: datetime = None) -> datetime:
+        """Return the latest close of the market as a naive datetime in the local time of the server,
+        for comparing with the datetimes stored in the database."""
+        return self.get_last_close(now).astimezone().replace(tzinfo=None)
+
+
+market_calendar = MarketCalendar()
@@ -0,0 +1,87 @@
+"""
+This module (negative_cache.py) provides a cache of the stock symbols for which
+the market data API (Alpha Vantage) returned no data, such as a symbol that
+does not exist.
+
+Once a symbol is known to be invalid, the calls to the API for that symbol are
+suppressed, with the time until the next call doubling after each invalid
+response (exponential backoff). A response indicating that the API rate limit
+has been exceeded does not mean that the symbol is invalid, so it is not
+recorded in this cache.
+"""
+from collections import OrderedDict
+from threading import Lock
+import time
+
+
+class NegativeCache(object):
+    """
+    Class that represents the cache of invalid stock symbols shared by all requests within a process.
+
+    The following configuration variables are read by `init_app()`:
+        NEGATIVE_CACHE_MAX_SIZE - maximum number of invalid symbols stored in the cache
+        NEGATIVE_CACHE_BASE_TTL - seconds that the calls are suppressed after the first invalid response
+        NEGATIVE_CACHE_MAX_TTL - maximum seconds that the calls are suppressed
+
+    Each function (such as 'GLOBAL_QUOTE' or 'OVERVIEW') is tracked separately for a symbol.
+    """
+
+    def __init__(self, max_size: int = 1024, base_ttl: float = 3600.0, max_ttl: float = 604800.0):
+        self.max_size = max_size
+        self.base_ttl = base_ttl
+        self.max_ttl = max_ttl
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self.suppressed = 0
+
+    def init_app(self, app):
+        self.max_size = app.config.get('NEGATIVE_CACHE_MAX_SIZE', self.max_size)
+        self.base_ttl = app.config.get('NEGATIVE_CACHE_BASE_TTL', self.base_ttl)
+        self.max_ttl = app.config.get('NEGATIVE_CACHE_MAX_TTL', self.max_ttl)
+
+    @staticmethod
+    def create_key(function: str, symbol: str) -> tuple:
+        return function, symbol.upper()
+
+    def is_suppressed(self, function: str, symbol: str) -> bool:
+        """Return True if the call should not be made, as the symbol is known to be invalid."""
+        with self._lock:
+            entry = self._entries.get(self.create_key(function, symbol))
+            if entry is None or entry[1] <= time.monotonic():
+                return False
+
+            self.suppressed += 1
+            return True
+
+    def record_invalid(self, function: str, symbol: str) -> float:
+        """Record an invalid response for the symbol, and return the seconds that the calls are suppressed."""
+        key = self.create_key(function, symbol)
+        with self._lock:
+            failures = self._entries[key][0] + 1 if key in self._entries else 1
+            ttl = min(self.base_ttl * 2 ** (failures - 1), self.max_ttl)
+            self._entries[key] = (failures, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            return ttl
+
+    def record_valid(self, function: str, symbol: str):
+        with self._lock:
+            self._entries.pop(self.create_key(function, symbol), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.suppressed = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'symbols': sorted({symbol for _, symbol in self._entries}),
+                'suppressed': self.suppressed,
+            }
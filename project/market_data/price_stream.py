@@ -0,0 +1,178 @@
+"""
+This module (price_stream.py) streams the current prices of the stocks to the
+browsers that are showing a portfolio or watchlist (Server-Sent Events).
+
+A single poller thread per process retrieves the current prices of all the
+stocks that are being streamed every PRICE_STREAM_INTERVAL seconds, and each
+changed price is fanned out to all the subscribers of that stock. Therefore,
+the number of calls to the market data API depends on the number of distinct
+stocks being streamed, not on the number of users viewing them.
+
+Each open stream holds a worker of the web server, so the stream is only shown
+when PRICE_STREAM_ENABLED is set, which requires threaded or async workers.
+"""
+from project import database
+from project.models import get_current_stock_prices
+from queue import Empty, Full, Queue
+from threading import Event, Lock, Thread
+import json
+import os
+import time
+
+
+class PriceSubscription(object):
+    """Class that represents the queue of price updates for the stocks streamed to a single browser."""
+
+    def __init__(self, symbols, max_queued: int = 100):
+        self.symbols = frozenset(symbol.upper() for symbol in symbols)
+        self._queue = Queue(maxsize=max_queued)
+
+    def publish(self, update: dict):
+        # If the browser is not keeping up, the oldest update is dropped as it is superseded
+        while True:
+            try:
+                self._queue.put_nowait(update)
+                return
+            except Full:
+                try:
+                    self._queue.get_nowait()
+                except Empty:
+                    pass
+
+    def get(self, timeout: float):
+        """Return the next price update, or None if there is no update within the timeout."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except Empty:
+            return None
+
+
+class PriceStreamer(object):
+    """
+    Class that polls the current prices of the streamed stocks and fans out the changes.
+
+    The poller thread is started by the first subscription and stops once there
+    are no subscriptions left. The following configuration variables are read
+    by the poller and `iter_events()`:
+        PRICE_STREAM_INTERVAL - seconds between the polls of the current prices
+        PRICE_STREAM_HEARTBEAT - seconds between the keep-alive comments sent to an idle stream
+        PRICE_STREAM_MAX_DURATION - seconds before a stream is closed (the browser then reconnects)
+    """
+
+    def __init__(self):
+        self._subscriptions = set()
+        self._latest_prices = {}
+        self._lock = Lock()
+        self._thread = None
+        self._thread_pid = None
+        self._wake_event = Event()
+        self._stopped = False
+        self.polls = 0
+
+    def subscribe(self, app, symbols) -> PriceSubscription:
+        """Subscribe to the price updates for the stocks, starting with the latest prices already polled."""
+        subscription = PriceSubscription(symbols)
+        with self._lock:
+            self._subscriptions.add(subscription)
+            for symbol in sorted(subscription.symbols):
+                if symbol in self._latest_prices:
+                    subscription.publish({'symbol': symbol, 'price': self._latest_prices[symbol]})
+                else:
+                    # Poll the prices of the new stocks without waiting for the next interval
+                    self._wake_event.set()
+            self._start_poller(app)
+        return subscription
+
+    def unsubscribe(self, subscription: PriceSubscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def _start_poller(self, app):
+        # The poller thread is not copied to the processes forked after it was started (such as gunicorn workers)
+        if self._thread is None or not self._thread.is_alive() or self._thread_pid != os.getpid():
+            self._stopped = False
+            self._thread = Thread(target=self.run, args=(app,), name='price-stream', daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def run(self, app):
+        while not self._stopped:
+            with self._lock:
+                symbols = sorted(set().union(*(subscription.symbols for subscription in self._subscriptions)))
+                if not symbols:
+                    self._thread = None
+                    return
+
+                # Only the latest prices of the stocks still being streamed are kept
+                for symbol in self._latest_prices.keys() - set(symbols):
+                    del self._latest_prices[symbol]
+                self._wake_event.clear()
+
+            with app.app_context():
+                try:
+                    self.publish(get_current_stock_prices(symbols))
+                except Exception:
+                    app.logger.exception('Error! Failed to poll the current prices for the price stream!')
+                finally:
+                    database.session.remove()
+
+            self._wake_event.wait(app.config['PRICE_STREAM_INTERVAL'])
+
+    def publish(self, current_prices: dict):
+        """Send the prices that have changed since the previous poll to the subscribers of each stock."""
+        with self._lock:
+            self.polls += 1
+            for symbol, price in current_prices.items():
+                if price <= 0.0 or self._latest_prices.get(symbol) == price:
+                    continue
+
+                self._latest_prices[symbol] = price
+                update = {'symbol': symbol, 'price': price}
+                for subscription in self._subscriptions:
+                    if symbol in subscription.symbols:
+                        subscription.publish(update)
+
+    def iter_events(self, app, symbols, heartbeat: float, max_duration: float):
+        """Generate the Server-Sent Events with the price updates for the stocks until the maximum duration of the stream.
+
+        The subscription is only made once the stream is started, so that it is always
+        removed when the stream is closed (including when the browser disconnects).
+        """
+        subscription = self.subscribe(app, symbols)
+        try:
+            # Reconnect after 5 seconds once the stream is closed
+            yield 'retry: 5000\n\n'
+            deadline = time.monotonic() + max_duration
+            while (remaining := deadline - time.monotonic()) > 0:
+                update = subscription.get(timeout=min(heartbeat, remaining))
+                if update is None:
+                    yield ': keep-alive\n\n'
+                else:
+                    yield f'event: price\ndata: {json.dumps(update)}\n\n'
+        finally:
+            self.unsubscribe(subscription)
+
+    def stop(self):
+        self._stopped = True
+        self._wake_event.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def reset(self):
+        self.stop()
+        with self._lock:
+            self._subscriptions.clear()
+            self._latest_prices.clear()
+            self._thread = None
+            self.polls = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'subscribers': len(self._subscriptions),
+                'polls': self.polls,
+            }
+
+
+price_streamer = PriceStreamer()
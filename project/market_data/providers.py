@@ -0,0 +1,366 @@
+"""
+This module (providers.py) provides the sources of market data for this application.
+
+Each provider returns the JSON payloads in the format used by Alpha Vantage,
+and the `MarketDataProvider` base class extracts the data used by the
+application (current price, weekly prices, and company overview). The
+provider is selected by the MARKET_DATA_PROVIDER configuration variable:
+    'alpha_vantage' - retrieve the market data from the Alpha Vantage API
+    'replay' - serve recorded JSON payloads from MARKET_DATA_REPLAY_PATH,
+               which allows for load testing without any network calls
+"""
+from project import market_data_client, negative_cache, response_cache
+from project.market_data.rate_limit import QuotaExceededError
+from project.market_data.series import parse_time_series, parse_time_series_csv
+from datetime import datetime
+from flask import current_app
+import json
+import os
+import random
+import requests
+import sqlite3
+import time
+
+
+# Key that is present in a valid payload for each Alpha Vantage function, as an error
+# (such as the API rate limit being exceeded) is returned with a status code of 200 (OK)
+VALID_PAYLOAD_KEYS = {
+    'GLOBAL_QUOTE': 'Global Quote',
+    'TIME_SERIES_WEEKLY_ADJUSTED': 'Weekly Adjusted Time Series',
+    'OVERVIEW': 'AssetType',
+}
+
+
+# Functions that return a time series, which is retrieved as CSV (or JSON) and parsed as
+# the response is read (keeping only the closing prices) rather than loading the entire payload
+TIME_SERIES_FUNCTIONS = ('TIME_SERIES_WEEKLY_ADJUSTED',)
+
+# Size (in bytes) of the chunks of the response body passed to the time series parser
+TIME_SERIES_CHUNK_SIZE = 16 * 1024
+
+
+def is_valid_payload(function: str, data: dict) -> bool:
+    # The key needs to have a value, as an empty value is returned for an invalid stock symbol
+    return bool(data.get(VALID_PAYLOAD_KEYS[function]))
+
+
+def is_rate_limit_payload(data: dict) -> bool:
+    # Alpha Vantage returns a 'Note' or 'Information' message when the API rate limit has been exceeded
+    return 'Note' in data or 'Information' in data
+
+
+class UnexpectedStatusCodeError(requests.exceptions.RequestException):
+    """Raised when the market data API returns a status code other than 200 (OK)."""
+
+    def __init__(self, status_code: int):
+        super().__init__(f'Unexpected status code ({status_code})')
+        self.status_code = status_code
+
+
+def check_status_code(r):
+    # Status code returned from Alpha Vantage needs to be 200 (OK) to process stock data
+    if r.status_code != 200:
+        raise UnexpectedStatusCodeError(r.status_code)
+
+
+class MarketDataProvider(object):
+    """
+    Base class for the providers of market data.
+
+    Sub-classes implement `get_json()`, which returns the JSON payload for an
+    Alpha Vantage function (such as 'GLOBAL_QUOTE') and stock symbol. For a
+    time series, the prices before `start_date` are not needed, so they may be
+    omitted from the payload.
+    """
+
+    def get_json(self, function: str, symbol: str, start_date: datetime = None) -> dict:
+        raise NotImplementedError
+
+    def _retrieve(self, function: str, symbol: str, description: str, start_date: datetime = None):
+        """Return the JSON payload, or None if it could not be retrieved."""
+        # Skip the call if the stock symbol is known to be invalid
+        checked = function in VALID_PAYLOAD_KEYS
+        if checked and negative_cache.is_suppressed(function, symbol):
+            current_app.logger.debug(f'Skipped retrieving {description}, as the stock symbol is invalid.')
+            return None
+
+        # Attempt to retrieve the payload and check that a RequestException does not occur,
+        # which happens when the call fails due to a network issue or timeout
+        try:
+            data = self.get_json(function, symbol, start_date)
+        except QuotaExceededError:
+            current_app.logger.warning(f'API budget exhausted, so skipped retrieving {description}!')
+            return None
+        except UnexpectedStatusCodeError as e:
+            current_app.logger.warning(f'Error! Received unexpected status code ({e.status_code}) '
+                                       f'when retrieving {description}!')
+            return None
+        except requests.exceptions.RequestException:
+            current_app.logger.error(f'Error! Network problem preventing retrieving {description}!')
+            return None
+
+        if checked:
+            self._check_symbol(function, symbol, data, description)
+        return data
+
+    @staticmethod
+    def _check_symbol(function: str, symbol: str, data: dict, description: str):
+        """Record whether the payload indicates that the stock symbol is invalid."""
+        if is_valid_payload(function, data):
+            negative_cache.record_valid(function, symbol)
+        elif not is_rate_limit_payload(data):
+            ttl = negative_cache.record_invalid(function, symbol)
+            current_app.logger.warning(f'No data available when retrieving {description}, so the stock '
+                                       f'symbol is considered invalid for the next {int(ttl)} seconds!')
+
+    def get_quote(self, symbol: str) -> float:
+        """Return the current price of the stock, or 0.0 if it could not be retrieved."""
+        stock_data = self._retrieve('GLOBAL_QUOTE', symbol, f'the daily stock data ({symbol})')
+        if stock_data is None:
+            return 0.0
+
+        # The key of 'Global Quote' needs to be present in order to process the stock data.
+        # Typically, this key will not be present if the API rate limit has been exceeded,
+        # and it will be empty if the stock symbol is invalid.
+        if not is_valid_payload('GLOBAL_QUOTE', stock_data):
+            current_app.logger.warning(f'Could not find the Global Quote key when retrieving '
+                                       f'the daily stock data ({symbol})!')
+            return 0.0
+
+        return float(stock_data['Global Quote']['05. price'])
+
+    def get_batch_quotes(self, symbols: list):
+        """Return a dictionary of the (uppercase) symbols to the current prices for up
+        to 100 stocks, or None if the bulk call failed."""
+        bulk_data = self._retrieve('REALTIME_BULK_QUOTES', ','.join(symbols),
+                                   f'the bulk stock data ({len(symbols)} stocks)')
+        if bulk_data is None:
+            return None
+
+        # The key of 'data' needs to be present in order to process the stock data.
+        # This key will not be present if the bulk endpoint is not available with
+        # the API key (premium endpoint) or if the API rate limit has been exceeded.
+        if 'data' not in bulk_data:
+            current_app.logger.warning(f'Could not find the data key when retrieving '
+                                       f'the bulk stock data ({len(symbols)} stocks)!')
+            return None
+
+        current_prices = {}
+        for quote in bulk_data['data']:
+            try:
+                current_prices[quote['symbol'].upper()] = float(quote['close'])
+            except (KeyError, ValueError):
+                continue
+
+        return current_prices
+
+    def get_weekly_series(self, symbol: str, start_date: datetime = None):
+        """Return the dictionary of the dates (YYYY-MM-DD) to the weekly prices of the
+        stock, or None if the weekly prices could not be retrieved.
+
+        If a start date is specified, the weekly prices before the start date may be omitted.
+        """
+        weekly_data = self._retrieve('TIME_SERIES_WEEKLY_ADJUSTED', symbol, f'the weekly stock data ({symbol})',
+                                     start_date)
+        if weekly_data is None:
+            return None
+
+        # The key of 'Weekly Adjusted Time Series' needs to be present in order to process the stock data
+        # Typically, this key will not be present if the API rate limit has been exceeded.
+        if not is_valid_payload('TIME_SERIES_WEEKLY_ADJUSTED', weekly_data):
+            current_app.logger.warning(f'Could not find the Weekly Adjusted Time Series key when retrieving '
+                                       f'the weekly stock data ({symbol})!')
+            return None
+
+        return weekly_data['Weekly Adjusted Time Series']
+
+    def get_overview(self, symbol: str):
+        """Return the company overview of the stock, or None if it could not be retrieved."""
+        data = self._retrieve('OVERVIEW', symbol, f'the stock analysis data ({symbol})')
+        if data is None:
+            return None
+
+        # The key of 'AssetType' needs to be present in order to confirm that valid data is available.
+        # Typically, this key will not be present if the API rate limit has been exceeded.
+        if not is_valid_payload('OVERVIEW', data):
+            current_app.logger.warning(f'Could not find valid data when retrieving '
+                                       f'the stock analysis data ({symbol})!')
+            return None
+
+        return data
+
+
+class AlphaVantageProvider(MarketDataProvider):
+    """
+    Class that retrieves the market data from the Alpha Vantage API.
+
+    If the response cache is enabled, the valid payloads are stored in the response
+    cache that is shared by all the processes (see `ResponseCache`), so that the
+    market data is not retrieved again by other workers or after a restart.
+
+    If MARKET_DATA_RECORD is set, each payload is also saved to MARKET_DATA_REPLAY_PATH
+    so that it can be served later by the `ReplayProvider`.
+
+    The payload of a time series (such as 20+ years of weekly prices) is parsed from
+    the response body in chunks, keeping only the closing prices since the start
+    date, instead of loading every field of every date. A payload without the
+    earlier prices is not cached or recorded, as it is incomplete for other calls.
+
+    The time series is retrieved in the format specified by MARKET_DATA_TIME_SERIES_DATATYPE
+    ('csv' or 'json'). The CSV payload is much smaller than the JSON payload, and if it
+    cannot be parsed, the time series is retrieved again as JSON.
+    """
+
+    def __init__(self, api_key: str, record_path: str = None, time_series_datatype: str = 'csv'):
+        self.api_key = api_key
+        self.record_path = record_path
+        self.time_series_datatype = time_series_datatype
+
+    def create_url(self, function: str, symbol: str, datatype: str = 'json') -> str:
+        url = 'https://www.alphavantage.co/query?function={}&symbol={}&apikey={}'.format(
+            function,
+            symbol,
+            self.api_key
+        )
+        if datatype != 'json':
+            url += f'&datatype={datatype}'
+        return url
+
+    def get_json(self, function: str, symbol: str, start_date: datetime = None) -> dict:
+        cacheable = response_cache.is_cacheable(function)
+        if cacheable:
+            data = self._get_cached_payload(function, symbol)
+            if data is not None:
+                return data
+
+        complete = True
+        if function in TIME_SERIES_FUNCTIONS:
+            complete = start_date is None or self.record_path is not None
+            data = self._get_time_series(function, symbol, None if complete else start_date)
+        else:
+            data = self._get_response(function, symbol).json()
+
+        if cacheable and complete and is_valid_payload(function, data):
+            self._set_cached_payload(function, symbol, data)
+        if self.record_path:
+            record_payload(self.record_path, function, symbol, data)
+        return data
+
+    def _get_response(self, function: str, symbol: str, datatype: str = 'json'):
+        r = market_data_client.get(self.create_url(function, symbol, datatype))
+        check_status_code(r)
+        return r
+
+    def _get_time_series(self, function: str, symbol: str, start_date: datetime = None) -> dict:
+        if self.time_series_datatype == 'csv':
+            try:
+                return self._get_parsed_time_series(parse_time_series_csv, function, symbol, 'csv', start_date)
+            except ValueError as e:
+                current_app.logger.warning(f'Error! Unable to parse the CSV payload ({function} - {symbol}), '
+                                           f'so retrieving the JSON payload instead: {e}')
+
+        return self._get_parsed_time_series(parse_time_series, function, symbol, 'json', start_date)
+
+    def _get_parsed_time_series(self, parser, function: str, symbol: str, datatype: str, start_date: datetime = None):
+        # The response body is streamed to the parser, so it is parsed as it is received
+        # instead of being downloaded first, and the parsed time series is shared with
+        # any concurrent calls for the same time series and start date
+        series_key = VALID_PAYLOAD_KEYS[function]
+
+        def parse(r):
+            check_status_code(r)
+            return parser(r.iter_content(chunk_size=TIME_SERIES_CHUNK_SIZE), series_key, start_date=start_date)
+
+        url = self.create_url(function, symbol, datatype)
+        key = f"{url}&start_date={start_date.isoformat() if start_date else ''}"
+        return market_data_client.get_parsed(url, parse, key)
+
+    @staticmethod
+    def _get_cached_payload(function: str, symbol: str):
+        # The response cache is an optimization, so an error only results in the API being called
+        try:
+            return response_cache.get(function, symbol)
+        except sqlite3.Error as e:
+            current_app.logger.warning(f'Error! Unable to read from the response cache ({function} - {symbol}): {e}')
+            return None
+
+    @staticmethod
+    def _set_cached_payload(function: str, symbol: str, data: dict):
+        try:
+            response_cache.set(function, symbol, data)
+        except sqlite3.Error as e:
+            current_app.logger.warning(f'Error! Unable to write to the response cache ({function} - {symbol}): {e}')
+
+
+class ReplayProvider(MarketDataProvider):
+    """
+    Class that serves recorded JSON payloads instead of calling the Alpha Vantage API.
+
+    The payloads are read from the files in the replay folder named either
+    '<FUNCTION>_<SYMBOL>.json' (for a specific stock) or '<FUNCTION>.json' (for
+    any stock). The bulk quotes are created from the 'GLOBAL_QUOTE' payloads.
+
+    The following configuration variables allow for simulating the API:
+        MARKET_DATA_REPLAY_LATENCY - seconds to wait before returning each payload
+        MARKET_DATA_REPLAY_ERROR_RATE - fraction (0.0 to 1.0) of calls that fail with a network error
+    """
+
+    def __init__(self, replay_path: str, latency: float = 0.0, error_rate: float = 0.0):
+        self.replay_path = replay_path
+        self.latency = latency
+        self.error_rate = error_rate
+
+    def get_json(self, function: str, symbol: str, start_date: datetime = None) -> dict:
+        if self.latency > 0.0:
+            time.sleep(self.latency)
+
+        if self.error_rate > 0.0 and random.random() < self.error_rate:
+            raise requests.exceptions.ConnectionError(f'Injected error when retrieving {function} ({symbol})')
+
+        if function == 'REALTIME_BULK_QUOTES':
+            return self._create_bulk_quotes(symbol.split(','))
+
+        return self._load_payload(function, symbol)
+
+    def _load_payload(self, function: str, symbol: str) -> dict:
+        for filename in (f'{function}_{symbol.upper()}.json', f'{function}.json'):
+            path = os.path.join(self.replay_path, filename)
+            if os.path.exists(path):
+                with open(path) as replay_file:
+                    return json.load(replay_file)
+
+        return {'Error Message': f'No recorded payload for {function} ({symbol}).'}
+
+    def _create_bulk_quotes(self, symbols: list) -> dict:
+        data = []
+        for symbol in symbols:
+            quote = self._load_payload('GLOBAL_QUOTE', symbol).get('Global Quote')
+            if quote:
+                data.append({'symbol': symbol.upper(), 'close': quote['05. price']})
+        return {'endpoint': 'Realtime Bulk Quotes', 'data': data}
+
+
+def record_payload(record_path: str, function: str, symbol: str, data: dict):
+    os.makedirs(record_path, exist_ok=True)
+    with open(os.path.join(record_path, f'{function}_{symbol.upper()}.json'), 'w') as record_file:
+        json.dump(data, record_file)
+
+
+def init_market_data_provider(app):
+    """Create the market data provider specified by MARKET_DATA_PROVIDER."""
+    if app.config['MARKET_DATA_PROVIDER'] == 'replay':
+        provider = ReplayProvider(app.config['MARKET_DATA_REPLAY_PATH'],
+                                  app.config['MARKET_DATA_REPLAY_LATENCY'],
+                                  app.config['MARKET_DATA_REPLAY_ERROR_RATE'])
+    elif app.config['MARKET_DATA_PROVIDER'] == 'alpha_vantage':
+        record_path = app.config['MARKET_DATA_REPLAY_PATH'] if app.config['MARKET_DATA_RECORD'] else None
+        provider = AlphaVantageProvider(app.config['ALPHA_VANTAGE_API_KEY'], record_path,
+                                        app.config['MARKET_DATA_TIME_SERIES_DATATYPE'])
+    else:
+        raise ValueError(f"Invalid market data provider ({app.config['MARKET_DATA_PROVIDER']})!")
+
+    app.extensions['market_data_provider'] = provider
+
+
+def get_market_data_provider() -> MarketDataProvider:
+    return current_app.extensions['market_data_provider']
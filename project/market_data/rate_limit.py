@@ -0,0 +1,143 @@
+"""
+This module (rate_limit.py) provides the client-side rate limiting for the
+calls to the market data API (Alpha Vantage).
+
+Alpha Vantage limits the number of calls per minute and per day for each
+API key. Instead of finding out that the limit has been exceeded from the
+response, the budget is tracked by token buckets so that a call that would
+fail is never made. Concurrent calls for the same URL are coalesced so that
+only one call is made while the others wait on its result.
+"""
+from threading import Event, Lock
+import time
+import requests
+
+
+class QuotaExceededError(requests.exceptions.RequestException):
+    """Raised when a call is not made because the API budget has run out."""
+
+
+class TokenBucket(object):
+    """
+    Class that represents a token bucket holding up to `capacity` tokens,
+    which are refilled continuously over `period` seconds.
+    """
+
+    def __init__(self, capacity: int, period: float):
+        self.capacity = capacity
+        self.period = period
+        self.tokens = float(capacity)
+        self.last_refill = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.last_refill) * self.capacity / self.period)
+        self.last_refill = now
+
+    def has_token(self) -> bool:
+        self.refill()
+        return self.tokens >= 1.0
+
+    def take_token(self):
+        self.tokens -= 1.0
+
+
+class RateLimiter(object):
+    """
+    Class that represents the per-minute and per-day budgets of API calls.
+
+    The following configuration variables are read by `init_app()`:
+        ALPHA_VANTAGE_CALLS_PER_MINUTE - maximum number of calls per minute (0 to disable)
+        ALPHA_VANTAGE_CALLS_PER_DAY - maximum number of calls per day (0 to disable)
+    """
+
+    def __init__(self):
+        self._buckets = []
+        self._lock = Lock()
+        self.allowed = 0
+        self.throttled = 0
+
+    def init_app(self, app):
+        buckets = []
+        if app.config.get('ALPHA_VANTAGE_CALLS_PER_MINUTE'):
+            buckets.append(TokenBucket(app.config['ALPHA_VANTAGE_CALLS_PER_MINUTE'], 60.0))
+        if app.config.get('ALPHA_VANTAGE_CALLS_PER_DAY'):
+            buckets.append(TokenBucket(app.config['ALPHA_VANTAGE_CALLS_PER_DAY'], 86400.0))
+
+        with self._lock:
+            self._buckets = buckets
+            self.allowed = 0
+            self.throttled = 0
+
+    def try_acquire(self) -> bool:
+        """Take a token from each bucket if every bucket has one available."""
+        with self._lock:
+            if not all(bucket.has_token() for bucket in self._buckets):
+                self.throttled += 1
+                return False
+
+            for bucket in self._buckets:
+                bucket.take_token()
+            self.allowed += 1
+            return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            for bucket in self._buckets:
+                bucket.refill()
+            return {
+                'allowed': self.allowed,
+                'throttled': self.throttled,
+                'remaining_per_minute': self._remaining_tokens(60.0),
+                'remaining_per_day': self._remaining_tokens(86400.0),
+            }
+
+    def _remaining_tokens(self, period: float):
+        for bucket in self._buckets:
+            if bucket.period == period:
+                return int(bucket.tokens)
+        return '-'
+
+
+class SingleFlight(object):
+    """
+    Class that coalesces concurrent calls with the same key into a single call.
+
+    The first caller for a key makes the call, while any other callers for the
+    same key wait for the call to complete and then receive the same result
+    (or exception).
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = Lock()
+        self.coalesced = 0
+
+    def do(self, key, function):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = {'done': Event(), 'result': None, 'error': None}
+                self._calls[key] = call
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            call['done'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result']
+
+        try:
+            call['result'] = function()
+            return call['result']
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['done'].set()
@@ -0,0 +1,226 @@
+"""
+This module (refresh.py) refreshes the market data stored in the database for
+all the stocks held in portfolios (`stocks` table) and watchlists (`watchstocks`
+table), so that the API calls can be moved off the request path.
+
+The refresh can be run periodically by the `PriceRefreshScheduler` (started by
+the first request of each process when PRICE_REFRESH_MODE is 'scheduler') or by the
+`flask stocks refresh_prices --loop` command (PRICE_REFRESH_MODE is 'cli'). The
+stale stocks are read from a read replica, if any are configured (see
+database_routing.py).
+
+When PRICE_REFRESH_MODE is 'request', the stale market data for the stocks in
+a portfolio or watchlist can also be refreshed in the background while the page
+is shown with the stored data (MARKET_DATA_STALE_WHILE_REVALIDATE), and the
+stale prices of the stocks held by a user are refreshed in the background when
+the user logs in (MARKET_DATA_PREFETCH_ON_LOGIN).
+"""
+from project import database, market_data_revalidator
+from project.database_routing import database_router
+from project.models import SecurityFundamentals, Stock, WatchStock, get_current_stock_prices
+from project.market_data.market_calendar import market_calendar
+from sqlalchemy import func, or_, union_all
+from threading import Event, Lock, Thread
+from flask import current_app
+from datetime import datetime
+import os
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # File locks are not available (Windows), so every process refreshes the prices
+
+
+def get_symbols_by_popularity(stale_before: datetime = None, user_id: int = None) -> list:
+    """Return the distinct stock symbols held in portfolios and watchlists, most popular first.
+
+    If `stale_before` is specified, only the stocks with a current price that has not
+    been retrieved since then are returned. If `user_id` is specified, only the stocks
+    in the portfolio and watchlist of that user are returned.
+    """
+    stocks_query = database.select(Stock.stock_symbol.label('symbol'))
+    watchstocks_query = database.select(WatchStock.stock_symbol.label('symbol'))
+    if user_id is not None:
+        stocks_query = stocks_query.where(Stock.user_id == user_id)
+        watchstocks_query = watchstocks_query.where(WatchStock.user_id == user_id)
+    if stale_before is not None:
+        stocks_query = stocks_query.where(or_(Stock.current_price_date.is_(None),
+                                              Stock.current_price_date < stale_before))
+        watchstocks_query = watchstocks_query.where(or_(WatchStock.current_share_price_date.is_(None),
+                                                        WatchStock.current_share_price_date < stale_before))
+
+    holdings = union_all(stocks_query, watchstocks_query).subquery()
+    query = (database.select(holdings.c.symbol)
+             .group_by(holdings.c.symbol)
+             .order_by(func.count().desc(), holdings.c.symbol))
+    return database.session.execute(query).scalars().all()
+
+
+def refresh_stock_prices(symbols: list) -> int:
+    """Refresh the current prices of the specified stocks in the portfolios and watchlists.
+
+    Returns the number of stocks with an updated price.
+    """
+    current_prices = get_current_stock_prices(symbols)
+    current_price_date = datetime.now()
+    number_of_stocks_updated = 0
+
+    for symbol, current_price in current_prices.items():
+        if current_price <= 0.0:
+            continue
+
+        current_price_integer = int(current_price * 100)
+        Stock.bulk_update_prices((Stock.stock_symbol == symbol,), current_price_integer, current_price_date)
+        database.session.execute(
+            database.update(WatchStock)
+            .where(WatchStock.stock_symbol == symbol)
+            .values(current_share_price=current_price_integer,
+                    current_share_price_date=current_price_date)
+        )
+        number_of_stocks_updated += 1
+
+    database.session.commit()
+    return number_of_stocks_updated
+
+
+def refresh_stock_analysis_data(symbols: list = None):
+    """Refresh the stock analysis data of the watchstocks (optionally, only for the
+    specified stocks), with at most one API call per stock symbol per day."""
+    query = database.select(WatchStock.stock_symbol).distinct().order_by(WatchStock.stock_symbol)
+    if symbols is not None:
+        query = query.where(WatchStock.stock_symbol.in_(symbols))
+
+    for symbol in database.session.execute(query).scalars().all():
+        SecurityFundamentals.retrieve(symbol)
+
+    database.session.commit()
+
+
+def refresh_market_data() -> int:
+    """Refresh the market data for every stock held in a portfolio or watchlist.
+
+    Returns the number of stocks with an updated price.
+    """
+    # The stocks to refresh are read from a replica (if configured), and the
+    # session switches to the primary database once the prices are updated
+    database_router.use_replica()
+
+    # Only the prices retrieved before the latest close of the market can have changed
+    number_of_stocks_updated = refresh_stock_prices(
+        get_symbols_by_popularity(stale_before=market_calendar.get_last_close_local())
+    )
+    refresh_stock_analysis_data()
+    return number_of_stocks_updated
+
+
+def revalidate_stock_prices(symbols) -> bool:
+    """Start refreshing the current prices of the specified stocks in the background.
+
+    Returns True if the refresh was started, or False if there is nothing to refresh
+    or the same refresh is already in progress.
+    """
+    symbols = sorted(set(symbols))
+    if not symbols:
+        return False
+    return market_data_revalidator.submit(current_app._get_current_object(), ('prices', *symbols),
+                                          refresh_stock_prices, symbols)
+
+
+def revalidate_stock_analysis_data(symbols) -> bool:
+    """Start refreshing the stock analysis data of the specified stocks in the background.
+
+    Returns True if the refresh was started, or False if there is nothing to refresh
+    or the same refresh is already in progress.
+    """
+    symbols = sorted(set(symbols))
+    if not symbols:
+        return False
+    return market_data_revalidator.submit(current_app._get_current_object(), ('analysis', *symbols),
+                                          refresh_stock_analysis_data, symbols)
+
+
+def prefetch_user_stock_prices(user_id: int) -> bool:
+    """Start refreshing the stale current prices of the stocks in the portfolio and watchlist
+    of the user in the background, so that they are current when the pages are shown.
+
+    Returns True if the refresh was started.
+    """
+    symbols = get_symbols_by_popularity(stale_before=market_calendar.get_last_close_local(), user_id=user_id)
+    return revalidate_stock_prices(symbols)
+
+
+class PriceRefreshScheduler(object):
+    """
+    Class that periodically refreshes the market data in a background thread.
+
+    The market data is refreshed every PRICE_REFRESH_INTERVAL seconds.
+
+    As each worker process (such as with gunicorn) starts its own scheduler, only the
+    process holding the lock on the PRICE_REFRESH_LOCK_PATH file refreshes the market
+    data. The schedulers of the other processes keep trying to take the lock, so the
+    refresh continues if the process holding the lock exits. The lock file only
+    coordinates the processes on one host, so an application running on several hosts
+    should use the 'cli' mode with a single `flask stocks refresh_prices --loop` instead.
+    """
+
+    def __init__(self):
+        self._thread = None
+        self._stop_event = Event()
+        self._start_lock = Lock()
+        self._lock_file = None
+
+    def start(self, app):
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+
+            self._stop_event.clear()
+            self._thread = Thread(target=self.run, args=(app,), name='price-refresh', daemon=True)
+            self._thread.start()
+        app.logger.info('Started the background refresh of the stock prices.')
+
+    def acquire_lock(self, path: str) -> bool:
+        """Take the lock of the refresh (held until the scheduler is stopped), returning False if another process holds it."""
+        if self._lock_file is not None or fcntl is None:
+            return True
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        lock_file = open(path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+
+        self._lock_file = lock_file
+        return True
+
+    def release_lock(self):
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def run(self, app):
+        while not self._stop_event.is_set():
+            if self.acquire_lock(app.config['PRICE_REFRESH_LOCK_PATH']):
+                with app.app_context():
+                    try:
+                        number_of_stocks_updated = refresh_market_data()
+                        app.logger.info(f'Refreshed the current prices of {number_of_stocks_updated} stocks.')
+                    except Exception:
+                        app.logger.exception('Error! Failed to refresh the stock prices!')
+                        database.session.rollback()
+                    finally:
+                        database.session.remove()
+
+            self._stop_event.wait(app.config['PRICE_REFRESH_INTERVAL'])
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.release_lock()
+
+
+price_refresh_scheduler = PriceRefreshScheduler()
@@ -0,0 +1,161 @@
+"""
+This module (resilience.py) protects the application from a slow or unavailable
+market data API (Alpha Vantage).
+
+The `CircuitBreaker` stops calling the API after a number of consecutive
+failures, so that requests fail fast instead of each waiting for a timeout.
+The `BackgroundRevalidator` refreshes stale market data in background threads,
+so that a request can be served with the stored data immediately
+(stale-while-revalidate).
+"""
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+import requests
+import time
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised when a call is not made because the circuit breaker is open."""
+
+
+class CircuitBreaker(object):
+    """
+    Class that represents a circuit breaker for the calls to the market data API.
+
+    The circuit breaker has three states:
+        'closed' - calls are made as normal
+        'open' - calls are rejected (after MARKET_DATA_CIRCUIT_FAILURE_THRESHOLD consecutive failures)
+        'half-open' - after MARKET_DATA_CIRCUIT_RESET_TIMEOUT seconds, a single trial call is
+                      allowed; if it succeeds the circuit is closed, otherwise it is opened again
+
+    A failure threshold of 0 disables the circuit breaker.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = Lock()
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._trial_in_progress = False
+        self.rejected = 0
+
+    def init_app(self, app):
+        self.failure_threshold = app.config.get('MARKET_DATA_CIRCUIT_FAILURE_THRESHOLD', self.failure_threshold)
+        self.reset_timeout = app.config.get('MARKET_DATA_CIRCUIT_RESET_TIMEOUT', self.reset_timeout)
+        self.reset()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._get_state()
+
+    def _get_state(self) -> str:
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at < self.reset_timeout:
+            return 'open'
+        return 'half-open'
+
+    def allow_request(self) -> bool:
+        """Return True if a call can be made, or False if the call should be rejected."""
+        if self.failure_threshold <= 0:
+            return True
+
+        with self._lock:
+            state = self._get_state()
+            if state == 'closed':
+                return True
+
+            # Only allow a single trial call at a time once the reset timeout has elapsed
+            if state == 'half-open' and not self._trial_in_progress:
+                self._trial_in_progress = True
+                return True
+
+            self.rejected += 1
+            return False
+
+    def release_trial(self):
+        """Release the trial call (when half-open) if it was allowed but not made."""
+        with self._lock:
+            self._trial_in_progress = False
+
+    def record_success(self):
+        with self._lock:
+            self._consecutive_failures = 0
+            self._opened_at = None
+            self._trial_in_progress = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive_failures += 1
+            self._trial_in_progress = False
+            if self.failure_threshold > 0 and self._consecutive_failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+    def reset(self):
+        with self._lock:
+            self._consecutive_failures = 0
+            self._opened_at = None
+            self._trial_in_progress = False
+            self.rejected = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'circuit_state': self._get_state(),
+                'consecutive_failures': self._consecutive_failures,
+                'rejected': self.rejected,
+            }
+
+
+class BackgroundRevalidator(object):
+    """
+    Class that runs the refresh of stale market data in background threads.
+
+    Each refresh is identified by a key, and a refresh is not started if one
+    with the same key is already in progress. The number of threads is bounded
+    by MARKET_DATA_MAX_CONCURRENCY.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self._executor = None
+        self._in_progress = {}
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self.max_workers = app.config.get('MARKET_DATA_MAX_CONCURRENCY', self.max_workers)
+
+    def submit(self, app, key, function, *args) -> bool:
+        """Run `function(*args)` in a background thread with an application context.
+
+        Returns True if the refresh was started, or False if a refresh with the
+        same key is already in progress.
+        """
+        with self._lock:
+            if key in self._in_progress:
+                return False
+
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=max(self.max_workers, 1),
+                                                    thread_name_prefix='market-data-revalidate')
+            self._in_progress[key] = self._executor.submit(self._run, app, key, function, *args)
+            return True
+
+    def _run(self, app, key, function, *args):
+        try:
+            with app.app_context():
+                function(*args)
+        except Exception:
+            app.logger.exception(f'Error! Failed to refresh the market data in the background ({key})!')
+        finally:
+            with self._lock:
+                self._in_progress.pop(key, None)
+
+    def wait(self):
+        """Wait for the refreshes in progress to complete."""
+        with self._lock:
+            futures = list(self._in_progress.values())
+        for future in futures:
+            future.result()
@@ -0,0 +1,159 @@
+"""
+This module (response_cache.py) provides a persistent cache of the responses
+from the market data API (Alpha Vantage).
+
+The responses are stored (compressed) in an SQLite database in the instance
+folder, so that the cache is shared by all the worker processes and survives a
+restart of the application. Each Alpha Vantage function has its own time-to-live:
+    GLOBAL_QUOTE - MARKET_DATA_RESPONSE_CACHE_QUOTE_TTL seconds
+    TIME_SERIES_WEEKLY_ADJUSTED - until the close of the last trading day of the week
+    OVERVIEW - MARKET_DATA_RESPONSE_CACHE_OVERVIEW_TTL seconds
+"""
+from project.cache import SQLiteConnections
+from project.market_data.market_calendar import market_calendar
+from datetime import datetime
+from threading import Lock
+import json
+import os
+import sqlite3
+import time
+import zlib
+
+
+class ResponseCache(object):
+    """
+    Class that represents a cache of the API responses shared by all the processes.
+
+    The following configuration variables are read by `init_app()`:
+        MARKET_DATA_RESPONSE_CACHE - enables the response cache
+        MARKET_DATA_RESPONSE_CACHE_PATH - path of the SQLite database storing the responses
+        MARKET_DATA_RESPONSE_CACHE_MAX_BYTES - maximum size of the (compressed) responses stored
+        MARKET_DATA_RESPONSE_CACHE_QUOTE_TTL - seconds that a current price (GLOBAL_QUOTE) is valid
+        MARKET_DATA_RESPONSE_CACHE_OVERVIEW_TTL - seconds that a company overview (OVERVIEW) is valid
+
+    Once the maximum size is exceeded, the responses are evicted in the order that
+    they expire (expired responses first), so a hit is only a read of the database.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.path = None
+        self.max_bytes = 50 * 1024 * 1024
+        self.ttls = {'GLOBAL_QUOTE': 300.0, 'OVERVIEW': 86400.0}
+        self._lock = Lock()
+        self._connections = SQLiteConnections()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def init_app(self, app):
+        self.enabled = bool(app.config.get('MARKET_DATA_RESPONSE_CACHE', self.enabled))
+        self.path = app.config.get('MARKET_DATA_RESPONSE_CACHE_PATH', self.path)
+        self.max_bytes = app.config.get('MARKET_DATA_RESPONSE_CACHE_MAX_BYTES', self.max_bytes)
+        self.ttls = {'GLOBAL_QUOTE': app.config.get('MARKET_DATA_RESPONSE_CACHE_QUOTE_TTL', self.ttls['GLOBAL_QUOTE']),
+                     'OVERVIEW': app.config.get('MARKET_DATA_RESPONSE_CACHE_OVERVIEW_TTL', self.ttls['OVERVIEW'])}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.enabled:
+            try:
+                self._create_table()
+            except sqlite3.Error:
+                app.logger.exception('Error! Unable to create the market data response cache, so it is disabled!')
+                self.enabled = False
+
+    def is_cacheable(self, function: str) -> bool:
+        return self.enabled and (function in self.ttls or function == 'TIME_SERIES_WEEKLY_ADJUSTED')
+
+    def get_ttl(self, function: str) -> float:
+        if function == 'TIME_SERIES_WEEKLY_ADJUSTED':
+            now = datetime.now(market_calendar.timezone)
+            return (market_calendar.get_next_week_close(now) - now).total_seconds()
+        return self.ttls[function]
+
+    def _connect(self) -> sqlite3.Connection:
+        # The database is locked by SQLite across processes, so each write is a transaction
+        return self._connections.get(self.path)
+
+    def _create_table(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS responses ('
+                               'key TEXT PRIMARY KEY, '
+                               'payload BLOB NOT NULL, '
+                               'size INTEGER NOT NULL, '
+                               'expires_at REAL NOT NULL, '
+                               'accessed_at REAL NOT NULL)')
+
+    @staticmethod
+    def create_key(function: str, symbol: str) -> str:
+        return f'{function}:{symbol.upper()}'
+
+    def get(self, function: str, symbol: str):
+        """Return the response stored for the function and symbol, or None if it is missing or has expired."""
+        key = self.create_key(function, symbol)
+        now = time.time()
+        row = self._connect().execute('SELECT payload FROM responses WHERE key = ? AND expires_at > ?',
+                                      (key, now)).fetchone()
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        return json.loads(zlib.decompress(row[0]))
+
+    def set(self, function: str, symbol: str, data: dict):
+        payload = zlib.compress(json.dumps(data, separators=(',', ':')).encode())
+        now = time.time()
+        with self._connect() as connection:
+            # The access time is only set when the response is stored, so a hit does not write to the database
+            connection.execute('INSERT OR REPLACE INTO responses (key, payload, size, expires_at, accessed_at) '
+                               'VALUES (?, ?, ?, ?, ?)',
+                               (self.create_key(function, symbol), payload, len(payload),
+                                now + self.get_ttl(function), now))
+            self._evict(connection)
+
+    def _evict(self, connection: sqlite3.Connection):
+        total_size = connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total_size <= self.max_bytes:
+            return
+
+        # Evict the expired responses first, and then the responses that expire first
+        rows = connection.execute('SELECT key, size FROM responses ORDER BY expires_at').fetchall()
+        evicted_keys = []
+        for key, size in rows:
+            if total_size <= self.max_bytes:
+                break
+            evicted_keys.append((key,))
+            total_size -= size
+
+        connection.executemany('DELETE FROM responses WHERE key = ?', evicted_keys)
+        with self._lock:
+            self.evictions += len(evicted_keys)
+
+    def clear(self):
+        with self._connect() as connection:
+            connection.execute('DELETE FROM responses')
+
+    def stats(self) -> dict:
+        entries, size = 0, 0
+        if self.enabled:
+            try:
+                entries, size = self._connect().execute('SELECT COUNT(*), COALESCE(SUM(size), 0) '
+                                                        'FROM responses').fetchone()
+            except sqlite3.Error:
+                entries, size = None, None
+
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'entries': entries,
+                'size': size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,223 @@
+"""
+This module (series.py) provides the column-oriented storage of a weekly
+time series of stock prices retrieved from the market data API, as well as
+streaming parsers for the (large) JSON and CSV payloads of a time series.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+import codecs
+import itertools
+import json
+import re
+
+
+class WeeklySeries(object):
+    """
+    Class that represents a weekly time series of closing prices.
+
+    The time series is stored as two columns sorted from oldest to latest:
+        dates - dates in ISO format (YYYY-MM-DD), which sort in chronological order
+        closes - closing prices stored in an array of floats
+
+    Since the dates are sorted, the start of a range of dates is found by a
+    binary search and the range is returned as a slice of each column, so
+    only the dates within the range are ever converted to datetime objects.
+    """
+
+    def __init__(self, dates: list, closes: array):
+        self.dates = dates
+        self.closes = closes
+
+    @classmethod
+    def from_time_series(cls, time_series: dict, start_date: datetime = None, inclusive: bool = False,
+                         close_key: str = '4. close'):
+        """Create a WeeklySeries from a time series (dictionary of dates to prices) from Alpha Vantage.
+
+        If a start date is specified, only the weeks after (or from, if inclusive)
+        the start date are included and only their closing prices are converted.
+        """
+        # Alpha Vantage returns the dates from latest to oldest, which are
+        # sorted in linear time as a single descending run
+        dates = sorted(time_series)
+        if start_date is not None:
+            dates = dates[cls._find_start_index(dates, start_date, inclusive):]
+
+        closes = array('d', (float(time_series[date][close_key]) for date in dates))
+        return cls(dates, closes)
+
+    @staticmethod
+    def _find_start_index(dates: list, start_date: datetime, inclusive: bool) -> int:
+        start_key = start_date.strftime('%Y-%m-%d')
+        if inclusive:
+            return bisect_left(dates, start_key)
+        return bisect_right(dates, start_key)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def since(self, start_date: datetime, inclusive: bool = False):
+        """Return the weeks after (or from, if inclusive) the start date as a new WeeklySeries."""
+        index = self._find_start_index(self.dates, start_date, inclusive)
+        return WeeklySeries(self.dates[index:], self.closes[index:])
+
+    def labels(self) -> list:
+        return [datetime.fromisoformat(date) for date in self.dates]
+
+    def values(self) -> list:
+        return self.closes.tolist()
+
+
+# Tokens of the JSON payload of a time series, which can be preceded by whitespace
+TIME_SERIES_START = re.compile(r'[ \t\n\r]*:[ \t\n\r]*\{')
+ENTRY_KEY = re.compile(r'[ \t\n\r]*"([^"\\]*)"[ \t\n\r]*:[ \t\n\r]*')
+ENTRY_SEPARATOR = re.compile(r'[ \t\n\r]*([,}])')
+
+
+class _ChunkReader(object):
+    """Reader of JSON tokens and values from the chunks (bytes or str) of a response body.
+
+    Only the text that has not been consumed yet is kept in the buffer, so the
+    memory used is proportional to the size of a chunk rather than the payload.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json_decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+
+    def read_more(self) -> bool:
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            return False
+        if isinstance(chunk, bytes):
+            chunk = self._decoder.decode(chunk)
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def find(self, text: str) -> bool:
+        """Move past the next occurrence of the text, without discarding the text before it."""
+        start = self.pos
+        while (index := self.buffer.find(text, start)) < 0:
+            # Only the end of the buffer needs to be searched again, as the text may span two chunks
+            offset = max(len(self.buffer) - len(text) + 1 - self.pos, 0)
+            if not self.read_more():
+                return False
+            start = self.pos + offset
+        self.pos = index + len(text)
+        return True
+
+    def match(self, pattern: re.Pattern):
+        """Consume and return the match of the pattern at the current position, or None if it does not match."""
+        # A match that ends at the end of the buffer may continue in the next chunk
+        while (match := pattern.match(self.buffer, self.pos)) is None or match.end() == len(self.buffer):
+            if not self.read_more():
+                break
+        if match is not None:
+            self.pos = match.end()
+        return match
+
+    def decode(self):
+        """Consume and return the JSON object at the current position."""
+        while True:
+            try:
+                value, self.pos = self._json_decoder.raw_decode(self.buffer, self.pos)
+                return value
+            except json.JSONDecodeError:
+                # The object may continue in the next chunk
+                if not self.read_more():
+                    raise
+
+
+def parse_time_series(chunks, series_key: str, close_key: str = '4. close', start_date: datetime = None) -> dict:
+    """Parse the JSON payload of a time series from Alpha Vantage from the chunks of the response body.
+
+    Only the closing prices of the time series are kept, and since Alpha Vantage
+    returns the dates from latest to oldest, the parsing stops at the first date
+    before the start date (which is kept, so the time series is only empty if the
+    payload has no prices). The metadata before the time series is discarded.
+
+    If the payload does not contain the time series (such as when the API rate
+    limit has been exceeded), the entire payload is returned instead.
+    """
+    reader = _ChunkReader(chunks)
+    if not reader.find(json.dumps(series_key)):
+        return json.loads(reader.buffer)
+    if reader.match(TIME_SERIES_START) is None:
+        raise ValueError(f'Invalid JSON: expected the start of the time series at position {reader.pos}')
+
+    start_key = start_date.strftime('%Y-%m-%d') if start_date is not None else None
+    time_series = {}
+    while (entry := reader.match(ENTRY_KEY)) is not None:
+        date = entry.group(1)
+        time_series[date] = {close_key: reader.decode()[close_key]}
+        if start_key is not None and date < start_key:
+            break
+
+        separator = reader.match(ENTRY_SEPARATOR)
+        if separator is None:
+            raise ValueError(f"Invalid JSON: expected ',' or '}}' at position {reader.pos}")
+        if separator.group(1) == '}':
+            break
+
+    return {series_key: time_series}
+
+
+def parse_time_series_csv(chunks, series_key: str, close_key: str = '4. close',
+                          start_date: datetime = None) -> dict:
+    """Parse the CSV payload of a time series from Alpha Vantage (datatype=csv) from the chunks of the response body.
+
+    The CSV payload has a header row ('timestamp,open,high,low,close,...') followed by
+    a row per date from latest to oldest, so only the date and close columns of each
+    row are split out and the parsing stops at the first date before the start date
+    (which is kept). The payload is returned in the same format as `parse_time_series()`.
+
+    Alpha Vantage returns an error (such as the API rate limit being exceeded) as a
+    JSON payload, which is parsed by `parse_time_series()`. A ValueError is raised if
+    the CSV payload does not have the timestamp and close columns.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+    buffer = ''
+    for chunk in chunks:
+        buffer += decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+        if buffer.lstrip():
+            break
+
+    if buffer.lstrip().startswith('{'):
+        return parse_time_series(itertools.chain([buffer], chunks), series_key, close_key, start_date)
+
+    start_key = start_date.strftime('%Y-%m-%d') if start_date is not None else None
+    close_index = None
+    time_series = {}
+    while True:
+        *lines, buffer = buffer.split('\n')
+        for line in lines:
+            fields = line.rstrip('\r').split(',')
+            if close_index is None:
+                if fields[0] != 'timestamp' or 'close' not in fields:
+                    raise ValueError(f'Invalid CSV: unexpected header ({line.strip()})')
+                close_index = fields.index('close')
+                continue
+            if len(fields) <= close_index:
+                continue
+
+            date = fields[0]
+            time_series[date] = {close_key: fields[close_index]}
+            if start_key is not None and date < start_key:
+                return {series_key: time_series}
+
+        chunk = next(chunks, None)
+        if chunk is None:
+            if not buffer.strip():
+                break
+            buffer += '\n'
+        else:
+            buffer += decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+
+    if close_index is None:
+        raise ValueError('Invalid CSV: missing header')
+    return {series_key: time_series}
@@ -1,60 +1,230 @@
-from project import database
-from sqlalchemy import Integer, String, DateTime, Boolean, ForeignKey
+from project import database, quote_cache
+from project.market_data.providers import get_market_data_provider
+from project.market_data.market_calendar import market_calendar
+from project.market_data.series import WeeklySeries
+from sqlalchemy import Integer, String, DateTime, Boolean, ForeignKey, Index, case, event, func, or_
 from sqlalchemy.orm import mapped_column, relationship
+from sqlalchemy.orm.attributes import get_history, set_committed_value
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
-from flask import current_app
+from flask import current_app, g, has_request_context
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial
 import flask_login
-import requests
+import time
 
 
 # ----------------
 # Helper Functions
 # ----------------
 
-def create_alpha_vantage_url_quote(symbol: str) -> str:
-    return 'https://www.alphavantage.co/query?function={}&symbol={}&apikey={}'.format(
-        'GLOBAL_QUOTE',
-        symbol,
-        current_app.config['ALPHA_VANTAGE_API_KEY']
-    )
+def run_concurrently(function, items, default=None, deadline: float = None) -> list:
+    """Call `function` for each item, with the calls made concurrently.
+
+    The calls are dispatched on a thread pool bounded by MARKET_DATA_MAX_CONCURRENCY,
+    so the total time scales with the slowest call instead of the sum of all the calls.
+    If a deadline (in terms of `time.monotonic()`) is specified, the result of each
+    call that has not completed by the deadline is `default`, so that a hung call
+    does not block the request.
+    Returns the results in the same order as the items.
+    """
+    items = list(items)
+    max_workers = min(current_app.config['MARKET_DATA_MAX_CONCURRENCY'], len(items))
+    if max_workers == 0:
+        return []
+    if max_workers == 1 and deadline is None:
+        return [function(item) for item in items]
+
+    # Each worker thread needs its own application context to access the configuration and logger
+    app = current_app._get_current_object()
+
+    def call_with_app_context(item):
+        with app.app_context():
+            return function(item)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='market-data')
+    futures = [executor.submit(call_with_app_context, item) for item in items]
+    done, not_done = wait(futures, timeout=None if deadline is None else max(deadline - time.monotonic(), 0.0))
+
+    # Do not wait for the calls that missed the deadline, as they complete (or time out) in the background
+    executor.shutdown(wait=False, cancel_futures=True)
+    if not_done:
+        current_app.logger.warning(f'Deadline exceeded when retrieving the market data ({len(not_done)} calls)!')
+
+    return [future.result() if future in done else default for future in futures]
+
+
+def get_market_data_deadline():
+    """Return the deadline for retrieving the market data in the current request.
+
+    The deadline is set by the first call in a request, so all the market data
+    retrieved by the request (current prices, stock analysis data, and weekly
+    prices) shares the same deadline.
+    Returns None if the deadline is disabled or if the market data is not being
+    retrieved for a request (such as by the background refresh of the prices).
+    """
+    if not has_request_context() or current_app.config['MARKET_DATA_DEADLINE'] <= 0:
+        return None
+    if 'market_data_deadline' not in g:
+        g.market_data_deadline = time.monotonic() + current_app.config['MARKET_DATA_DEADLINE']
+    return g.market_data_deadline
 
 
 def get_current_stock_price(symbol: str) -> float:
-    url = create_alpha_vantage_url_quote(symbol)
-
-    # Attempt the GET call to Alpha Vantage and check that a ConnectionError does
-    # not occur, which happens when the GET call fails due to a network issue
-    try:
-        r = requests.get(url)
-    except requests.exceptions.ConnectionError:
-        current_app.logger.error(
-            f'Error! Network problem preventing retrieving the stock data ({symbol})!')
-
-    # Status code returned from Alpha Vantage needs to be 200 (OK) to process stock data
-    if r.status_code != 200:
-        current_app.logger.warning(f'Error! Received unexpected status code ({r.status_code}) '
-                                   f'when retrieving daily stock data ({symbol})!')
-        return 0.0
-
-    stock_data = r.json()
-
-    # The key of 'Global Quote' needs to be present in order to process the stock data.
-    # Typically, this key will not be present if the API rate limit has been exceeded.
-    if 'Global Quote' not in stock_data:
-        current_app.logger.warning(f'Could not find the Global Quote key when retrieving '
-                                   f'the daily stock data ({symbol})!')
-        return 0.0
-
-    return float(stock_data['Global Quote']['05. price'])
-
-
-def create_alpha_vantage_get_url_weekly(symbol: str) -> str:
-    return 'https://www.alphavantage.co/query?function={}&symbol={}&apikey={}'.format(
-        'TIME_SERIES_WEEKLY_ADJUSTED',
-        symbol,
-        current_app.config['ALPHA_VANTAGE_API_KEY']
-    )
+    # Check the quote cache first, as the same stock is typically held (or watched)
+    # by many users and the current price only needs to be retrieved once
+    current_price = quote_cache.get(symbol)
+    if current_price is not None:
+        return current_price
+
+    return retrieve_current_stock_price(symbol)
+
+
+def retrieve_current_stock_price(symbol: str) -> float:
+    current_price = fetch_current_stock_price(symbol)
+
+    # Only cache valid prices so that a failed call is retried on the next request
+    if current_price > 0.0:
+        quote_cache.set(symbol, current_price)
+        return current_price
+
+    # If the current price could not be retrieved (such as when the API budget
+    # has run out), use the last known price even though it has expired
+    last_known_price = quote_cache.get_last_known(symbol)
+    if last_known_price is not None:
+        current_app.logger.info(f'Using the last known price ({last_known_price}) for the stock data ({symbol})!')
+        return last_known_price
+
+    return current_price
+
+
+def get_current_stock_prices(symbols) -> dict:
+    """Retrieve the current price of each stock symbol.
+
+    If ALPHA_VANTAGE_BULK_QUOTES is enabled, the stocks that are not in the quote
+    cache are retrieved in bulk calls of up to ALPHA_VANTAGE_BULK_QUOTES_MAX_SYMBOLS
+    stocks each. Any stock that could not be retrieved in bulk (such as when the
+    bulk endpoint is not available for the API key, or the stock is missing from
+    the bulk response) is retrieved individually.
+    Returns a dictionary of the symbols to the current prices.
+    """
+    symbols = list(dict.fromkeys(symbols))
+    current_prices = {}
+    deadline = get_market_data_deadline()
+
+    for symbol in symbols:
+        current_price = quote_cache.get(symbol)
+        if current_price is not None:
+            current_prices[symbol] = current_price
+
+    stale_symbols = [symbol for symbol in symbols if symbol not in current_prices]
+
+    if stale_symbols and current_app.config['ALPHA_VANTAGE_BULK_QUOTES']:
+        chunk_size = current_app.config['ALPHA_VANTAGE_BULK_QUOTES_MAX_SYMBOLS']
+        chunks = [stale_symbols[index:index + chunk_size] for index in range(0, len(stale_symbols), chunk_size)]
+
+        bulk_results = run_concurrently(fetch_current_stock_prices_bulk, chunks, deadline=deadline)
+        for chunk, bulk_prices in zip(chunks, bulk_results):
+            # Fall back to retrieving each stock individually if the bulk call failed
+            if bulk_prices is None:
+                continue
+
+            # Any stock left out of the bulk response is retrieved individually
+            for symbol in chunk:
+                current_price = bulk_prices.get(symbol.upper(), 0.0)
+                if current_price > 0.0:
+                    current_prices[symbol] = current_price
+                    quote_cache.set(symbol, current_price)
+
+        stale_symbols = [symbol for symbol in stale_symbols if symbol not in current_prices]
+
+    results = run_concurrently(retrieve_current_stock_price, stale_symbols, deadline=deadline)
+    for symbol, current_price in zip(stale_symbols, results):
+        # Use the last known price if the price could not be retrieved before the deadline
+        if current_price is None:
+            current_price = quote_cache.get_last_known(symbol) or 0.0
+        current_prices[symbol] = current_price
+
+    return current_prices
+
+
+def fetch_current_stock_prices_bulk(symbols: list):
+    """Retrieve the current prices of up to 100 stocks in a single call.
+
+    Returns a dictionary of the (uppercase) symbols to the current prices, or
+    None if the bulk call failed.
+    """
+    return get_market_data_provider().get_batch_quotes(symbols)
+
+
+def fetch_current_stock_price(symbol: str) -> float:
+    return get_market_data_provider().get_quote(symbol)
+
+
+def fetch_stock_overview(symbol: str):
+    return get_market_data_provider().get_overview(symbol)
+
+
+def fetch_weekly_stock_data(symbol: str, start_date: datetime = None):
+    """Retrieve the weekly (adjusted) time series of the stock from the market data provider.
+
+    Returns the dictionary of the dates (YYYY-MM-DD) to the weekly data, or
+    None if the weekly data could not be retrieved. If a start date is
+    specified, the weeks before the start date may be omitted.
+    """
+    return get_market_data_provider().get_weekly_series(symbol, start_date)
+
+
+def _is_price_outdated(obj, prices: dict, price_column, date_column, last_close) -> bool:
+    if obj.stock_symbol not in prices:
+        return False
+    price_date = getattr(obj, date_column.key)
+    return getattr(obj, price_column.key) != prices[obj.stock_symbol] or price_date is None or price_date < last_close
+
+
+def bulk_update_current_prices(objects: list, current_prices: dict, price_column, date_column,
+                               position_value_column=None) -> int:
+    """Apply the current prices to the stocks (or watchstocks) in a single UPDATE statement.
+
+    Only the rows where the price has changed, or where the stored price was retrieved
+    before the latest close of the market, are updated. The condition is also checked
+    by the database, so a row refreshed concurrently (such as by a background refresh)
+    is not written again. If there are no rows to update, no statement is executed, so
+    a page view without any stale prices does not need a write transaction.
+
+    The caller is responsible for committing the update.
+    Returns the number of rows updated.
+    """
+    last_close = market_calendar.get_last_close_local()
+    prices = {symbol: int(price * 100) for symbol, price in current_prices.items() if price > 0.0}
+    objects = [obj for obj in objects if _is_price_outdated(obj, prices, price_column, date_column, last_close)]
+    if not objects:
+        return 0
+
+    model = type(objects[0])
+    current_price = case({obj.stock_symbol: prices[obj.stock_symbol] for obj in objects}, value=model.stock_symbol)
+    current_price_date = datetime.now()
+    criteria = (model.id.in_([obj.id for obj in objects]),
+                or_(price_column != current_price, date_column.is_(None), date_column < last_close))
+    if position_value_column is not None:
+        rowcount = Stock.bulk_update_prices(criteria, current_price, current_price_date)
+    else:
+        rowcount = database.session.execute(
+            database.update(model)
+            .where(*criteria)
+            .values({price_column: current_price, date_column: current_price_date})
+            .execution_options(synchronize_session=False)
+        ).rowcount
+
+    # Update the loaded objects to match the database, without marking them as modified
+    for obj in objects:
+        set_committed_value(obj, price_column.key, prices[obj.stock_symbol])
+        set_committed_value(obj, date_column.key, current_price_date)
+        if position_value_column is not None:
+            set_committed_value(obj, position_value_column.key, prices[obj.stock_symbol] * obj.number_of_shares)
+    return rowcount
 
 
 # ---------------
@@ -83,16 +253,24 @@ class Stock(database.Model):
     """
 
     __tablename__ = 'stocks'
+    __table_args__ = (
+        # Portfolio of a user (ordered by ID)
+        Index('ix_stocks_user_id_id', 'user_id', 'id'),
+        # Refreshing the current price of a stock across all portfolios
+        Index('ix_stocks_stock_symbol', 'stock_symbol'),
+    )
 
     id = mapped_column(Integer(), primary_key=True)
     stock_symbol = mapped_column(String())
-    number_of_shares = mapped_column(Integer())
-    purchase_price = mapped_column(Integer())
-    user_id = mapped_column(ForeignKey('users.id'))
+    # The previous values of the columns in the totals of the portfolio are loaded when they are
+    # changed, so that the totals can be updated on flush (see `update_portfolio_summaries()`)
+    number_of_shares = mapped_column(Integer(), active_history=True)
+    purchase_price = mapped_column(Integer(), active_history=True)
+    user_id = mapped_column(ForeignKey('users.id'), active_history=True)
     purchase_date = mapped_column(DateTime())
     current_price = mapped_column(Integer())
     current_price_date = mapped_column(DateTime())
-    position_value = mapped_column(Integer())
+    position_value = mapped_column(Integer(), active_history=True)
 
     # Define the relationship to the `User` class
     user_relationship = relationship('User', back_populates='stocks_relationship')
@@ -112,46 +290,61 @@ class Stock(database.Model):
         return f'{self.stock_symbol} - {self.number_of_shares} shares purchased at ${self.purchase_price / 100}'
 
     def get_stock_data(self):
-        if self.current_price_date is None or self.current_price_date.date() != datetime.now().date():
-            current_price = get_current_stock_price(self.stock_symbol)
-            if current_price > 0.0:
-                self.current_price = int(current_price * 100)
-                self.current_price_date = datetime.now()
-                self.position_value = self.current_price * self.number_of_shares
-                current_app.logger.debug(f'Retrieved current price {self.current_price / 100} '
-                                         f'for the stock data ({self.stock_symbol})!')
+        if self.is_current_price_stale():
+            self.update_current_price(get_current_stock_price(self.stock_symbol))
+
+    def is_current_price_stale(self) -> bool:
+        # The current price can only change once the market has closed again since it was retrieved
+        return not market_calendar.is_current(self.current_price_date)
+
+    def update_current_price(self, current_price: float):
+        if current_price > 0.0:
+            self.current_price = int(current_price * 100)
+            self.current_price_date = datetime.now()
+            self.position_value = self.current_price * self.number_of_shares
+            current_app.logger.debug(f'Retrieved current price {self.current_price / 100} '
+                                     f'for the stock data ({self.stock_symbol})!')
+
+    @staticmethod
+    def update_current_prices(stocks: list, current_prices: dict) -> int:
+        """Apply the current prices to the stocks in a single UPDATE statement (see `bulk_update_current_prices()`)."""
+        return bulk_update_current_prices(stocks, current_prices, Stock.current_price, Stock.current_price_date,
+                                          Stock.position_value)
+
+    @staticmethod
+    def bulk_update_prices(criteria, current_price, current_price_date: datetime) -> int:
+        """Set the current price (an integer or an expression) of the stocks matching the criteria in a single UPDATE statement.
+
+        The total values of the portfolios holding the stocks are updated first, as the
+        UPDATE statement bypasses the session (see `update_portfolio_summaries()`). Every
+        UPDATE statement of the stocks needs to go through this method.
+
+        The caller is responsible for committing the update.
+        Returns the number of stocks updated.
+        """
+        position_value = current_price * Stock.number_of_shares
+        PortfolioSummary.refresh_total_values(criteria, position_value, current_price_date)
+        return database.session.execute(
+            database.update(Stock)
+            .where(*criteria)
+            .values(current_price=current_price, current_price_date=current_price_date, position_value=position_value)
+            .execution_options(synchronize_session=False)
+        ).rowcount
 
     def get_stock_position_value(self) -> float:
         return float(self.position_value / 100)
 
-    def get_weekly_stock_data(self):
-        title = 'Stock chart is unavailable.'
-        labels = []
-        values = []
-        url = create_alpha_vantage_get_url_weekly(self.stock_symbol)
-
-        try:
-            r = requests.get(url)
-        except requests.exceptions.ConnectionError:
-            current_app.logger.info(
-                f'Error! Network problem preventing retrieving the weekly stock data ({self.stock_symbol})!')
-
-        # Status code returned from Alpha Vantage needs to be 200 (OK) to process stock data
-        if r.status_code != 200:
-            current_app.logger.warning(f'Error! Received unexpected status code ({r.status_code}) '
-                                       f'when retrieving weekly stock data ({self.stock_symbol})!')
-            return title, '', ''
+    def get_cost_basis(self) -> int:
+        return self.number_of_shares * self.purchase_price
 
-        weekly_data = r.json()
+    def get_gain(self) -> float:
+        return float((self.position_value - self.number_of_shares * self.purchase_price) / 100)
 
-        # The key of 'Weekly Adjusted Time Series' needs to be present in order to process the stock data
-        # Typically, this key will not be present if the API rate limit has been exceeded.
-        if 'Weekly Adjusted Time Series' not in weekly_data:
-            current_app.logger.warning(f'Could not find the Weekly Adjusted Time Series key when retrieving '
-                                       f'the weekly stock data ({self.stock_symbol})!')
-            return title, '', ''
+    def get_weekly_stock_data(self):
+        title = 'Stock chart is unavailable.'
 
-        title = f'Weekly Prices ({self.stock_symbol})'
+        # Retrieve any weekly prices that are newer than the prices already stored
+        PriceHistory.sync_weekly_prices(self.stock_symbol)
 
         # Determine the start date as either:
         #   - If the start date is less than 12 weeks ago, then use the date from 12 weeks ago
@@ -160,16 +353,18 @@ class Stock(database.Model):
         if (datetime.now() - self.purchase_date) < timedelta(weeks=12):
             start_date = datetime.now() - timedelta(weeks=12)
 
-        for element in weekly_data['Weekly Adjusted Time Series']:
-            date = datetime.fromisoformat(element)
-            if date.date() > start_date.date():
-                labels.append(date)
-                values.append(weekly_data['Weekly Adjusted Time Series'][element]['4. close'])
+        query = (database.select(PriceHistory.date, PriceHistory.close_price)
+                 .where(PriceHistory.stock_symbol == self.stock_symbol,
+                        PriceHistory.date > datetime.combine(start_date.date(), datetime.min.time()))
+                 .order_by(PriceHistory.date))
+        weekly_prices = database.session.execute(query).all()
 
-        # Reverse the elements as the data from Alpha Vantage is read in latest to oldest
-        labels.reverse()
-        values.reverse()
+        if not weekly_prices:
+            return title, '', ''
 
+        title = f'Weekly Prices ({self.stock_symbol})'
+        labels = [date for date, _ in weekly_prices]
+        values = [close_price / 100 for _, close_price in weekly_prices]
         return title, labels, values
 
     def update(self, number_of_shares='', purchase_price='', purchase_date=None):
@@ -184,6 +379,170 @@ class Stock(database.Model):
             self.purchase_date = purchase_date
 
 
+class PortfolioSummary(database.Model):
+    """
+    Class that represents the totals of the portfolio of a user.
+
+    The totals are updated incrementally whenever a stock is added, edited or deleted
+    and whenever the current prices are refreshed, so they are read without iterating
+    over the stocks in the portfolio. The changes to the stocks in the session are
+    applied on flush (see `update_portfolio_summaries()`) and the UPDATE statements
+    of the stocks are applied by `Stock.bulk_update_prices()`, so the totals do not
+    need to be changed by the callers:
+        total value - sum of the position values of the stocks (type: integer)
+        cost basis - sum of the number of shares * purchase price of the stocks (type: integer)
+        number of positions - number of stocks in the portfolio (type: integer)
+        last refreshed - date & time when a current price in the portfolio was last refreshed
+
+    A user that has never added a stock does not have a row in this table.
+
+    Note: Due to a limitation in the data types supported by SQLite, the
+          total value and cost basis are stored as integers (see `Stock`).
+    """
+
+    __tablename__ = 'portfolio_summary'
+
+    user_id = mapped_column(ForeignKey('users.id'), primary_key=True)
+    total_value = mapped_column(Integer(), nullable=False, default=0)
+    cost_basis = mapped_column(Integer(), nullable=False, default=0)
+    number_of_positions = mapped_column(Integer(), nullable=False, default=0)
+    last_refreshed = mapped_column(DateTime())
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.total_value = 0
+        self.cost_basis = 0
+        self.number_of_positions = 0
+        self.last_refreshed = None
+
+    def __repr__(self):
+        return f'<PortfolioSummary: {self.user_id} - {self.number_of_positions} positions worth ${self.total_value / 100}>'
+
+    @staticmethod
+    def get(user_id: int):
+        """Return the totals of the portfolio of the user (all zero if the user has never added a stock)."""
+        summary = database.session.get(PortfolioSummary, user_id)
+        return summary if summary is not None else PortfolioSummary(user_id)
+
+    @staticmethod
+    def change_totals(user_id: int, total_value: int = 0, cost_basis: int = 0, number_of_positions: int = 0,
+                      last_refreshed: datetime = None):
+        """Add the changes to the totals of the portfolio of the user.
+
+        The changes are added by the database in a single statement (inserting the row if
+        it does not exist yet), so concurrent changes to the same portfolio are not lost.
+        """
+        values = {'total_value': total_value, 'cost_basis': cost_basis, 'number_of_positions': number_of_positions}
+        dialect_insert = postgresql_insert if database.session.get_bind().dialect.name == 'postgresql' else sqlite_insert
+        insert = dialect_insert(PortfolioSummary).values(user_id=user_id, last_refreshed=last_refreshed, **values)
+        set_ = {name: getattr(PortfolioSummary, name) + getattr(insert.excluded, name) for name in values}
+        if last_refreshed is not None:
+            set_['last_refreshed'] = insert.excluded.last_refreshed
+        database.session.execute(insert.on_conflict_do_update(index_elements=['user_id'], set_=set_))
+        PortfolioSummary._expire_loaded()
+
+    @staticmethod
+    def refresh_total_values(criteria, position_value, last_refreshed: datetime):
+        """Add the changes in the position values of the stocks matching the criteria to the total values.
+
+        This needs to be called before the stocks are updated with the new position values
+        (an expression of the stock columns), as the changes are calculated from the stored
+        position values.
+
+        The totals are locked first (SELECT ... FOR UPDATE, in the order of the user IDs), so
+        a concurrent refresh of the same stocks waits until this transaction is committed and
+        calculates its changes from the position values stored by this refresh, instead of
+        adding the same change again. SQLite does not support (or need) the row locks, as it
+        only allows one write transaction at a time.
+        """
+        users = database.select(Stock.user_id).where(*criteria)
+        database.session.execute(
+            database.select(PortfolioSummary.user_id)
+            .where(PortfolioSummary.user_id.in_(users))
+            .order_by(PortfolioSummary.user_id)
+            .with_for_update()
+        )
+        change = (database.select(func.coalesce(func.sum(position_value - func.coalesce(Stock.position_value, 0)), 0))
+                  .where(Stock.user_id == PortfolioSummary.user_id, *criteria)
+                  .scalar_subquery())
+        database.session.execute(
+            database.update(PortfolioSummary)
+            .where(PortfolioSummary.user_id.in_(users))
+            .values(total_value=PortfolioSummary.total_value + change, last_refreshed=last_refreshed)
+            .execution_options(synchronize_session=False)
+        )
+        PortfolioSummary._expire_loaded()
+
+    @staticmethod
+    def _expire_loaded():
+        # Any totals already loaded are outdated, so they are reloaded when next accessed
+        for obj in list(database.session.identity_map.values()):
+            if isinstance(obj, PortfolioSummary):
+                database.session.expire(obj)
+
+    def get_total_value(self) -> float:
+        return self.total_value / 100
+
+    def get_cost_basis(self) -> float:
+        return self.cost_basis / 100
+
+
+def _get_stock_totals(stock, previous: bool) -> tuple:
+    # Return the user ID and the totals (position value, cost basis) of the stock, either before
+    # or after the changes in the session
+    values = {}
+    for key in ('user_id', 'position_value', 'number_of_shares', 'purchase_price'):
+        if previous:
+            history = get_history(stock, key)
+            values[key] = (list(history.deleted) + list(history.unchanged) + [None])[0]
+        else:
+            values[key] = getattr(stock, key)
+    return values['user_id'], values['position_value'] or 0, (values['number_of_shares'] or 0) * (values['purchase_price'] or 0)
+
+
+@event.listens_for(database.session, 'before_flush')
+def update_portfolio_summaries(session, flush_context, instances):
+    """Apply the changes to the stocks added, updated or deleted in the session to the totals of the portfolios.
+
+    The changes are added up per user, so the totals of each portfolio are changed in a
+    single statement per flush, however many of its stocks have been changed.
+    """
+    changes = {}
+
+    def add_change(user_id, total_value, cost_basis, number_of_positions, last_refreshed=None):
+        if user_id is None:
+            return
+        change = changes.setdefault(user_id, {'total_value': 0, 'cost_basis': 0, 'number_of_positions': 0,
+                                              'last_refreshed': None})
+        change['total_value'] += total_value
+        change['cost_basis'] += cost_basis
+        change['number_of_positions'] += number_of_positions
+        if last_refreshed is not None and (change['last_refreshed'] is None or last_refreshed > change['last_refreshed']):
+            change['last_refreshed'] = last_refreshed
+
+    for stock in session.new:
+        if isinstance(stock, Stock):
+            add_change(*_get_stock_totals(stock, previous=False), 1, stock.current_price_date)
+
+    for stock in session.dirty:
+        if isinstance(stock, Stock) and session.is_modified(stock):
+            previous_user_id, previous_total_value, previous_cost_basis = _get_stock_totals(stock, previous=True)
+            user_id, total_value, cost_basis = _get_stock_totals(stock, previous=False)
+            last_refreshed = (list(get_history(stock, 'current_price_date').added) + [None])[0]
+            moved = int(user_id != previous_user_id)
+            add_change(previous_user_id, -previous_total_value, -previous_cost_basis, -moved)
+            add_change(user_id, total_value, cost_basis, moved, last_refreshed)
+
+    for stock in session.deleted:
+        if isinstance(stock, Stock):
+            user_id, total_value, cost_basis = _get_stock_totals(stock, previous=True)
+            add_change(user_id, -total_value, -cost_basis, -1)
+
+    for user_id, change in changes.items():
+        if any(change.values()):
+            PortfolioSummary.change_totals(user_id, **change)
+
+
 class User(flask_login.UserMixin, database.Model):
     """
     Class that represents a user of the application
@@ -215,6 +574,9 @@ class User(flask_login.UserMixin, database.Model):
     # Define the relationship to the `WatchStock` class
     watchstocks_relationship = relationship('WatchStock', back_populates='user_relationship')
 
+    # Define the relationship to the `PortfolioSummary` class, which is deleted with the user
+    summary_relationship = relationship('PortfolioSummary', uselist=False, cascade='all, delete-orphan')
+
     def __init__(self, email: str, password_plaintext: str, user_type='User'):
         """Create a new User object
 
@@ -254,27 +616,31 @@ class User(flask_login.UserMixin, database.Model):
         self.email_confirmed_on = None
 
 
+def fundamentals_property(name: str, default=None):
+    """Return a property of a `WatchStock` that reads the stock analysis data from the shared fundamentals."""
+    def getter(self):
+        fundamentals = self.fundamentals_relationship
+        if fundamentals is None:
+            return default
+        return getattr(fundamentals, name)
+
+    return property(getter)
+
+
 class WatchStock(database.Model):
     """
     Class that represents a stock in a watch list.
 
     The following attributes of a stock are stored in this table:
         stock symbol (type: string)
-        company name (type: string)
         current share price (type: integer)
         date when current price was retrieved from the Alpha Vantage API (type: datetime)
-        52-week low (type: integer)
-        52-week high (type: integer)
-        market cap (type: string)
-        dividend per share (type: integer)
-        p/e ratio (type: integer)
-        peg ratio (type: integer)
-        profit margin (type: integer)
-        beta (type: integer)
-        price-to-book ratio (type: integer)
-        date when stock data was retrieved from the Alpha Vantage API (type: datetime)
         primary key of User that owns the watchstock (type: integer)
 
+    The stock analysis data (company name, 52-week low/high, market cap, etc.) is
+    the same for every user watching a stock, so it is stored once per stock in the
+    `security_fundamentals` table and read through a join on the stock symbol.
+
     Note: Due to a limitation in the data types supported by SQLite, the
           attributes displayed as floating point values are stored as integers:
               $24.10 -> 2410
@@ -284,122 +650,100 @@ class WatchStock(database.Model):
     """
 
     __tablename__ = 'watchstocks'
+    __table_args__ = (
+        # Watchlist of a user (ordered by ID) and the number of stocks per user
+        Index('ix_watchstocks_user_id_id', 'user_id', 'id'),
+        # Refreshing the current price of a stock across all watchlists
+        Index('ix_watchstocks_stock_symbol', 'stock_symbol'),
+    )
 
     id = mapped_column(Integer(), primary_key=True)
     stock_symbol = mapped_column(String(), nullable=False)
-    company_name = mapped_column(String())
     current_share_price = mapped_column(Integer())
     current_share_price_date = mapped_column(DateTime())
-    fiftytwo_week_low = mapped_column(Integer())
-    fiftytwo_week_high = mapped_column(Integer())
-    market_cap = mapped_column(String())
-    dividend_per_share = mapped_column(Integer())
-    pe_ratio = mapped_column(Integer())
-    peg_ratio = mapped_column(Integer())
-    profit_margin = mapped_column(Integer())
-    beta = mapped_column(Integer())
-    price_to_book_ratio = mapped_column(Integer())
-    stock_data_date = mapped_column(DateTime())
     user_id = mapped_column(ForeignKey('users.id'))
 
     # Define the relationship to the `User` class
     user_relationship = relationship('User', back_populates='watchstocks_relationship')
 
+    # Define the relationship to the `SecurityFundamentals` class, which is loaded
+    # with the watchstocks (LEFT OUTER JOIN) since the fundamentals may not exist yet
+    fundamentals_relationship = relationship(
+        'SecurityFundamentals',
+        primaryjoin='foreign(WatchStock.stock_symbol) == SecurityFundamentals.stock_symbol',
+        lazy='joined',
+        viewonly=True
+    )
+
+    company_name = fundamentals_property('company_name')
+    fiftytwo_week_low = fundamentals_property('fiftytwo_week_low', 0)
+    fiftytwo_week_high = fundamentals_property('fiftytwo_week_high', 0)
+    market_cap = fundamentals_property('market_cap')
+    dividend_per_share = fundamentals_property('dividend_per_share', 0)
+    pe_ratio = fundamentals_property('pe_ratio', 0)
+    peg_ratio = fundamentals_property('peg_ratio', 0)
+    profit_margin = fundamentals_property('profit_margin', 0)
+    beta = fundamentals_property('beta', 0)
+    price_to_book_ratio = fundamentals_property('price_to_book_ratio', 0)
+    stock_data_date = fundamentals_property('stock_data_date')
+
     def __init__(self, stock_symbol: str, user_id: str):
         self.stock_symbol = stock_symbol
-        self.company_name = None
         self.current_share_price = 0
         self.current_share_price_date = None
-        self.fiftytwo_week_low = 0
-        self.fiftytwo_week_high = 0
-        self.market_cap = None
-        self.dividend_per_share = 0
-        self.pe_ratio = 0
-        self.peg_ratio = 0
-        self.profit_margin = 0
-        self.beta = 0
-        self.price_to_book_ratio = 0
-        self.stock_data_date = None
         self.user_id = user_id
 
     def __repr__(self):
         return f'{self.stock_symbol}'
 
     def retrieve_current_share_price(self):
-        if self.current_share_price_date is None or self.current_share_price_date.date() != datetime.now().date():
-            current_price = get_current_stock_price(self.stock_symbol)
-            if current_price > 0.0:
-                self.current_share_price = int(current_price * 100)
-                self.current_share_price_date = datetime.now()
-                current_app.logger.info(f'Retrieved current price {self.current_share_price / 100} '
-                                        f'for {self.stock_symbol}!')
-
-    def create_alpha_vantage_url_overview(self):
-        return 'https://www.alphavantage.co/query?function={}&symbol={}&apikey={}'.format(
-            'OVERVIEW',
-            self.stock_symbol,
-            current_app.config['ALPHA_VANTAGE_API_KEY']
-        )
-
-    def retrieve_stock_analysis_data(self):
-        # If the stock analysis data has already been retrieved for the current day, then the
-        # data is still valid and there is no need to retrieve it again
-        if self.stock_data_date is not None and self.stock_data_date.date() == datetime.now().date():
-            current_app.logger.info(f'Valid stock analysis data for {self.stock_symbol} '
-                                    f'already exists ({self.stock_data_date}).')
-            return
+        if self.is_current_share_price_stale():
+            self.update_current_share_price(get_current_stock_price(self.stock_symbol))
 
-        # Attempt the GET call to Alpha Vantage and check that a ConnectionError does
-        # not occur, which happens when the GET call fails due to a network issue
-        try:
-            url = self.create_alpha_vantage_url_overview()
-            r = requests.get(url)
-        except requests.exceptions.ConnectionError:
-            current_app.logger.error(
-                f'Error! Network problem preventing retrieving the stock analysis data ({self.stock_symbol})!')
-
-        # Status code returned from Alpha Vantage needs to be 200 (OK) to process stock data
-        if r.status_code != 200:
-            current_app.logger.warning(f'Error! Received unexpected status code ({r.status_code}) '
-                                       f'when retrieving stock analysis data ({self.stock_symbol})!')
-            return
+    def is_current_share_price_stale(self) -> bool:
+        return not market_calendar.is_current(self.current_share_price_date)
 
-        data = r.json()
+    def update_current_share_price(self, current_price: float):
+        if current_price > 0.0:
+            self.current_share_price = int(current_price * 100)
+            self.current_share_price_date = datetime.now()
+            current_app.logger.info(f'Retrieved current price {self.current_share_price / 100} '
+                                    f'for {self.stock_symbol}!')
 
-        # The key of 'AssetType' needs to be present in order to confirm that valid data is available.
-        # Typically, this key will not be present if the API rate limit has been exceeded.
-        if 'AssetType' not in data:
-            current_app.logger.warning(f'Could not find valid data when retrieving '
-                                       f'the stock analysis data ({self.stock_symbol})!')
-            return
+    @staticmethod
+    def update_current_share_prices(watchstocks: list, current_prices: dict) -> int:
+        """Apply the current prices to the watchstocks in a single UPDATE statement (see `bulk_update_current_prices()`)."""
+        return bulk_update_current_prices(watchstocks, current_prices, WatchStock.current_share_price,
+                                          WatchStock.current_share_price_date)
 
-        self.company_name = data['Name']
-        self.fiftytwo_week_low = self.parse_input_string_integer(data['52WeekLow'])
-        self.fiftytwo_week_high = self.parse_input_string_integer(data['52WeekHigh'])
-        self.market_cap = data['MarketCapitalization']
-        self.dividend_per_share = self.parse_input_string_integer(data['DividendPerShare'])
-        self.pe_ratio = self.parse_input_string_integer(data['PERatio'])
-        self.peg_ratio = self.parse_input_string_integer(data['PEGRatio'])
-        self.profit_margin = self.parse_input_string_percentage(data['ProfitMargin'])
-        self.beta = self.parse_input_string_integer(data['Beta'])
-        self.price_to_book_ratio = self.parse_input_string_integer(data['PriceToBookRatio'])
-        self.stock_data_date = datetime.now()
-        current_app.logger.info(f'Retrieved valid stock analysis data for {self.stock_symbol} '
-                                f'at time {self.stock_data_date}.')
+    def is_stock_analysis_data_stale(self) -> bool:
+        return not market_calendar.is_current(self.stock_data_date)
 
-    @staticmethod
-    def parse_input_string_integer(input_field: str) -> int:
-        if input_field == 'None' or input_field == '' or input_field == '-':
-            return 0
+    def retrieve_stock_analysis_data(self):
+        # If the stock analysis data has already been retrieved since the latest close of the
+        # market, then the data is still valid and there is no need to retrieve it again
+        if not self.is_stock_analysis_data_stale():
+            current_app.logger.info(f'Valid stock analysis data for {self.stock_symbol} '
+                                    f'already exists ({self.stock_data_date}).')
+            return
 
-        return int(float(input_field) * 100)
+        fundamentals = SecurityFundamentals.retrieve(self.stock_symbol)
+        if fundamentals is not None:
+            self.fundamentals_relationship = fundamentals
 
     @staticmethod
-    def parse_input_string_percentage(input_field: str) -> int:
-        if input_field == 'None' or input_field == '':
-            return 0
+    def update_stock_analysis_data(watchstocks: list) -> int:
+        """Retrieve the stale stock analysis data of the watchstocks (see `SecurityFundamentals.retrieve_stale()`).
 
-        return int(float(input_field) * 10000)
+        Returns the number of stocks with updated stock analysis data, so a failed retrieval
+        does not need a commit.
+        """
+        stale_watchstocks = [watchstock for watchstock in watchstocks if watchstock.is_stock_analysis_data_stale()]
+        retrieved_fundamentals = SecurityFundamentals.retrieve_stale(watchstock.stock_symbol for watchstock in stale_watchstocks)
+        for watchstock in stale_watchstocks:
+            if watchstock.stock_symbol in retrieved_fundamentals:
+                watchstock.fundamentals_relationship = retrieved_fundamentals[watchstock.stock_symbol]
+        return len(retrieved_fundamentals)
 
     def get_current_share_price(self) -> float:
         return self.current_share_price / 100
@@ -439,3 +783,207 @@ class WatchStock(database.Model):
         if self.price_to_book_ratio is None:
             return 0.0
         return self.price_to_book_ratio / 100
+
+
+class SecurityFundamentals(database.Model):
+    """
+    Class that represents the stock analysis data of a stock, which is shared by all users.
+
+    The following attributes of a stock are stored in this table:
+        stock symbol (type: string)
+        company name (type: string)
+        52-week low (type: integer)
+        52-week high (type: integer)
+        market cap (type: string)
+        dividend per share (type: integer)
+        p/e ratio (type: integer)
+        peg ratio (type: integer)
+        profit margin (type: integer)
+        beta (type: integer)
+        price-to-book ratio (type: integer)
+        date when stock data was retrieved from the Alpha Vantage API (type: datetime)
+
+    The stock analysis data is retrieved from Alpha Vantage at most once per trading
+    day for each stock, regardless of the number of users watching the stock.
+
+    Note: Due to a limitation in the data types supported by SQLite, the
+          attributes displayed as floating point values are stored as integers
+          (see `WatchStock`).
+    """
+
+    __tablename__ = 'security_fundamentals'
+
+    stock_symbol = mapped_column(String(), primary_key=True)
+    company_name = mapped_column(String())
+    fiftytwo_week_low = mapped_column(Integer())
+    fiftytwo_week_high = mapped_column(Integer())
+    market_cap = mapped_column(String())
+    dividend_per_share = mapped_column(Integer())
+    pe_ratio = mapped_column(Integer())
+    peg_ratio = mapped_column(Integer())
+    profit_margin = mapped_column(Integer())
+    beta = mapped_column(Integer())
+    price_to_book_ratio = mapped_column(Integer())
+    stock_data_date = mapped_column(DateTime())
+
+    def __repr__(self):
+        return f'{self.stock_symbol} - {self.company_name}'
+
+    def is_stale(self) -> bool:
+        return not market_calendar.is_current(self.stock_data_date)
+
+    @staticmethod
+    def retrieve(symbol: str):
+        """Return the stock analysis data of the stock, which is retrieved from Alpha Vantage
+        if it has not already been retrieved since the latest close of the market.
+
+        Returns None if there is no stock analysis data available for the stock.
+        """
+        fundamentals = SecurityFundamentals.retrieve_stale([symbol]).get(symbol)
+        if fundamentals is not None:
+            return fundamentals
+        return database.session.get(SecurityFundamentals, symbol)
+
+    @staticmethod
+    def retrieve_stale(symbols) -> dict:
+        """Retrieve the stock analysis data of the stocks that has not already been retrieved
+        since the latest close of the market.
+
+        The calls to Alpha Vantage are made concurrently within the deadline of the request
+        (see `run_concurrently()`), and the retrieved data is then stored in the database.
+        Returns a dictionary of the symbols to the stock analysis data retrieved, which only
+        includes the stocks that were retrieved successfully.
+        """
+        stale_symbols = []
+        for symbol in dict.fromkeys(symbols):
+            fundamentals = database.session.get(SecurityFundamentals, symbol)
+            if fundamentals is None or fundamentals.is_stale():
+                stale_symbols.append(symbol)
+
+        results = run_concurrently(fetch_stock_overview, stale_symbols, deadline=get_market_data_deadline())
+        return {symbol: SecurityFundamentals.store(symbol, data)
+                for symbol, data in zip(stale_symbols, results) if data is not None}
+
+    @staticmethod
+    def store(symbol: str, data: dict):
+        """Store the stock analysis data of the stock from the response of Alpha Vantage."""
+        values = SecurityFundamentals.parse_overview(data)
+
+        # Insert or update the row in a single statement, as the same stock could be
+        # refreshed concurrently by another request or worker process
+        dialect_insert = postgresql_insert if database.session.get_bind().dialect.name == 'postgresql' else sqlite_insert
+        database.session.execute(
+            dialect_insert(SecurityFundamentals)
+            .values(stock_symbol=symbol, **values)
+            .on_conflict_do_update(index_elements=['stock_symbol'], set_=values)
+        )
+        current_app.logger.info(f'Retrieved valid stock analysis data for {symbol} '
+                                f'at time {values["stock_data_date"]}.')
+        return database.session.get(SecurityFundamentals, symbol, populate_existing=True)
+
+    @staticmethod
+    def parse_overview(data: dict) -> dict:
+        return {
+            'company_name': data['Name'],
+            'fiftytwo_week_low': SecurityFundamentals.parse_input_string_integer(data['52WeekLow']),
+            'fiftytwo_week_high': SecurityFundamentals.parse_input_string_integer(data['52WeekHigh']),
+            'market_cap': data['MarketCapitalization'],
+            'dividend_per_share': SecurityFundamentals.parse_input_string_integer(data['DividendPerShare']),
+            'pe_ratio': SecurityFundamentals.parse_input_string_integer(data['PERatio']),
+            'peg_ratio': SecurityFundamentals.parse_input_string_integer(data['PEGRatio']),
+            'profit_margin': SecurityFundamentals.parse_input_string_percentage(data['ProfitMargin']),
+            'beta': SecurityFundamentals.parse_input_string_integer(data['Beta']),
+            'price_to_book_ratio': SecurityFundamentals.parse_input_string_integer(data['PriceToBookRatio']),
+            'stock_data_date': datetime.now(),
+        }
+
+    @staticmethod
+    def parse_input_string_integer(input_field: str) -> int:
+        if input_field == 'None' or input_field == '' or input_field == '-':
+            return 0
+
+        return int(float(input_field) * 100)
+
+    @staticmethod
+    def parse_input_string_percentage(input_field: str) -> int:
+        if input_field == 'None' or input_field == '':
+            return 0
+
+        return int(float(input_field) * 10000)
+
+
+class PriceHistory(database.Model):
+    """
+    Class that represents the weekly closing price of a stock, which is shared by all users.
+
+    The following attributes of a weekly price are stored in this table:
+        stock symbol (type: string)
+        date of the last trading day of the week (type: datetime)
+        closing price (type: integer)
+        date when the closing price was retrieved from the Alpha Vantage API (type: datetime)
+
+    The primary key of (stock symbol, date) is used for retrieving the closing
+    prices of a stock over a range of dates.
+
+    Note: Due to a limitation in the data types supported by SQLite, the
+          closing price is stored as an integer:
+              $354.34 -> 35434
+    """
+
+    __tablename__ = 'price_history'
+
+    stock_symbol = mapped_column(String(), primary_key=True)
+    date = mapped_column(DateTime(), primary_key=True)
+    close_price = mapped_column(Integer())
+    retrieved_on = mapped_column(DateTime())
+
+    def __init__(self, stock_symbol: str, date: datetime, close_price: float, retrieved_on: datetime):
+        self.stock_symbol = stock_symbol
+        self.date = date
+        self.close_price = round(float(close_price) * 100)
+        self.retrieved_on = retrieved_on
+
+    def __repr__(self):
+        return f'{self.stock_symbol} - ${self.close_price / 100} on {self.date.strftime("%Y-%m-%d")}'
+
+    @staticmethod
+    def sync_weekly_prices(symbol: str):
+        """Store the weekly prices of the stock that are newer than the latest stored week.
+
+        The weekly prices are retrieved from Alpha Vantage at most once per week (after the
+        last trading day of the week has closed).
+        """
+        query = (database.select(func.max(PriceHistory.date), func.max(PriceHistory.retrieved_on))
+                 .where(PriceHistory.stock_symbol == symbol))
+        latest_date, last_retrieved_on = database.session.execute(query).one()
+
+        # The weekly prices can only change once the last trading day of a week has closed
+        if market_calendar.is_current_weekly(last_retrieved_on):
+            return
+
+        # The latest stored week could have been retrieved before the end of that week,
+        # so it is replaced along with any newer weeks
+        sync_start_date = None
+        if latest_date is not None:
+            sync_start_date = latest_date - timedelta(days=latest_date.weekday())
+
+        # Retrieve the weekly prices within the deadline of the request (if any), so that a
+        # hung call does not block the request
+        weekly_data = run_concurrently(partial(fetch_weekly_stock_data, start_date=sync_start_date), [symbol],
+                                       deadline=get_market_data_deadline())[0]
+        if weekly_data is None:
+            return
+
+        if sync_start_date is not None:
+            database.session.execute(
+                database.delete(PriceHistory)
+                .where(PriceHistory.stock_symbol == symbol, PriceHistory.date >= sync_start_date)
+            )
+
+        weekly_series = WeeklySeries.from_time_series(weekly_data, sync_start_date, inclusive=True)
+
+        retrieved_on = datetime.now()
+        for date, close_price in zip(weekly_series.labels(), weekly_series.values()):
+            database.session.add(PriceHistory(symbol, date, close_price, retrieved_on))
+
+        current_app.logger.info(f'Retrieved the weekly prices for {symbol}!')
@@ -0,0 +1,93 @@
+"""
+This module (pagination.py) provides the keyset (cursor-based) pagination used by
+the listings of the stocks in a portfolio, the stocks in a watchlist and the users.
+
+Instead of skipping the rows of the previous pages (OFFSET), each page selects the
+rows after the sort key and ID of the last row on the previous page, so the database
+only reads the rows of the page being shown. The sort key and ID of the last row are
+passed to the next page as an opaque cursor (URL-safe base64 encoded JSON).
+"""
+from project import database
+from sqlalchemy import and_, or_
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+import binascii
+import json
+
+
+class SortOption(object):
+    """Class that represents a column (or expression) that a listing can be sorted by.
+
+    The keyset comparisons are never true for NULL, so a nullable column must be
+    wrapped in `coalesce()` to keep its rows in the pages.
+    """
+
+    def __init__(self, expression, descending: bool = False):
+        self.expression = expression
+        self.descending = descending
+
+    def is_valid_sort_key(self, sort_key) -> bool:
+        """Check that a sort key decoded from a cursor has the type of the expression."""
+        python_type = self.expression.type.python_type
+        return isinstance(sort_key, python_type) and not isinstance(sort_key, bool)
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'datetime': value.isoformat()}
+    raise TypeError(f'Sort key of type {type(value).__name__} cannot be stored in a cursor')
+
+
+def _decode_value(value: dict):
+    if 'datetime' in value:
+        return datetime.fromisoformat(value['datetime'])
+    return value
+
+
+def encode_cursor(sort_key, id: int) -> str:
+    """Encode the sort key and ID of the last row on a page as the cursor for the next page."""
+    data = json.dumps([sort_key, id], default=_encode_value, separators=(',', ':'))
+    return urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Decode the sort key and ID from a cursor, raising a ValueError if the cursor is invalid."""
+    try:
+        data = urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        sort_key, id = json.loads(data, object_hook=_decode_value)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        raise ValueError(f'Invalid cursor ({cursor})')
+
+    if not isinstance(id, int):
+        raise ValueError(f'Invalid cursor ({cursor})')
+    return sort_key, id
+
+
+def paginate(query, sort_option: SortOption, id_column, cursor: str = None, per_page: int = 50) -> tuple:
+    """Return a page of the rows selected by the query, sorted by the sort option.
+
+    The rows with the same sort key are ordered by ID, so the order is stable and every
+    row appears on exactly one page. The `cursor` is the cursor returned for the previous
+    page (or None for the first page).
+
+    Returns a tuple of (list of rows, cursor for the next page or None if it is the last page).
+    """
+    sort_key = sort_option.expression
+    if cursor is not None:
+        after_sort_key, after_id = decode_cursor(cursor)
+        if not sort_option.is_valid_sort_key(after_sort_key):
+            raise ValueError(f'Invalid cursor ({cursor})')
+        after = sort_key < after_sort_key if sort_option.descending else sort_key > after_sort_key
+        query = query.where(or_(after, and_(sort_key == after_sort_key, id_column > after_id)))
+
+    # The sort key is selected as an extra column to create the cursor from the last row,
+    # and an extra row is retrieved to check if there is a next page
+    query = (query.add_columns(sort_key.label('sort_key'), id_column.label('sort_id'))
+             .order_by(sort_key.desc() if sort_option.descending else sort_key, id_column)
+             .limit(per_page + 1))
+    rows = database.session.execute(query).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        next_cursor = encode_cursor(rows[per_page - 1].sort_key, rows[per_page - 1].sort_id)
+    return [tuple(row)[:-2] for row in rows[:per_page]], next_cursor
@@ -0,0 +1,22 @@
+// Update the current share prices (and stock position values) shown on the page as
+// they change, using the Server-Sent Events from the price stream of the stocks.
+// The elements to update are identified by the `data-price-symbol` attribute, and
+// a stock position value also has a `data-number-of-shares` attribute.
+(function () {
+  const script = document.currentScript;
+  if (!window.EventSource || !script) {
+    return;
+  }
+
+  const priceStream = new EventSource(script.dataset.streamUrl);
+  priceStream.addEventListener('price', function (event) {
+    const update = JSON.parse(event.data);
+    document.querySelectorAll('[data-price-symbol="' + update.symbol + '"]').forEach(function (element) {
+      if (element.dataset.numberOfShares) {
+        element.textContent = '$' + (update.price * Number(element.dataset.numberOfShares)).toFixed(2);
+      } else {
+        element.textContent = '$' + update.price;
+      }
+    });
+  });
+})();
@@ -1,11 +1,17 @@
 from . import stocks_blueprint
-from flask import current_app, render_template, request, flash, redirect, url_for, abort
+from flask import current_app, render_template, request, flash, redirect, url_for, abort, Response
 from pydantic import BaseModel, field_validator, ValidationError
-from project.models import Stock
+from project.models import PortfolioSummary, Stock, get_current_stock_prices
+from project.market_data.price_stream import price_streamer
+from project.market_data.refresh import get_symbols_by_popularity, refresh_market_data, revalidate_stock_prices
+from project.database_routing import database_router, reads_from_replica
+from project.pagination import SortOption, paginate
 from project import database
-# import click
+from sqlalchemy import func
+import click
 from flask_login import login_required, current_user
 from datetime import datetime
+import time
 
 
 # --------------
@@ -25,6 +31,18 @@ class StockModel(BaseModel):
         return value.upper()
 
 
+# Columns (or expressions) that the portfolio can be sorted by, where the nullable
+# columns are coalesced as the keyset comparisons are never true for NULL
+STOCK_SORT_OPTIONS = {
+    'id': SortOption(Stock.id),
+    'symbol': SortOption(func.coalesce(Stock.stock_symbol, '')),
+    'position_value': SortOption(func.coalesce(Stock.position_value, 0), descending=True),
+    'gain': SortOption(func.coalesce(Stock.position_value, 0) - func.coalesce(Stock.number_of_shares * Stock.purchase_price, 0),
+                       descending=True),
+    'purchase_date': SortOption(func.coalesce(Stock.purchase_date, datetime(1, 1, 1))),
+}
+
+
 # -----------------
 # Request Callbacks
 # -----------------
@@ -78,6 +96,19 @@ class StockModel(BaseModel):
 #     database.session.commit()
 
 
+@stocks_blueprint.cli.command('refresh_prices')
+@click.option('--loop', is_flag=True, help='Keep refreshing the prices every PRICE_REFRESH_INTERVAL seconds.')
+def refresh_prices(loop):
+    """Refresh the current prices of the stocks in all portfolios and watchlists"""
+    while True:
+        number_of_stocks_updated = refresh_market_data()
+        click.echo(f'Refreshed the current prices of {number_of_stocks_updated} stocks!')
+
+        if not loop:
+            break
+        time.sleep(current_app.config['PRICE_REFRESH_INTERVAL'])
+
+
 # ------
 # Routes
 # ------
@@ -121,17 +152,66 @@ def add_stock():
 @stocks_blueprint.route('/stocks')
 @login_required
 def list_stocks():
-    query = database.select(Stock).where(Stock.user_id == current_user.id).order_by(Stock.id)
-    stocks = database.session.execute(query).scalars().all()
+    # The page only reads from a replica if the prices are not updated in this request
+    if current_app.config['PRICE_REFRESH_MODE'] != 'request':
+        database_router.use_replica()
+
+    sort = request.args.get('sort', default='id')
+    if sort not in STOCK_SORT_OPTIONS:
+        abort(400)
+
+    query = database.select(Stock).where(Stock.user_id == current_user.id)
+    try:
+        rows, next_cursor = paginate(query, STOCK_SORT_OPTIONS[sort], Stock.id,
+                                     request.args.get('after'), current_app.config['STOCKS_PER_PAGE'])
+    except ValueError:
+        abort(400)
+    stocks = [stock for stock, in rows]
+
+    # Retrieve the current prices for the stocks with outdated prices concurrently,
+    # and then apply the updates to the database in this request (unless the
+    # prices are refreshed in the background)
+    if current_app.config['PRICE_REFRESH_MODE'] == 'request':
+        stale_stocks = [stock for stock in stocks if stock.is_current_price_stale()]
+
+        # Show the stored prices immediately and refresh them in the background, so only
+        # the stocks without a stored price need to be retrieved in this request
+        if current_app.config['MARKET_DATA_STALE_WHILE_REVALIDATE']:
+            revalidate_stock_prices(stock.stock_symbol for stock in stale_stocks if stock.current_price > 0)
+            stale_stocks = [stock for stock in stale_stocks if stock.current_price == 0]
+
+        # The prices that changed are updated in a single statement, and the page is
+        # shown without a write transaction if there are no stale prices to update
+        current_prices = get_current_stock_prices(stock.stock_symbol for stock in stale_stocks)
+        if Stock.update_current_prices(stale_stocks, current_prices):
+            database.session.commit()
 
-    current_account_value = 0.0
-    for stock in stocks:
-        stock.get_stock_data()
-        database.session.add(stock)
-        current_account_value += stock.get_stock_position_value()
+    # The total value includes the stocks on all the pages, so it is read from the portfolio totals
+    current_account_value = PortfolioSummary.get(current_user.id).get_total_value()
 
-    database.session.commit()
-    return render_template('stocks/stocks.html', stocks=stocks, value=round(current_account_value, 2))
+    next_page_url = None
+    if next_cursor is not None:
+        next_page_url = url_for('stocks.list_stocks', sort=sort, after=next_cursor)
+    return render_template('stocks/stocks.html', stocks=stocks, value=round(current_account_value, 2),
+                           sort=sort, next_page_url=next_page_url)
+
+
+@stocks_blueprint.route('/stocks/stream')
+@login_required
+@reads_from_replica
+def stream_stock_prices():
+    # Each open stream holds a worker, so the stream is only available when enabled
+    if not current_app.config['PRICE_STREAM_ENABLED']:
+        abort(404)
+
+    # The stocks are retrieved before the response is streamed, as the stream
+    # of price updates (Server-Sent Events) runs without the request context
+    symbols = get_symbols_by_popularity(user_id=current_user.id)
+    events = price_streamer.iter_events(current_app._get_current_object(), symbols,
+                                        current_app.config['PRICE_STREAM_HEARTBEAT'],
+                                        current_app.config['PRICE_STREAM_MAX_DURATION'])
+    return Response(events, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 @stocks_blueprint.route("/chartjs_demo1")
@@ -175,6 +255,9 @@ def stock_details(id):
         abort(403)
 
     title, labels, values = stock.get_weekly_stock_data()
+
+    # Save any weekly prices that were retrieved for the chart
+    database.session.commit()
     return render_template('stocks/stock_details.html', stock=stock, title=title, labels=labels, values=values)
 
 
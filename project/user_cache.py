@@ -0,0 +1,105 @@
+"""
+This module (user_cache.py) provides the cache of the users loaded by Flask-Login
+for each request of a logged in user, so that the page views do not need to query
+the `users` table.
+
+The column values of each user are cached by user ID for USER_CACHE_TTL seconds.
+On a hit, the user is added to the database session without a query, so the user
+can still be updated (such as changing the password) and its relationships are
+loaded as usual. The cached user must be invalidated after each change to the user
+(password, email address, email confirmation, deletion).
+
+The hashed password is never cached, but loaded from the database when it is
+needed to check or change the password. The admin users are never cached, so the
+access to the admin pages is always checked against the database.
+
+The cache is stored in-process by default ('memory'), where the invalidation only
+applies to the current process and the other worker processes see the change once
+their entry expires (after at most USER_CACHE_TTL seconds). Set USER_CACHE_BACKEND
+to 'sqlite' to share the cache between the worker processes on the same host (stored
+at USER_CACHE_PATH), so an invalidation applies to every process. Any other backend
+with the same interface as `TTLCache` can be passed to `init_app()`.
+"""
+from project.cache import SQLiteTTLCache, TTLCache
+from flask import current_app
+from sqlalchemy import DateTime, inspect, select
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from datetime import datetime
+
+
+# Columns that are loaded from the database when they are accessed, instead of being cached
+UNCACHED_COLUMNS = ('password_hashed',)
+
+
+class UserCache(object):
+    """
+    Class that represents the cache of the users loaded for each request.
+
+    The following configuration variables are read by `init_app()`:
+        USER_CACHE_BACKEND - 'memory' (in-process) or 'sqlite' (shared by all the processes)
+        USER_CACHE_PATH - path of the SQLite database storing the users ('sqlite' only)
+        USER_CACHE_MAX_SIZE - maximum number of users stored in the cache
+        USER_CACHE_TTL - number of seconds that a cached user is considered valid
+    """
+
+    def __init__(self):
+        self.backend = TTLCache('USER_CACHE', ttl=60.0)
+
+    def init_app(self, app, backend=None):
+        if backend is None:
+            if app.config.get('USER_CACHE_BACKEND', 'memory') == 'sqlite':
+                backend = SQLiteTTLCache('USER_CACHE')
+            else:
+                backend = TTLCache('USER_CACHE', ttl=60.0)
+            backend.init_app(app)
+        self.backend = backend
+
+    @staticmethod
+    def _to_values(user) -> dict:
+        # Store the column values as JSON types, so they can be stored by any backend
+        values = {}
+        for column_attribute in inspect(user).mapper.column_attrs:
+            if column_attribute.key in UNCACHED_COLUMNS:
+                continue
+            value = getattr(user, column_attribute.key)
+            values[column_attribute.key] = value.isoformat() if isinstance(value, datetime) else value
+        return values
+
+    @staticmethod
+    def _from_values(model, values: dict):
+        mapper = inspect(model)
+        user = mapper.class_manager.new_instance()
+        for column_attribute in mapper.column_attrs:
+            if column_attribute.key in UNCACHED_COLUMNS:
+                continue
+            value = values.get(column_attribute.key)
+            if value is not None and isinstance(column_attribute.columns[0].type, DateTime):
+                value = datetime.fromisoformat(value)
+            set_committed_value(user, column_attribute.key, value)
+
+        # The uncached columns are marked as expired, so they are loaded when accessed
+        make_transient_to_detached(user)
+        return user
+
+    def load(self, model, user_id: int):
+        """Return the user with the specified ID, from the cache if it is stored."""
+        session = current_app.extensions['sqlalchemy'].session
+        values = self.backend.get(user_id)
+        if values is not None:
+            # Add the cached user to the session without loading it from the database
+            return session.merge(self._from_values(model, values), load=False)
+
+        user = session.execute(select(model).where(model.id == user_id)).scalar_one()
+        if user.user_type != 'Admin':
+            self.backend.set(user_id, self._to_values(user))
+        return user
+
+    def invalidate(self, user_id: int):
+        self.backend.delete(int(user_id))
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        return self.backend.stats()
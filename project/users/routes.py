@@ -3,7 +3,8 @@ from flask import render_template, flash, abort, request, current_app, redirect,
 from .forms import RegistrationForm, LoginForm, EmailForm, PasswordForm, ChangePasswordForm
 from markupsafe import escape
 from project.models import User
-from project import database, mail
+from project import database, mail, user_cache
+from project.market_data.refresh import prefetch_user_stock_prices
 from sqlalchemy.exc import IntegrityError
 from flask_login import login_user, current_user, login_required, logout_user
 from urllib.parse import urlparse
@@ -116,6 +117,12 @@ def login():
                 flash(f'Thanks for logging in, {current_user.email}!', 'success')
                 current_app.logger.info(f'Logged in user: {current_user.email}')
 
+                # Start refreshing the stale prices of the user's stocks in the background, so
+                # that the prices are current by the time the portfolio or watchlist is shown
+                refresh_on_request = current_app.config['PRICE_REFRESH_MODE'] == 'request'
+                if refresh_on_request and current_app.config['MARKET_DATA_PREFETCH_ON_LOGIN']:
+                    prefetch_user_stock_prices(user.id)
+
                 # If the next URL is not specified, redirect to the user profile
                 if not request.args.get('next'):
                     return redirect(url_for('users.user_profile'))
@@ -170,6 +177,7 @@ def confirm_email(token):
         user.email_confirmed_on = datetime.now()
         database.session.add(user)
         database.session.commit()
+        user_cache.invalidate(user.id)
         flash('Thank you for confirming your email address!', 'success')
         current_app.logger.info(f'Email address confirmed for: {user.email}')
 
@@ -229,6 +237,7 @@ def process_password_reset_token(token):
         user.set_password(form.password.data)
         database.session.add(user)
         database.session.commit()
+        user_cache.invalidate(user.id)
         flash('Your password has been updated!', 'success')
         return redirect(url_for('users.login'))
 
@@ -245,6 +254,7 @@ def change_password():
             current_user.set_password(form.new_password.data)
             database.session.add(current_user)
             database.session.commit()
+            user_cache.invalidate(current_user.id)
             flash('Password has been updated!', 'success')
             current_app.logger.info(f'Password updated for user: {current_user.email}')
             return redirect(url_for('users.user_profile'))
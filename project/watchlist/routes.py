@@ -3,20 +3,73 @@ from flask import render_template, request, flash, current_app, redirect, url_fo
 from flask_login import login_required, current_user
 from .forms import WatchStockForm
 from project import database
-from project.models import WatchStock
+from project.models import WatchStock, get_current_stock_prices
+from project.market_data.refresh import revalidate_stock_analysis_data, revalidate_stock_prices
+from project.database_routing import database_router
+from project.pagination import SortOption, paginate
+from sqlalchemy import func
+
+
+# Columns that the watchlist can be sorted by
+WATCHSTOCK_SORT_OPTIONS = {
+    'id': SortOption(WatchStock.id),
+    'symbol': SortOption(WatchStock.stock_symbol),
+    'share_price': SortOption(func.coalesce(WatchStock.current_share_price, 0), descending=True),
+}
 
 
 @watchlist_blueprint.route('/watchlist')
 @login_required
 def watchlist():
-    watchstocks = WatchStock.query.order_by(WatchStock.id).filter_by(user_id=current_user.id).all()
-    for watchstock in watchstocks:
-        watchstock.retrieve_current_share_price()
-        watchstock.retrieve_stock_analysis_data()
-        database.session.add(watchstock)
-    database.session.commit()
+    # The page only reads from a replica if the market data is not updated in this request
+    if current_app.config['PRICE_REFRESH_MODE'] != 'request':
+        database_router.use_replica()
+
+    sort = request.args.get('sort', default='id')
+    if sort not in WATCHSTOCK_SORT_OPTIONS:
+        abort(400)
+
+    query = database.select(WatchStock).where(WatchStock.user_id == current_user.id)
+    try:
+        rows, next_cursor = paginate(query, WATCHSTOCK_SORT_OPTIONS[sort], WatchStock.id,
+                                     request.args.get('after'), current_app.config['STOCKS_PER_PAGE'])
+    except ValueError:
+        abort(400)
+    watchstocks = [watchstock for watchstock, in rows]
+
+    # The market data is only retrieved in this request if it is not refreshed in the background
+    if current_app.config['PRICE_REFRESH_MODE'] == 'request':
+        stale_watchstocks = [watchstock for watchstock in watchstocks if watchstock.is_current_share_price_stale()]
+        analysis_watchstocks = watchstocks
+
+        # Show the stored market data immediately and refresh it in the background, so only
+        # the stocks without any stored market data need to be retrieved in this request
+        if current_app.config['MARKET_DATA_STALE_WHILE_REVALIDATE']:
+            revalidate_stock_prices(watchstock.stock_symbol for watchstock in stale_watchstocks
+                                    if watchstock.current_share_price > 0)
+            stored_analysis_watchstocks = [watchstock for watchstock in watchstocks if watchstock.stock_data_date is not None]
+            revalidate_stock_analysis_data(watchstock.stock_symbol for watchstock in stored_analysis_watchstocks
+                                           if watchstock.is_stock_analysis_data_stale())
+            stale_watchstocks = [watchstock for watchstock in stale_watchstocks if watchstock.current_share_price == 0]
+            analysis_watchstocks = [watchstock for watchstock in watchstocks if watchstock.stock_data_date is None]
+
+        # Retrieve the current prices for the stocks with outdated prices concurrently,
+        # and then apply the prices that changed to the database in a single statement
+        current_prices = get_current_stock_prices(watchstock.stock_symbol for watchstock in stale_watchstocks)
+        number_of_updates = WatchStock.update_current_share_prices(stale_watchstocks, current_prices)
+
+        # Retrieve the stale stock analysis data concurrently, within the same deadline
+        number_of_updates += WatchStock.update_stock_analysis_data(analysis_watchstocks)
+
+        # The page is shown without a write transaction if there is no stale market data to update
+        if number_of_updates:
+            database.session.commit()
 
-    return render_template('watchlist/watchlist.html', watchstocks=watchstocks)
+    next_page_url = None
+    if next_cursor is not None:
+        next_page_url = url_for('watchlist.watchlist', sort=sort, after=next_cursor)
+    return render_template('watchlist/watchlist.html', watchstocks=watchstocks, sort=sort,
+                           next_page_url=next_page_url)
 
 
 @watchlist_blueprint.route('/watchlist/add_watch_stock', methods=['GET', 'POST'])
@@ -1,8 +1,9 @@
 import os
 import pytest
-from project import create_app, database
-from project.models import Stock, User, WatchStock
-from datetime import datetime
+from project import create_app, database, negative_cache, quote_cache, user_cache
+from project.models import PriceHistory, Stock, User, WatchStock
+from datetime import datetime, timedelta
+import json
 import requests
 
 
@@ -10,7 +11,18 @@ import requests
 # Helper Classes
 # --------------
 
-class MockSuccessResponseQuote(object):
+class MockResponse(object):
+    def close(self):
+        pass
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        # Split the response body into small chunks to check that the parsing does not depend on the chunk size
+        content = json.dumps(self.json(), indent=2).encode()
+        for index in range(0, len(content), 16):
+            yield content[index:index + 16]
+
+
+class MockSuccessResponseQuote(MockResponse):
     def __init__(self, url):
         self.status_code = 200
         self.url = url
@@ -25,7 +37,30 @@ class MockSuccessResponseQuote(object):
         }
 
 
-class MockSuccessResponseWeekly(object):
+class MockSuccessResponseBulkQuotes(MockResponse):
+    def __init__(self, url):
+        self.status_code = 200
+        self.url = url
+
+    def json(self):
+        return {
+            "endpoint": "Realtime Bulk Quotes",
+            "data": [
+                {
+                    "symbol": "AAPL",
+                    "timestamp": "2020-03-24 16:00:00.000",
+                    "close": "148.3400",
+                },
+                {
+                    "symbol": "COST",
+                    "timestamp": "2020-03-24 16:00:00.000",
+                    "close": "312.7800",
+                }
+            ]
+        }
+
+
+class MockSuccessResponseWeekly(MockResponse):
     def __init__(self, url):
         self.status_code = 200
         self.url = url
@@ -52,8 +87,21 @@ class MockSuccessResponseWeekly(object):
             }
         }
 
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        if 'datatype=csv' not in self.url:
+            yield from super().iter_content(chunk_size, decode_unicode)
+            return
+
+        content = ('timestamp,open,high,low,close,adjusted close,volume,dividend amount\r\n'
+                   '2020-07-24,372.0000,385.0000,368.0000,379.2400,379.2400,123456,0.0000\r\n'
+                   '2020-07-17,381.0000,389.0000,360.0000,362.7600,362.7600,123456,0.0000\r\n'
+                   '2020-06-11,350.0000,358.0000,349.0000,354.3400,354.3400,123456,0.0000\r\n'
+                   '2020-02-25,430.0000,436.0000,426.0000,432.9800,432.9800,123456,0.0000\r\n').encode()
+        for index in range(0, len(content), 16):
+            yield content[index:index + 16]
 
-class MockSuccessResponseOverview(object):
+
+class MockSuccessResponseOverview(MockResponse):
     def __init__(self, url):
         self.status_code = 200
         self.url = url
@@ -81,7 +129,7 @@ class MockSuccessResponseOverview(object):
         }
 
 
-class MockApiRateLimitExceededResponse(object):
+class MockApiRateLimitExceededResponse(MockResponse):
     def __init__(self, url):
         self.status_code = 200
         self.url = url
@@ -93,7 +141,16 @@ class MockApiRateLimitExceededResponse(object):
         }
 
 
-class MockFailedResponse(object):
+class MockInvalidSymbolResponseQuote(MockResponse):
+    def __init__(self, url):
+        self.status_code = 200
+        self.url = url
+
+    def json(self):
+        return {'Global Quote': {}}
+
+
+class MockFailedResponse(MockResponse):
     def __init__(self, url):
         self.status_code = 404
         self.url = url
@@ -106,6 +163,30 @@ class MockFailedResponse(object):
 #### Fixtures ####
 ##################
 
+@pytest.fixture(autouse=True)
+def clear_quote_cache():
+    # Since the quote cache is shared across the process, clear it after each
+    # test so that a cached price does not leak into the next test
+    yield
+    quote_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_negative_cache():
+    # Since the negative cache is shared across the process, clear it after each
+    # test so that a stock symbol recorded as invalid does not leak into the next test
+    yield
+    negative_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_user_cache():
+    # Since the user cache is shared across the process, clear it after each test
+    # so that a user changed directly in the database is loaded again by the next test
+    yield
+    user_cache.clear()
+
+
 @pytest.fixture(scope='function')
 def new_stock():
     # Set the Testing configuration prior to creating the Flask application
@@ -117,9 +198,15 @@ def new_stock():
     with flask_app.test_client() as testing_client:
         # Establish an application context before accessing the logger and database
         with flask_app.app_context():
+            # Create the database tables for storing the weekly prices of the stock
+            database.create_all()
+
             stock = Stock('AAPL', '16', '406.78', 17, datetime(2020, 7, 18))
             yield stock  # this is where the testing happens!
 
+            database.session.rollback()
+            database.drop_all()
+
 
 @pytest.fixture(scope='function')
 def new_stock_updated(new_stock):
@@ -196,6 +283,7 @@ def confirm_email_default_user(test_client, log_in_default_user):
     user.email_confirmed_on = datetime(2020, 7, 8)
     database.session.add(user)
     database.session.commit()
+    user_cache.invalidate(user.id)
 
     yield user  # this is where the testing happens!
 
@@ -206,6 +294,7 @@ def confirm_email_default_user(test_client, log_in_default_user):
     user.email_confirmed_on = None
     database.session.add(user)
     database.session.commit()
+    user_cache.invalidate(user.id)
 
 
 @pytest.fixture(scope='function')
@@ -219,6 +308,7 @@ def afterwards_reset_default_user_password():
     user.set_password('FlaskIsAwesome123')
     database.session.add(user)
     database.session.commit()
+    user_cache.invalidate(user.id)
 
 
 @pytest.fixture(scope='function')
@@ -239,52 +329,79 @@ def add_stocks_for_default_user(test_client, log_in_default_user):
     return
 
 
+@pytest.fixture(scope='function')
+def add_stock_with_weekly_prices(test_client, log_in_default_user):
+    # Add a stock for the default user, with its weekly prices since the purchase date already stored
+    user = database.session.execute(database.select(User).where(User.email == 'patrick@gmail.com')).scalar_one()
+    stock = Stock('SBUX', '10', '85.00', user.id, datetime(2020, 7, 1))
+    database.session.add(stock)
+    for week in range(4):
+        database.session.add(PriceHistory('SBUX', datetime(2020, 7, 3) + timedelta(weeks=week), 85.0 + week, datetime(2020, 7, 25)))
+    database.session.commit()
+    stock_id = stock.id
+
+    yield stock_id  # this is where the testing happens!
+
+    database.session.execute(database.delete(PriceHistory).where(PriceHistory.stock_symbol == 'SBUX'))
+    database.session.delete(database.session.get(Stock, stock_id))
+    database.session.commit()
+
+
+@pytest.fixture(scope='function')
+def clear_price_history(test_client):
+    yield
+
+    # Delete the weekly prices stored by the test, so that they are not shown by the later tests
+    database.session.execute(database.delete(PriceHistory))
+    database.session.commit()
+
+
 @pytest.fixture(scope='function')
 def mock_requests_get_success_quote(monkeypatch):
-    # Create a mock for the requests.get() call to prevent making the actual API call
-    def mock_get(url):
+    # Create a mock for the requests.Session.get() call to prevent making the actual API call
+    def mock_get(self, url, **kwargs):
         return MockSuccessResponseQuote(url)
 
     url = 'https://www.alphavantage.co/query?function=GLOBAL_QUOTE&symbol=MSFT&apikey=demo'
-    monkeypatch.setattr(requests, 'get', mock_get)
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
 
 
 @pytest.fixture(scope='function')
 def mock_requests_get_success_weekly(monkeypatch):
-    # Create a mock for the requests.get() call to prevent making the actual API call
-    def mock_get(url):
+    # Create a mock for the requests.Session.get() call to prevent making the actual API call
+    def mock_get(self, url, **kwargs):
         return MockSuccessResponseWeekly(url)
 
     url = 'https://www.alphavantage.co/query?function=TIME_SERIES_WEEKLY&symbol=MSFT&apikey=demo'
-    monkeypatch.setattr(requests, 'get', mock_get)
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
 
 
 @pytest.fixture(scope='function')
 def mock_requests_get_success_overview(monkeypatch):
-    # Create a mock for the requests.get() call to prevent making the actual API call
-    def mock_get(url):
+    # Create a mock for the requests.Session.get() call to prevent making the actual API call
+    def mock_get(self, url, **kwargs):
         return MockSuccessResponseOverview(url)
 
     url = 'https://www.alphavantage.co/query?function=OVERVIEW&symbol=COST&apikey=demo'
-    monkeypatch.setattr(requests, 'get', mock_get)
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
 
 
 @pytest.fixture(scope='function')
 def mock_requests_get_api_rate_limit_exceeded(monkeypatch):
-    def mock_get(url):
+    def mock_get(self, url, **kwargs):
         return MockApiRateLimitExceededResponse(url)
 
     url = 'https://www.alphavantage.co/query?function=GLOBAL_QUOTE&symbol=MSFT&apikey=demo'
-    monkeypatch.setattr(requests, 'get', mock_get)
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
 
 
 @pytest.fixture(scope='function')
 def mock_requests_get_failure(monkeypatch):
-    def mock_get(url):
+    def mock_get(self, url, **kwargs):
         return MockFailedResponse(url)
 
     url = 'https://www.alphavantage.co/query?function=GLOBAL_QUOTE&symbol=MSFT&apikey=demo'
-    monkeypatch.setattr(requests, 'get', mock_get)
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
 
 
 @pytest.fixture(scope='module')
@@ -408,8 +525,20 @@ def log_in_user1(test_client_admin):
 
 @pytest.fixture(scope='function')
 def new_watch_stock():
-    watch_stock = WatchStock('COST', 23)
-    return watch_stock
+    # Set the Testing configuration prior to creating the Flask application
+    os.environ['CONFIG_TYPE'] = 'config.TestingConfig'
+    flask_app = create_app()
+
+    # Establish an application context before accessing the logger and database
+    with flask_app.app_context():
+        # Create the database tables for storing the stock analysis data shared by the watchstocks
+        database.create_all()
+
+        watch_stock = WatchStock('COST', 23)
+        yield watch_stock  # this is where the testing happens!
+
+        database.session.rollback()
+        database.drop_all()
 
 
 @pytest.fixture(scope='function')
@@ -1,6 +1,10 @@
 """
 This file (test_admin.py) contains the functional tests for the `admin` blueprint.
 """
+from project import database, user_cache
+from project.models import PortfolioSummary, Stock, User, WatchStock
+from sqlalchemy import event
+import pytest
 import re
 
 
@@ -50,6 +54,26 @@ def test_admin_view_users_valid(test_client_admin, log_in_admin_user):
         assert expected_action in response.data
 
 
+def test_admin_view_market_data(test_client_admin, log_in_admin_user):
+    """
+    GIVEN a Flask application configured for testing with the admin user logged in
+    WHEN the '/admin/market_data' page is requested (GET)
+    THEN check the response is valid and the quote cache statistics are displayed
+    """
+    response = test_client_admin.get('/admin/market_data', follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Market Data Statistics' in response.data
+    assert b'Quote Cache' in response.data
+    assert b'Hits' in response.data
+    assert b'Misses' in response.data
+    assert b'Evictions' in response.data
+    assert b'Response Cache' in response.data
+    assert b'Invalid Stock Symbols' in response.data
+    assert b'Calls Suppressed' in response.data
+    assert b'Alpha Vantage API Calls' in response.data
+    assert b'Calls Throttled' in response.data
+
+
 def test_admin_views_non_admin_user(test_client_admin, log_in_user1):
     """
     GIVEN a Flask application configured for testing with a non-admin user logged in
@@ -61,7 +85,8 @@ def test_admin_views_non_admin_user(test_client_admin, log_in_user1):
                   '/admin/users/5/confirm_email',
                   '/admin/users/5/unconfirm_email',
                   '/admin/users/1/change_password',
-                  '/admin/users/1/change_email']
+                  '/admin/users/1/change_email',
+                  '/admin/market_data']
 
     routes_post = [{'url': '/admin/users/4/change_password', 'data': {'password': 'FlaskIsGreat101'}},
                    {'url': '/admin/users/5/change_email', 'data': {'email': 'user104@gmail.com'}}]
@@ -90,7 +115,8 @@ def test_admin_view_users_not_logged_in(test_client_admin):
                   '/admin/users/5/confirm_email',
                   '/admin/users/5/unconfirm_email',
                   '/admin/users/1/change_password',
-                  '/admin/users/1/change_email']
+                  '/admin/users/1/change_email',
+                  '/admin/market_data']
 
     routes_post = [{'url': '/admin/users/4/change_password', 'data': {'password': 'FlaskIsGreat101'}},
                    {'url': '/admin/users/5/change_email', 'data': {'email': 'user104@gmail.com'}}]
@@ -209,6 +235,43 @@ def test_admin_unconfirm_email_valid(test_client_admin, log_in_admin_user):
     assert b'List of Users' in response.data
 
 
+def test_admin_changes_invalidate_cached_user(test_client_admin, log_in_admin_user):
+    """
+    GIVEN a Flask application configured for testing with the admin user logged in
+          and a user stored in the user cache
+    WHEN the user is changed or deleted by the admin user
+    THEN check that the user is removed from the user cache after each change
+    """
+    with test_client_admin.application.app_context():
+        user = User('user5@gmail.com', 'FlaskIsGreat5')
+        database.session.add(user)
+        database.session.commit()
+        id = user.id
+
+    requests = [('get', f'/admin/users/{id}/confirm_email', {}),
+                ('get', f'/admin/users/{id}/unconfirm_email', {}),
+                ('post', f'/admin/users/{id}/change_password', {'password': 'FlaskIsStillGreat5'}),
+                ('post', f'/admin/users/{id}/change_email', {'email': 'user5_new@gmail.com'}),
+                ('get', f'/admin/users/{id}/delete', {})]
+    for method, url, data in requests:
+        user_cache.backend.set(id, {'id': id, 'email': 'user5@gmail.com'})
+        response = getattr(test_client_admin, method)(url, data=data, follow_redirects=True)
+        assert response.status_code == 200
+        assert user_cache.backend.get(id) is None
+
+
+def test_admin_user_not_cached(test_client_admin, log_in_admin_user):
+    """
+    GIVEN a Flask application configured for testing with the admin user logged in
+    WHEN an admin page is requested (GET)
+    THEN check that the admin user is loaded from the database instead of being cached
+    """
+    user_cache.clear()
+    response = test_client_admin.get('/admin/users')
+    assert response.status_code == 200
+    assert len(user_cache.backend) == 0
+
+
 def test_admin_get_change_password_page_valid(test_client_admin, log_in_admin_user):
     """
     GIVEN a Flask application configured for testing with the admin user logged in
@@ -265,3 +328,88 @@ def test_admin_post_change_email_valid(test_client_admin, log_in_admin_user):
     assert response.status_code == 200
     assert re.search(r"User.* email \(.*\) was updated!", str(response.data))
     assert b'List of Users' in response.data
+
+
+@pytest.fixture(scope='function')
+def add_stocks_for_users(test_client_admin):
+    # Add stocks to the portfolios and watchlists of user1 and user3
+    with test_client_admin.application.app_context():
+        users = {user.email: user.id for user in database.session.execute(database.select(User)).scalars()}
+        stocks = [Stock(symbol, '10', '100.00', users['user3@gmail.com']) for symbol in ('AAPL', 'COST', 'MSFT')]
+        stocks.append(Stock('AAPL', '5', '120.00', users['user1@gmail.com']))
+        for stock in stocks:
+            database.session.add(stock)
+        for symbol in ('SAM', 'TWTR'):
+            database.session.add(WatchStock(symbol, users['user1@gmail.com']))
+        database.session.commit()
+
+    yield users
+
+    with test_client_admin.application.app_context():
+        database.session.execute(database.delete(Stock))
+        database.session.execute(database.delete(WatchStock))
+        database.session.execute(database.delete(PortfolioSummary))
+        database.session.commit()
+
+
+def test_admin_view_users_sorted_by_number_of_stocks(test_client_admin, log_in_admin_user, add_stocks_for_users):
+    """
+    GIVEN a Flask application configured for testing with the admin user logged in
+          and stocks in the portfolios and watchlists of some users
+    WHEN the '/admin/users' page is requested (GET) sorted by the number of stocks
+    THEN check that the users are sorted by the number of stocks, that the number of stocks in each portfolio
+         is read from the portfolio totals and that the stocks in the watchlists are counted in a single query
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with test_client_admin.application.app_context():
+        engine = database.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = test_client_admin.get('/admin/users?sort=stocks')
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+    assert response.status_code == 200
+    rows = re.findall(rb'<td>([^<]+@gmail\.com)</td>\s*<td>[^<]*</td>\s*(?:<td>[^<]*</td>\s*){2}'
+                      rb'<td>(\d+)</td>\s*<td>(\d+)</td>', response.data)
+    assert rows[:2] == [(b'user3@gmail.com', b'3', b'0'), (b'user1@gmail.com', b'1', b'2')]
+    assert len([statement for statement in statements if 'portfolio_summary' in statement]) == 1
+    assert len([statement for statement in statements if 'FROM stocks' in statement]) == 0
+    assert len([statement for statement in statements if 'FROM watchstocks' in statement]) == 1
+
+
+def test_admin_view_users_pagination(test_client_admin, log_in_admin_user, add_stocks_for_users, monkeypatch):
+    """
+    GIVEN a Flask application configured for testing with the admin user logged in
+          and the list of users limited to 2 users per page
+    WHEN the '/admin/users' page is requested (GET) sorted by the number of stocks in the watchlist
+    THEN check that the next page continues after the last user of the previous page
+    """
+    monkeypatch.setitem(test_client_admin.application.config, 'ADMIN_USERS_PER_PAGE', 2)
+    emails = []
+    url = '/admin/users?sort=watchstocks'
+    while url:
+        response = test_client_admin.get(url)
+        assert response.status_code == 200
+        page_emails = re.findall(rb'<td>([^<]+@gmail\.com)</td>', response.data)
+        assert 0 < len(page_emails) <= 2
+        emails.extend(page_emails)
+        next_page = re.search(rb'href="([^"]+)">Next Page</a>', response.data)
+        url = next_page.group(1).decode().replace('&amp;', '&') if next_page else None
+
+    assert emails[0] == b'user1@gmail.com'
+    assert sorted(emails) == sorted(email.encode() for email in add_stocks_for_users)
+
+
+def test_admin_view_users_invalid_sort(test_client_admin, log_in_admin_user):
+    """
+    GIVEN a Flask application configured for testing with the admin user logged in
+    WHEN the '/admin/users' page is requested (GET) with an invalid sort option
+    THEN check that a 400 (Bad Request) error is returned
+    """
+    response = test_client_admin.get('/admin/users?sort=email')
+    assert response.status_code == 400
@@ -0,0 +1,158 @@
+"""
+This file (test_database_routing.py) contains the functional tests for the routing
+of the database queries between a primary database and a read replica, which are
+two SQLite database files.
+"""
+from project import create_app, database
+from project.market_data.refresh import refresh_market_data
+from project.models import Stock, User
+from tests.conftest import MockSuccessResponseQuote
+from datetime import datetime
+import config
+import os
+import pytest
+import requests
+
+
+@pytest.fixture(scope='function')
+def replica_test_client(tmp_path, monkeypatch):
+    # Configure a primary database and a read replica prior to creating the Flask application
+    os.environ['CONFIG_TYPE'] = 'config.TestingConfig'
+    monkeypatch.setattr(config.TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'primary.db'}")
+    monkeypatch.setattr(config.TestingConfig, 'SQLALCHEMY_BINDS', {'replica_0': f"sqlite:///{tmp_path / 'replica.db'}"})
+    flask_app = create_app()
+    flask_app.extensions['mail'].suppress = True
+    flask_app.config['PRICE_REFRESH_MODE'] = 'scheduler'
+
+    with flask_app.test_client() as testing_client:
+        with flask_app.app_context():
+            # The replica is not kept in sync with the primary database, so that the tests
+            # can check which database each query was executed on:
+            #   primary - AAPL
+            #   replica - MSFT
+            database.create_all()
+            database.metadata.create_all(database.engines['replica_0'])
+            for engine, symbol in [(database.engines[None], 'AAPL'), (database.engines['replica_0'], 'MSFT')]:
+                with engine.begin() as connection:
+                    user = User('patrick@gmail.com', 'FlaskIsAwesome123')
+                    connection.execute(database.insert(User).values(id=1, email=user.email,
+                                                                    password_hashed=user.password_hashed,
+                                                                    registered_on=datetime.now(),
+                                                                    email_confirmed=True, user_type='User'))
+                    connection.execute(database.insert(Stock).values(stock_symbol=symbol, number_of_shares=10,
+                                                                     purchase_price=10000, user_id=1,
+                                                                     purchase_date=datetime(2020, 7, 1),
+                                                                     current_price=0, position_value=0))
+            database.session.remove()
+
+        testing_client.post('/users/login',
+                            data={'email': 'patrick@gmail.com', 'password': 'FlaskIsAwesome123'})
+        yield testing_client
+
+        with flask_app.app_context():
+            database.drop_all()
+            database.metadata.drop_all(database.engines['replica_0'])
+
+        # The (empty) metadata registered for the replica would be created by the applications of later tests
+        database.metadatas.pop('replica_0', None)
+
+
+def test_read_only_page_uses_replica(replica_test_client):
+    """
+    GIVEN a Flask application configured with a primary database and a read replica
+    WHEN the '/stocks' page is requested (GET)
+    THEN check that the stocks are read from the replica
+    """
+    response = replica_test_client.get('/stocks')
+    assert response.status_code == 200
+    assert b'MSFT' in response.data
+    assert b'AAPL' not in response.data
+
+
+def test_read_your_writes(replica_test_client, monkeypatch):
+    """
+    GIVEN a Flask application configured with a primary database and a read replica
+    WHEN a stock is added and the '/stocks' page is requested (GET) before and after the read-your-writes window
+    THEN check that the stocks are read from the primary database right after the write,
+         and from the replica once the window has passed
+    """
+    response = replica_test_client.post('/add_stock',
+                                        data={'stock_symbol': 'COST',
+                                              'number_of_shares': '76',
+                                              'purchase_price': '14.67',
+                                              'purchase_date': '2019-05-26'},
+                                        follow_redirects=True)
+    assert response.status_code == 200
+    assert b'AAPL' in response.data
+    assert b'COST' in response.data
+    assert b'MSFT' not in response.data
+
+    monkeypatch.setitem(replica_test_client.application.config, 'DATABASE_READ_YOUR_WRITES_SECONDS', 0)
+    response = replica_test_client.get('/stocks')
+    assert response.status_code == 200
+    assert b'MSFT' in response.data
+    assert b'COST' not in response.data
+
+
+def test_writes_use_primary(replica_test_client, monkeypatch):
+    """
+    GIVEN a Flask application configured with a primary database and a read replica
+    WHEN the '/stocks' page is requested (GET) and the prices of the stocks are updated in the request
+    THEN check that the stocks are read from and updated in the primary database
+    """
+    monkeypatch.setitem(replica_test_client.application.config, 'PRICE_REFRESH_MODE', 'request')
+    monkeypatch.setattr(requests.Session, 'get', lambda self, url, **kwargs: MockSuccessResponseQuote(url))
+
+    response = replica_test_client.get('/stocks')
+    assert response.status_code == 200
+    assert b'AAPL' in response.data
+    assert b'MSFT' not in response.data
+    assert b'$148.34' in response.data
+
+    with replica_test_client.application.app_context():
+        stock = database.session.execute(database.select(Stock).where(Stock.stock_symbol == 'AAPL')).scalar_one()
+        assert stock.current_price == 14834
+        with database.engines['replica_0'].connect() as connection:
+            assert connection.execute(database.select(Stock.current_price)).scalar_one() == 0
+
+
+def test_get_bind_is_not_a_write(replica_test_client):
+    """
+    GIVEN a Flask application configured with a primary database and a read replica
+    WHEN the engine of the session is looked up without a statement
+    THEN check that the session is not marked as having written to the database
+    """
+    with replica_test_client.application.test_request_context():
+        assert database.session.get_bind().dialect.name == 'sqlite'
+        assert 'has_written' not in database.session.info
+
+        database.session.execute(database.update(Stock).values(current_price=1))
+        assert database.session.info['has_written']
+        database.session.rollback()
+        database.session.remove()
+
+    response = replica_test_client.get('/stocks')
+    assert response.status_code == 200
+    assert b'MSFT' in response.data
+    with replica_test_client.session_transaction() as flask_session:
+        assert 'last_database_write' not in flask_session
+
+
+def test_background_refresh_reads_from_replica(replica_test_client, monkeypatch):
+    """
+    GIVEN a Flask application configured with a primary database and a read replica
+    WHEN the market data is refreshed in the background
+    THEN check that the stale stocks are read from the replica
+    """
+    urls = []
+
+    def mock_get(self, url, **kwargs):
+        urls.append(url)
+        return MockSuccessResponseQuote(url)
+
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
+    with replica_test_client.application.app_context():
+        refresh_market_data()
+        assert any('symbol=MSFT' in url for url in urls)
+        assert not any('symbol=AAPL' in url for url in urls)
+        database.session.remove()
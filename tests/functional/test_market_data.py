@@ -0,0 +1,85 @@
+"""
+This file (test_market_data.py) contains the functional tests for the refresh of the market data.
+"""
+from project import create_app, database
+from project.models import Stock, WatchStock
+from project.market_data import refresh
+from project.market_data.refresh import PriceRefreshScheduler, get_symbols_by_popularity, price_refresh_scheduler
+from datetime import datetime
+from threading import Event
+import config
+import os
+
+
+def test_cli_refresh_prices(cli_test_runner, mock_requests_get_success_quote):
+    """
+    GIVEN a Flask CLI test runner and stocks held in portfolios and watchlists
+    WHEN the 'flask stocks refresh_prices' command is processed
+    THEN check that the current prices are updated for every stock, with the most popular stock first
+    """
+    with cli_test_runner.app.app_context():
+        database.session.add(Stock('COST', '10', '301.23', 1, datetime(2020, 7, 1)))
+        database.session.add(Stock('AAPL', '16', '406.78', 1, datetime(2020, 7, 18)))
+        database.session.add(Stock('AAPL', '5', '390.12', 2, datetime(2020, 8, 3)))
+        database.session.add(WatchStock('QCOM', 2))
+        database.session.commit()
+        assert get_symbols_by_popularity() == ['AAPL', 'COST', 'QCOM']
+
+    result = cli_test_runner.invoke(args=['stocks', 'refresh_prices'])
+    assert 'Refreshed the current prices of 3 stocks!' in result.output
+
+    with cli_test_runner.app.app_context():
+        for stock in database.session.execute(database.select(Stock)).scalars():
+            assert stock.current_price == 14834  # $148.34 -> integer
+            assert stock.current_price_date.date() == datetime.now().date()
+            assert stock.position_value == 14834 * stock.number_of_shares
+        watchstock = database.session.execute(database.select(WatchStock)).scalar_one()
+        assert watchstock.current_share_price == 14834
+
+
+def test_price_refresh_scheduler_lock(tmp_path):
+    """
+    GIVEN two price refresh schedulers (such as in two worker processes)
+    WHEN each scheduler takes the lock of the refresh
+    THEN check that only one scheduler holds the lock until it is stopped
+    """
+    lock_path = str(tmp_path / 'price_refresh.lock')
+    scheduler1 = PriceRefreshScheduler()
+    scheduler2 = PriceRefreshScheduler()
+    try:
+        assert scheduler1.acquire_lock(lock_path)
+        assert scheduler1.acquire_lock(lock_path)
+        assert not scheduler2.acquire_lock(lock_path)
+
+        scheduler1.stop()
+        assert scheduler2.acquire_lock(lock_path)
+    finally:
+        scheduler1.stop()
+        scheduler2.stop()
+
+
+def test_price_refresh_scheduler_started_by_first_request(tmp_path, monkeypatch):
+    """
+    GIVEN a Flask application configured for testing with the prices refreshed by the scheduler
+    WHEN the application is created and then the first request is processed
+    THEN check that the scheduler is only started (and refreshes the prices) once a request is processed
+    """
+    os.environ['CONFIG_TYPE'] = 'config.TestingConfig'
+    monkeypatch.setattr(config.TestingConfig, 'PRICE_REFRESH_MODE', 'scheduler')
+    monkeypatch.setattr(config.TestingConfig, 'PRICE_REFRESH_LOCK_PATH', str(tmp_path / 'price_refresh.lock'))
+    refreshed = Event()
+
+    def mock_refresh_market_data():
+        refreshed.set()
+        return 0
+
+    monkeypatch.setattr(refresh, 'refresh_market_data', mock_refresh_market_data)
+    flask_app = create_app()
+    try:
+        assert price_refresh_scheduler._thread is None
+
+        flask_app.test_client().get('/')
+        assert refreshed.wait(5.0)
+        assert price_refresh_scheduler._thread.is_alive()
+    finally:
+        price_refresh_scheduler.stop()
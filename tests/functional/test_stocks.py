@@ -1,6 +1,13 @@
 """
 This file (test_stocks.py) contains the functional tests for the 'stocks' blueprint.
 """
+from project import database, market_data_revalidator
+from project.market_data.price_stream import price_streamer
+from project.models import PortfolioSummary, Stock
+from project.pagination import encode_cursor
+from datetime import datetime, timedelta
+from sqlalchemy import event, func
+from threading import Event
 import requests
 import re
 
@@ -204,7 +211,8 @@ def test_monkeypatch_get_failure(monkeypatch):
     assert 'bad' in r.json()['error']
 
 
-def test_get_stock_detail_page(test_client, add_stocks_for_default_user, mock_requests_get_success_weekly):
+def test_get_stock_detail_page(test_client, add_stocks_for_default_user, mock_requests_get_success_weekly,
+                               clear_price_history):
     """
     GIVEN a Flask application configured for testing, with the default user logged in
           and the default set of stocks in the database
@@ -230,6 +238,20 @@ def test_get_stock_detail_page_failed_response(test_client, add_stocks_for_defau
     assert b'canvas id="stockChart"' not in response.data
 
 
+def test_get_stock_detail_page_stored_weekly_prices(test_client, add_stock_with_weekly_prices, mock_requests_get_failure):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+          and a stock with its weekly prices stored in the database
+    WHEN the page of the stock is retrieved (GET)  but the response from Alpha Vantage failed
+    THEN check that the response is valid including a chart of the stored weekly prices
+    """
+    response = test_client.get(f'/stocks/{add_stock_with_weekly_prices}', follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Stock Details' in response.data
+    assert b'canvas id="stockChart"' in response.data
+    assert b'Weekly Prices (SBUX)' in response.data
+
+
 def test_get_stock_detail_page_incorrect_user(test_client, log_in_second_user):
     """
     GIVEN a Flask application configured for testing with the second user logged in
@@ -429,3 +451,313 @@ def test_get_edit_stock_page_invalid_stock(test_client, log_in_default_user):
                                 follow_redirects=True)
     assert response.status_code == 404
     assert not re.search(r"Stock \(.*[A-Z]{4}.*was updated!", str(response.data))
+
+
+def test_get_stock_list_prices_refreshed_in_background(test_client, add_stocks_for_default_user, monkeypatch):
+    """
+    GIVEN a Flask application configured to refresh the stock prices in the background,
+          with the default user logged in and the default set of stocks in the database
+    WHEN the '/stocks' page is requested (GET)
+    THEN check that the stocks are displayed without any calls to the API
+    """
+    urls = []
+
+    def mock_get(self, url, **kwargs):
+        urls.append(url)
+
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
+    monkeypatch.setitem(test_client.application.config, 'PRICE_REFRESH_MODE', 'scheduler')
+    response = test_client.get('/stocks', follow_redirects=True)
+    assert response.status_code == 200
+    assert b'SAM' in response.data
+    assert len(urls) == 0
+
+
+def test_get_stock_list_stale_while_revalidate(test_client, add_stocks_for_default_user, monkeypatch):
+    """
+    GIVEN a Flask application configured for stale-while-revalidate, with the default
+          user logged in and stale prices stored for the default set of stocks
+    WHEN the '/stocks' page is requested (GET) while the API is not responding
+    THEN check that the stored prices are displayed immediately and then refreshed in the background
+    """
+    api_available = Event()
+
+    def mock_get(self, url, **kwargs):
+        api_available.wait(5.0)
+        return MockSuccessResponse(url)
+
+    with test_client.application.app_context():
+        database.session.execute(database.update(Stock).values(current_price=12345,
+                                                               current_price_date=datetime.now() - timedelta(days=7)))
+        database.session.commit()
+
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
+    monkeypatch.setitem(test_client.application.config, 'MARKET_DATA_STALE_WHILE_REVALIDATE', True)
+    response = test_client.get('/stocks', follow_redirects=True)
+    assert response.status_code == 200
+    assert b'123.45' in response.data
+    assert b'295.37' not in response.data
+
+    api_available.set()
+    market_data_revalidator.wait()
+    with test_client.application.app_context():
+        prices = database.session.execute(database.select(Stock.current_price)).scalars().all()
+        assert prices and all(price == 29537 for price in prices)
+
+
+def test_login_prefetches_stock_prices(test_client, add_stocks_for_default_user, monkeypatch):
+    """
+    GIVEN a Flask application configured to prefetch the stock prices on login, with
+          stale prices stored for the default set of stocks
+    WHEN the default user logs in (POST)
+    THEN check that the prices are refreshed in the background without delaying the login
+    """
+    api_available = Event()
+    urls = []
+
+    def mock_get(self, url, **kwargs):
+        api_available.wait(5.0)
+        urls.append(url)
+        return MockSuccessResponse(url)
+
+    test_client.get('/users/logout', follow_redirects=True)
+    with test_client.application.app_context():
+        database.session.execute(database.update(Stock).values(current_price=12345,
+                                                               current_price_date=datetime.now() - timedelta(days=7)))
+        database.session.commit()
+
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
+    monkeypatch.setitem(test_client.application.config, 'MARKET_DATA_PREFETCH_ON_LOGIN', True)
+    response = test_client.post('/users/login',
+                                data={'email': 'patrick@gmail.com',
+                                      'password': 'FlaskIsAwesome123'},
+                                follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Thanks for logging in, patrick@gmail.com!' in response.data
+
+    api_available.set()
+    market_data_revalidator.wait()
+    symbols = [re.search('symbol=([A-Z]+)', url).group(1) for url in urls]
+    assert {'COST', 'SAM', 'TWTR'} <= set(symbols)
+    assert len(symbols) == len(set(symbols))
+    with test_client.application.app_context():
+        prices = database.session.execute(database.select(Stock.current_price)).scalars().all()
+        assert prices and all(price == 29537 for price in prices)
+
+
+def test_stream_stock_prices(test_client, add_stocks_for_default_user, monkeypatch):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+          and the default set of stocks in their portfolio
+    WHEN the '/stocks/stream' page is requested (GET)
+    THEN check that the current prices of the stocks are streamed as Server-Sent Events
+    """
+    def mock_get(self, url, **kwargs):
+        return MockSuccessResponse(url)
+
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
+    monkeypatch.setitem(test_client.application.config, 'PRICE_STREAM_ENABLED', True)
+    monkeypatch.setitem(test_client.application.config, 'PRICE_STREAM_MAX_DURATION', 1)
+    try:
+        response = test_client.get('/stocks/stream')
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        for symbol in ('COST', 'SAM', 'TWTR'):
+            assert f'event: price\ndata: {{"symbol": "{symbol}", "price": 295.37}}\n\n'.encode() in response.data
+        assert price_streamer.stats()['subscribers'] == 0
+    finally:
+        price_streamer.reset()
+
+
+def test_stream_stock_prices_disabled(test_client, add_stocks_for_default_user, monkeypatch):
+    """
+    GIVEN a Flask application configured for testing (with the live price stream disabled),
+          with the default user logged in
+    WHEN the '/stocks' and '/stocks/stream' pages are requested (GET)
+    THEN check that the portfolio does not open the stream and that the stream is not found
+    """
+    monkeypatch.setitem(test_client.application.config, 'PRICE_REFRESH_MODE', 'scheduler')
+    response = test_client.get('/stocks')
+    assert response.status_code == 200
+    assert b'price_stream.js' not in response.data
+
+    monkeypatch.setitem(test_client.application.config, 'PRICE_STREAM_ENABLED', True)
+    response = test_client.get('/stocks')
+    assert b'price_stream.js' in response.data
+
+    monkeypatch.setitem(test_client.application.config, 'PRICE_STREAM_ENABLED', False)
+    assert test_client.get('/stocks/stream').status_code == 404
+
+
+def test_stream_stock_prices_not_logged_in(test_client):
+    """
+    GIVEN a Flask application configured for testing, without a user logged in
+    WHEN the '/stocks/stream' page is requested (GET)
+    THEN check that the user is redirected to the login page
+    """
+    response = test_client.get('/stocks/stream', follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Please log in to access this page.' in response.data
+
+
+def test_get_stock_list_sorted_pages(test_client, add_stocks_for_default_user, monkeypatch):
+    """
+    GIVEN a Flask application configured for testing with the default user logged in,
+          the default set of stocks in the database and 2 stocks per page
+    WHEN the '/stocks' page is requested (GET) sorted by the purchase date and each next page is followed
+    THEN check that every stock is listed once in order of the purchase date and that the
+         total value includes the stocks on all the pages
+    """
+    monkeypatch.setitem(test_client.application.config, 'PRICE_REFRESH_MODE', 'scheduler')
+    monkeypatch.setitem(test_client.application.config, 'STOCKS_PER_PAGE', 2)
+    stock_ids = []
+    purchase_dates = []
+    url = '/stocks?sort=purchase_date'
+    while url:
+        response = test_client.get(url)
+        assert response.status_code == 200
+        page_stock_ids = re.findall(rb'href="/stocks/(\d+)"', response.data)
+        assert 0 < len(page_stock_ids) <= 2
+        stock_ids.extend(int(stock_id) for stock_id in page_stock_ids)
+        purchase_dates.extend(re.findall(rb'<td>(\d{4}-\d{2}-\d{2})</td>', response.data))
+        next_page = re.search(rb'href="([^"]+)">Next Page</a>', response.data)
+        url = next_page.group(1).decode().replace('&amp;', '&') if next_page else None
+
+    stocks = Stock.query.filter(Stock.id.in_(stock_ids)).all()
+    user_stocks = Stock.query.filter_by(user_id=stocks[0].user_id).all()
+    assert sorted(stock_ids) == sorted(stock.id for stock in user_stocks)
+    assert purchase_dates == sorted(purchase_dates)
+    total_value = sum(stock.position_value for stock in user_stocks) / 100
+    assert f'<b>${round(total_value, 2)}</b>'.encode() in response.data
+
+
+def test_get_stock_list_invalid_sort(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing with the default user logged in
+    WHEN the '/stocks' page is requested (GET) with an invalid sort option or cursor
+    THEN check that a 400 (Bad Request) error is returned
+    """
+    assert test_client.get('/stocks?sort=number_of_shares').status_code == 400
+    assert test_client.get('/stocks?sort=gain&after=invalid').status_code == 400
+    assert test_client.get(f"/stocks?sort=gain&after={encode_cursor('COST', 1)}").status_code == 400
+    assert test_client.get(f"/stocks?sort=purchase_date&after={encode_cursor(17, 1)}").status_code == 400
+
+
+def test_get_stock_list_sorted_pages_null_sort_key(test_client, add_stocks_for_default_user, monkeypatch):
+    """
+    GIVEN a Flask application configured for testing with the default user logged in,
+          the default set of stocks in the database (one without a purchase date) and 1 stock per page
+    WHEN the '/stocks' page is requested (GET) sorted by the purchase date and each next page is followed
+    THEN check that every stock is listed once, with the stock without a purchase date first
+    """
+    monkeypatch.setitem(test_client.application.config, 'PRICE_REFRESH_MODE', 'scheduler')
+    monkeypatch.setitem(test_client.application.config, 'STOCKS_PER_PAGE', 1)
+    user_stocks = Stock.query.filter_by(stock_symbol='SAM').first().user_relationship.stocks_relationship
+    user_stock_ids = sorted(stock.id for stock in user_stocks)
+    null_stock = user_stocks[-1]
+    null_stock_id, purchase_date = null_stock.id, null_stock.purchase_date
+    null_stock.purchase_date = None
+    database.session.commit()
+
+    try:
+        stock_ids = []
+        url = '/stocks?sort=purchase_date'
+        while url:
+            response = test_client.get(url)
+            assert response.status_code == 200
+            stock_ids.extend(int(stock_id) for stock_id in re.findall(rb'href="/stocks/(\d+)"', response.data))
+            next_page = re.search(rb'href="([^"]+)">Next Page</a>', response.data)
+            url = next_page.group(1).decode().replace('&amp;', '&') if next_page else None
+    finally:
+        null_stock = database.session.get(Stock, null_stock_id)
+        null_stock.purchase_date = purchase_date
+        database.session.commit()
+
+    assert sorted(stock_ids) == user_stock_ids
+    assert stock_ids[0] == null_stock_id
+
+
+def test_get_stock_list_current_prices_no_writes(test_client, add_stocks_for_default_user, monkeypatch):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+          and current prices stored for all the stocks in the database
+    WHEN the '/stocks' page is requested (GET)
+    THEN check that the page is shown without any writes to the database
+    """
+    Stock.bulk_update_prices((), 14834, datetime.now())
+    database.session.commit()
+    statements = []
+    commits = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    def commit(conn):
+        commits.append(conn)
+
+    def mock_get(self, url, **kwargs):
+        raise AssertionError(f'Unexpected call to {url}')
+
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
+    engine = database.session.get_bind()
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(engine, 'commit', commit)
+    try:
+        response = test_client.get('/stocks')
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+        event.remove(engine, 'commit', commit)
+
+    assert response.status_code == 200
+    assert b'$148.34' in response.data
+    assert all(statement.startswith('SELECT') for statement in statements)
+    assert commits == []
+
+
+def test_portfolio_summary(test_client, add_stocks_for_default_user, mock_requests_get_success_quote):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+          and the default set of stocks in the database
+    WHEN the current prices are refreshed and a stock is edited, deleted and added
+    THEN check that the totals of the portfolio match the stocks in the portfolio after each change
+    """
+    def check_portfolio_summary(user_id):
+        query = (database.select(func.sum(Stock.position_value),
+                                 func.sum(Stock.number_of_shares * Stock.purchase_price),
+                                 func.count())
+                 .where(Stock.user_id == user_id))
+        total_value, cost_basis, number_of_positions = database.session.execute(query).one()
+        summary = PortfolioSummary.get(user_id)
+        assert (summary.total_value, summary.cost_basis, summary.number_of_positions) == \
+            (total_value, cost_basis, number_of_positions)
+
+    stock = database.session.execute(database.select(Stock).where(Stock.stock_symbol == 'COST')
+                                     .order_by(Stock.id.desc())).scalars().first()
+    stock_id, user_id = stock.id, stock.user_id
+    database.session.execute(database.update(Stock).where(Stock.user_id == user_id).values(current_price_date=None))
+    database.session.commit()
+
+    response = test_client.get('/stocks')
+    assert response.status_code == 200
+    check_portfolio_summary(user_id)
+    assert PortfolioSummary.get(user_id).last_refreshed is not None
+
+    response = test_client.post(f'/stocks/{stock_id}/edit',
+                                data={'number_of_shares': '120',
+                                      'purchase_price': '15.67',
+                                      'purchase_date': '2019-05-26'},
+                                follow_redirects=True)
+    assert response.status_code == 200
+    check_portfolio_summary(user_id)
+
+    response = test_client.get(f'/stocks/{stock_id}/delete', follow_redirects=True)
+    assert response.status_code == 200
+    check_portfolio_summary(user_id)
+
+    response = test_client.post('/add_stock', data={'stock_symbol': 'MSFT',
+                                                    'number_of_shares': '10',
+                                                    'purchase_price': '212.34',
+                                                    'purchase_date': '2020-07-01'},
+                                follow_redirects=True)
+    assert response.status_code == 200
+    check_portfolio_summary(user_id)
@@ -1,10 +1,11 @@
 """
 This file (test_users.py) contains the functional tests for the 'users' blueprint.
 """
-from project import mail, database
+from project import mail, database, user_cache
 from project.models import User
 from itsdangerous import URLSafeTimedSerializer
 from flask import current_app
+from sqlalchemy import event
 
 
 def test_get_registration_page(test_client):
@@ -586,3 +587,48 @@ def test_get_resend_email_confirmation_not_logged_in(test_client):
         assert b'Email sent to confirm your email address.  Please check your email!' not in response.data
         assert len(outbox) == 0
         assert b'Please log in to access this page.' in response.data
+
+
+def test_user_loaded_from_cache(test_client, log_in_default_user, afterwards_reset_default_user_password):
+    """
+    GIVEN a Flask application configured for testing with the user logged in
+    WHEN the '/users/profile' page is requested (GET) twice, and then the password is changed
+    THEN check that the user is only loaded from the database for the first request, that the
+         hashed password is not cached and that the cached user is invalidated by the password change
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = database.engine
+    user_cache.clear()
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        for _ in range(2):
+            response = test_client.get('/users/profile')
+            assert response.status_code == 200
+            assert b'Email: patrick@gmail.com' in response.data
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+    assert len([statement for statement in statements if 'FROM users' in statement]) == 1
+    assert user_cache.stats()['hits'] == 1
+    user_id = database.session.execute(database.select(User.id).where(User.email == 'patrick@gmail.com')).scalar_one()
+    cached_values = user_cache.backend.get_last_known(user_id)
+    assert cached_values['email'] == 'patrick@gmail.com'
+    assert 'password_hashed' not in cached_values
+
+    response = test_client.post('/users/change_password',
+                                data={'current_password': 'FlaskIsAwesome123',
+                                      'new_password': 'FlaskIsTheBest987'},
+                                follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Password has been updated!' in response.data
+    query = database.select(User).where(User.email == 'patrick@gmail.com')
+    user = database.session.execute(query).scalar_one()
+    assert user.is_password_correct('FlaskIsTheBest987')
+    # The hashed password of the cached user was loaded to check the current password, and
+    # the profile page (redirect) loaded the user again after the cached user was invalidated
+    assert user_cache.stats()['hits'] == 2
+    assert user_cache.stats()['misses'] == 2
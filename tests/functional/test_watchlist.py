@@ -1,6 +1,9 @@
 """
 This file (test_watchlist.py) contains the functional tests for the `watchlist` blueprint.
 """
+from project import database
+from project.models import User, WatchStock
+from sqlalchemy import event
 import re
 
 
@@ -171,3 +174,72 @@ def test_get_stock_analysis_guide_page(test_client, log_in_default_user):
     response = test_client.get('/stock_analysis_guide', follow_redirects=True)
     assert response.status_code == 200
     assert b'Stock Analysis Guide' in response.data
+
+
+def test_get_watchlist_page_sorted_pages(test_client, add_watch_stocks_for_default_user,
+                                         mock_requests_get_success_overview, monkeypatch):
+    """
+    GIVEN a Flask application configured for testing with the default user logged in
+          and 2 stocks per page
+    WHEN the '/watchlist' page is requested (GET) sorted by the stock symbol and each next page is followed
+    THEN check that every stock in the watchlist is listed once in order of the stock symbol
+    """
+    monkeypatch.setitem(test_client.application.config, 'STOCKS_PER_PAGE', 2)
+    watchstock_ids = []
+    symbols = []
+    url = '/watchlist?sort=symbol'
+    while url:
+        response = test_client.get(url)
+        assert response.status_code == 200
+        page_watchstock_ids = re.findall(rb'href="/watchlist/(\d+)/delete"', response.data)
+        assert 0 < len(page_watchstock_ids) <= 2
+        watchstock_ids.extend(page_watchstock_ids)
+        symbols.extend(re.findall(rb'<td>([A-Z]{1,5})</td>', response.data))
+        next_page = re.search(rb'href="([^"]+)">Next Page</a>', response.data)
+        url = next_page.group(1).decode().replace('&amp;', '&') if next_page else None
+
+    assert len(watchstock_ids) == len(set(watchstock_ids)) == len(symbols)
+    assert {b'COST', b'MSFT', b'QCOM'} <= set(symbols)
+    assert symbols == sorted(symbols)
+
+
+def test_get_watchlist_page_invalid_sort(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing with the default user logged in
+    WHEN the '/watchlist' page is requested (GET) with an invalid sort option
+    THEN check that a 400 (Bad Request) error is returned
+    """
+    response = test_client.get('/watchlist?sort=company_name')
+    assert response.status_code == 400
+
+
+def test_get_watchlist_page_failed_stock_analysis_data(test_client, log_in_default_user, mock_requests_get_failure):
+    """
+    GIVEN a Flask application configured for testing with the default user logged in
+          and a stock in the watchlist without any stock analysis data
+    WHEN the '/watchlist' page is requested (GET) but the responses from Alpha Vantage failed
+    THEN check that the page is shown without committing a transaction
+    """
+    user = database.session.execute(database.select(User).where(User.email == 'patrick@gmail.com')).scalar_one()
+    watchstock = WatchStock('NFLX', user.id)
+    database.session.add(watchstock)
+    database.session.commit()
+    watchstock_id = watchstock.id
+    commits = []
+
+    def commit(conn):
+        commits.append(conn)
+
+    engine = database.session.get_bind()
+    event.listen(engine, 'commit', commit)
+    try:
+        response = test_client.get('/watchlist')
+    finally:
+        event.remove(engine, 'commit', commit)
+        database.session.delete(database.session.get(WatchStock, watchstock_id))
+        database.session.commit()
+
+    assert response.status_code == 200
+    assert b'NFLX' in response.data
+    assert commits == []
+
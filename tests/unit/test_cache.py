@@ -0,0 +1,118 @@
+"""
+This file (test_cache.py) contains the unit tests for the cache.py file.
+"""
+from project.cache import SQLiteTTLCache, TTLCache
+from freezegun import freeze_time
+
+
+def test_cache_miss_then_hit():
+    """
+    GIVEN an empty TTLCache
+    WHEN a value is retrieved before and after it is stored
+    THEN check that a miss and then a hit are counted
+    """
+    cache = TTLCache('TEST_CACHE')
+    assert cache.get('AAPL') is None
+    cache.set('AAPL', 148.34)
+    assert cache.get('AAPL') == 148.34
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+    assert cache.stats()['evictions'] == 0
+
+
+def test_cache_entry_expires():
+    """
+    GIVEN a TTLCache with a TTL of 60 seconds
+    WHEN a value is retrieved after the TTL has elapsed
+    THEN check that the value is no longer returned
+    """
+    cache = TTLCache('TEST_CACHE', ttl=60)
+    with freeze_time('2020-07-28 10:00:00') as frozen_time:
+        cache.set('AAPL', 148.34)
+        frozen_time.tick(59)
+        assert cache.get('AAPL') == 148.34
+        frozen_time.tick(2)
+        assert cache.get('AAPL') is None
+
+
+def test_cache_evicts_least_recently_used():
+    """
+    GIVEN a TTLCache with a maximum size of 2 entries
+    WHEN a third value is stored
+    THEN check that the least recently used entry is evicted
+    """
+    cache = TTLCache('TEST_CACHE', max_size=2)
+    cache.set('AAPL', 148.34)
+    cache.set('COST', 312.78)
+    assert cache.get('AAPL') == 148.34  # AAPL is now the most recently used
+    cache.set('MSFT', 295.37)
+    assert len(cache) == 2
+    assert cache.get('COST') is None
+    assert cache.get('AAPL') == 148.34
+    assert cache.get('MSFT') == 295.37
+    assert cache.stats()['evictions'] == 1
+
+
+def test_sqlite_cache_shared(tmp_path):
+    """
+    GIVEN a SQLiteTTLCache
+    WHEN a value is stored and then deleted
+    THEN check that the value is returned by any SQLiteTTLCache using the same database until it is deleted
+    """
+    cache = SQLiteTTLCache('TEST_CACHE', path=str(tmp_path / 'cache.sqlite'))
+    cache._create_table()
+    assert cache.get(1) is None
+    cache.set(1, {'email': 'patrick@gmail.com'})
+    assert cache.get(1) == {'email': 'patrick@gmail.com'}
+
+    other_cache = SQLiteTTLCache('TEST_CACHE', path=cache.path)
+    assert other_cache.get(1) == {'email': 'patrick@gmail.com'}
+    other_cache.delete(1)
+    assert cache.get(1) is None
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 2
+
+
+def test_sqlite_cache_expiry_and_eviction(tmp_path):
+    """
+    GIVEN a SQLiteTTLCache with a maximum size of 2 entries
+    WHEN an expired value is retrieved and a third value is stored
+    THEN check that the expired value is not returned and that the entry that expires first is evicted,
+         however recently it was read
+    """
+    cache = SQLiteTTLCache('TEST_CACHE', path=str(tmp_path / 'cache.sqlite'), max_size=2, ttl=-1.0)
+    cache._create_table()
+    cache.set('AAPL', 148.34)
+    assert cache.get('AAPL') is None
+
+    cache.ttl = 60.0
+    with freeze_time('2020-07-28 10:00:00') as frozen_time:
+        cache.set('AAPL', 148.34)
+        frozen_time.tick(1)
+        cache.set('COST', 312.78)
+        frozen_time.tick(1)
+        assert cache.get('AAPL') == 148.34  # AAPL still expires first
+        frozen_time.tick(1)
+        cache.set('MSFT', 295.37)
+        assert len(cache) == 2
+        assert cache.get('AAPL') is None
+        assert cache.get('COST') == 312.78
+        assert cache.get('MSFT') == 295.37
+        assert cache.stats()['evictions'] == 1
+
+
+def test_sqlite_cache_get_is_read_only(tmp_path):
+    """
+    GIVEN a SQLiteTTLCache with a stored value
+    WHEN the value is retrieved
+    THEN check that the database is not written and that the connection of the thread is reused
+    """
+    cache = SQLiteTTLCache('TEST_CACHE', path=str(tmp_path / 'cache.sqlite'))
+    cache._create_table()
+    cache.set(1, {'email': 'patrick@gmail.com'})
+    connection = cache._connect()
+    total_changes = connection.total_changes
+
+    assert cache.get(1) == {'email': 'patrick@gmail.com'}
+    assert cache._connect() is connection
+    assert connection.total_changes == total_changes
@@ -0,0 +1,70 @@
+"""
+This file (test_config.py) contains the unit tests for the config.py file.
+"""
+import config
+import importlib
+import pytest
+
+
+@pytest.fixture(scope='function')
+def reload_config(monkeypatch):
+    # Reload the configuration after setting the environment variables, and restore it afterwards
+    yield lambda: importlib.reload(config)
+    monkeypatch.undo()
+    importlib.reload(config)
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('1', True), ('true', True), ('True', True), ('yes', True), ('on', True),
+    ('0', False), ('false', False), ('False', False), ('no', False), ('off', False), ('', False),
+])
+def test_getenv_bool(monkeypatch, value, expected):
+    """
+    GIVEN an environment variable set to a boolean value
+    WHEN the environment variable is read as a boolean
+    THEN check that the value is parsed as a boolean, instead of any non-empty string being true
+    """
+    monkeypatch.setenv('TEST_FLAG', value)
+    assert config.getenv_bool('TEST_FLAG', default=not expected) is expected
+
+
+def test_getenv_bool_default(monkeypatch):
+    """
+    GIVEN an environment variable that is not set
+    WHEN the environment variable is read as a boolean
+    THEN check that the default is returned
+    """
+    monkeypatch.delenv('TEST_FLAG', raising=False)
+    assert config.getenv_bool('TEST_FLAG', default=True) is True
+    assert config.getenv_bool('TEST_FLAG', default=False) is False
+
+
+@pytest.mark.parametrize('name', [
+    'MARKET_DATA_STALE_WHILE_REVALIDATE',
+    'PRICE_STREAM_ENABLED',
+    'MARKET_DATA_PREFETCH_ON_LOGIN',
+    'ALPHA_VANTAGE_BULK_QUOTES',
+    'MARKET_DATA_RECORD',
+    'MARKET_DATA_RESPONSE_CACHE',
+])
+@pytest.mark.parametrize('value', ['False', '0', 'false'])
+def test_flag_disabled(monkeypatch, reload_config, name, value):
+    """
+    GIVEN a flag set to a false value in the environment
+    WHEN the configuration is loaded
+    THEN check that the flag is disabled
+    """
+    monkeypatch.setenv(name, value)
+    assert getattr(reload_config().Config, name) is False
+
+
+def test_user_cache_backend_default(monkeypatch, reload_config):
+    """
+    GIVEN USER_CACHE_BACKEND not set in the environment
+    WHEN the configuration is loaded
+    THEN check that the users are cached in-process by every configuration
+    """
+    monkeypatch.delenv('USER_CACHE_BACKEND', raising=False)
+    reloaded_config = reload_config()
+    for config_class in (reloaded_config.ProductionConfig, reloaded_config.DevelopmentConfig, reloaded_config.TestingConfig):
+        assert config_class.USER_CACHE_BACKEND == 'memory'
@@ -0,0 +1,95 @@
+"""
+This file (test_indexes.py) contains the unit tests that check that the queries
+executed by the application on the stocks and watchstocks tables use the indexes
+defined in models.py.
+"""
+from project import database
+from project.admin.routes import get_users_with_stock_counts
+from project.market_data import refresh
+from project.models import Stock, WatchStock
+from project.pagination import paginate
+from project.stocks.routes import STOCK_SORT_OPTIONS
+from project.watchlist.routes import WATCHSTOCK_SORT_OPTIONS
+from sqlalchemy import event
+
+
+def explain_statements(function, *args) -> dict:
+    """Call the function and return the query plan of each SQL statement that it executed.
+
+    Returns a dictionary of {SQL statement: query plan}.
+    """
+    engine = database.engines[None]
+    statements = []
+
+    def record_statement(connection, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', record_statement)
+    try:
+        function(*args)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record_statement)
+
+    plans = {}
+    with engine.connect() as connection:
+        for statement, parameters in statements:
+            rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).all()
+            plans[statement] = '\n'.join(str(row[-1]) for row in rows)
+    return plans
+
+
+def plans_for_table(plans: dict, table: str) -> list:
+    return [plan for statement, plan in plans.items() if f' {table} ' in f'{statement} ']
+
+
+def test_list_stocks_uses_index(new_stock):
+    """
+    GIVEN a Flask application configured for testing
+    WHEN the page of the stocks in the portfolio of a user is selected
+    THEN check that the query uses the index on the user ID and ID of the stocks
+    """
+    query = database.select(Stock).where(Stock.user_id == 1)
+    plans = explain_statements(paginate, query, STOCK_SORT_OPTIONS['id'], Stock.id)
+    assert plans_for_table(plans, 'stocks')
+    assert all('ix_stocks_user_id_id' in plan for plan in plans_for_table(plans, 'stocks'))
+
+
+def test_watchlist_uses_index(new_stock):
+    """
+    GIVEN a Flask application configured for testing
+    WHEN the page of the stocks in the watchlist of a user is selected
+    THEN check that the query uses the index on the user ID and ID of the watchstocks
+    """
+    query = database.select(WatchStock).where(WatchStock.user_id == 1)
+    plans = explain_statements(paginate, query, WATCHSTOCK_SORT_OPTIONS['id'], WatchStock.id)
+    assert plans_for_table(plans, 'watchstocks')
+    assert all('ix_watchstocks_user_id_id' in plan for plan in plans_for_table(plans, 'watchstocks'))
+
+
+def test_admin_list_users_uses_index(new_stock):
+    """
+    GIVEN a Flask application configured for testing
+    WHEN the page of the users with the number of stocks in their portfolio and watchlist is selected
+    THEN check that the watchstocks are counted using the index on the user ID and ID of the watchstocks,
+         and that the number of stocks in the portfolio is read from the portfolio totals
+    """
+    plans = explain_statements(get_users_with_stock_counts)
+    assert len(plans) == 1
+    plan = list(plans.values())[0]
+    assert 'ix_watchstocks_user_id_id' in plan
+    assert 'portfolio_summary' in plan
+    assert not plans_for_table(plans, 'stocks')
+
+
+def test_refresh_stock_prices_uses_index(new_stock, monkeypatch):
+    """
+    GIVEN a Flask application configured for testing
+    WHEN the current price of a stock is refreshed across all portfolios and watchlists
+    THEN check that the portfolio totals, stocks and watchstocks are updated using the indexes on the stock symbol
+    """
+    monkeypatch.setattr(refresh, 'get_current_stock_prices', lambda symbols: {symbol: 148.34 for symbol in symbols})
+    plans = explain_statements(refresh.refresh_stock_prices, ['AAPL'])
+    updates = {statement: plan for statement, plan in plans.items() if statement.startswith('UPDATE')}
+    assert len(updates) == 3
+    assert all('ix_stocks_stock_symbol' in plan for plan in plans_for_table(updates, 'stocks'))
+    assert all('ix_watchstocks_stock_symbol' in plan for plan in plans_for_table(updates, 'watchstocks'))
@@ -0,0 +1,108 @@
+"""
+This file (test_market_calendar.py) contains the unit tests for the market_data/market_calendar.py file.
+"""
+from project.market_data.market_calendar import MarketCalendar, get_market_holidays
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+
+
+NEW_YORK = ZoneInfo('America/New_York')
+
+
+def test_get_market_holidays():
+    """
+    GIVEN the trading calendar of the stock exchange
+    WHEN the market holidays are retrieved for 2022
+    THEN check that the holidays (including the observed holidays) are correct
+    """
+    assert sorted(get_market_holidays(2022)) == [
+        date(2022, 1, 17), date(2022, 2, 21), date(2022, 4, 15), date(2022, 5, 30), date(2022, 6, 20),
+        date(2022, 7, 4), date(2022, 9, 5), date(2022, 11, 24), date(2022, 12, 26),
+    ]
+    # New Year's Day on a Saturday is not observed on the Friday before
+    assert date(2021, 12, 31) not in get_market_holidays(2021)
+    # Juneteenth is only a market holiday since 2022
+    assert date(2021, 6, 18) not in get_market_holidays(2021)
+
+
+def test_get_last_close():
+    """
+    GIVEN a MarketCalendar
+    WHEN the last close is retrieved during the day, after the close, over a weekend and on a holiday
+    THEN check that the close of the latest trading session is returned
+    """
+    calendar = MarketCalendar()
+    # During the trading session on a Monday
+    assert calendar.get_last_close(datetime(2024, 7, 1, 11, 0, tzinfo=NEW_YORK)) == \
+        datetime(2024, 6, 28, 16, 0, tzinfo=NEW_YORK)
+    # After the close on a Monday
+    assert calendar.get_last_close(datetime(2024, 7, 1, 17, 0, tzinfo=NEW_YORK)) == \
+        datetime(2024, 7, 1, 16, 0, tzinfo=NEW_YORK)
+    # On a Sunday
+    assert calendar.get_last_close(datetime(2024, 6, 30, 12, 0, tzinfo=NEW_YORK)) == \
+        datetime(2024, 6, 28, 16, 0, tzinfo=NEW_YORK)
+    # On Independence Day (Thursday)
+    assert calendar.get_last_close(datetime(2024, 7, 4, 18, 0, tzinfo=NEW_YORK)) == \
+        datetime(2024, 7, 3, 16, 0, tzinfo=NEW_YORK)
+    # Timezone-aware datetimes in other timezones are converted
+    assert calendar.get_last_close(datetime(2024, 7, 1, 20, 30, tzinfo=ZoneInfo('UTC'))) == \
+        datetime(2024, 7, 1, 16, 0, tzinfo=NEW_YORK)
+
+
+def test_get_next_close():
+    """
+    GIVEN a MarketCalendar
+    WHEN the next close is retrieved before a holiday weekend
+    THEN check that the close of the next trading session is returned
+    """
+    calendar = MarketCalendar()
+    # Thursday before Good Friday
+    assert calendar.get_next_close(datetime(2024, 3, 28, 17, 0, tzinfo=NEW_YORK)) == \
+        datetime(2024, 4, 1, 16, 0, tzinfo=NEW_YORK)
+
+
+def test_get_week_close_with_holiday():
+    """
+    GIVEN a MarketCalendar
+    WHEN the week close is retrieved for a week ending with the Good Friday holiday
+    THEN check that the close on Thursday is the last close of the week
+    """
+    calendar = MarketCalendar()
+    assert calendar.get_last_week_close(datetime(2024, 3, 30, 12, 0, tzinfo=NEW_YORK)) == \
+        datetime(2024, 3, 28, 16, 0, tzinfo=NEW_YORK)
+    assert calendar.get_last_week_close(datetime(2024, 3, 28, 12, 0, tzinfo=NEW_YORK)) == \
+        datetime(2024, 3, 22, 16, 0, tzinfo=NEW_YORK)
+    assert calendar.get_next_week_close(datetime(2024, 3, 25, 9, 0, tzinfo=NEW_YORK)) == \
+        datetime(2024, 3, 28, 16, 0, tzinfo=NEW_YORK)
+    assert calendar.get_next_week_close(datetime(2024, 3, 28, 16, 0, tzinfo=NEW_YORK)) == \
+        datetime(2024, 4, 5, 16, 0, tzinfo=NEW_YORK)
+
+
+def test_is_current_over_weekend():
+    """
+    GIVEN a MarketCalendar
+    WHEN a price retrieved after the close on Friday is checked during the weekend and on Monday
+    THEN check that the price is only stale once the market has closed on Monday
+    """
+    calendar = MarketCalendar()
+    retrieved_on = datetime(2024, 6, 28, 16, 30, tzinfo=NEW_YORK)
+    assert calendar.is_current(retrieved_on, now=datetime(2024, 6, 29, 10, 0, tzinfo=NEW_YORK))
+    assert calendar.is_current(retrieved_on, now=datetime(2024, 7, 1, 15, 59, tzinfo=NEW_YORK))
+    assert not calendar.is_current(retrieved_on, now=datetime(2024, 7, 1, 16, 0, tzinfo=NEW_YORK))
+    assert not calendar.is_current(None)
+
+    # A price retrieved during the trading session on Friday is stale after the close
+    retrieved_on = datetime(2024, 6, 28, 12, 0, tzinfo=NEW_YORK)
+    assert not calendar.is_current(retrieved_on, now=datetime(2024, 6, 29, 10, 0, tzinfo=NEW_YORK))
+
+
+def test_is_current_weekly():
+    """
+    GIVEN a MarketCalendar
+    WHEN the weekly prices retrieved on a Monday are checked later in the week and the week after
+    THEN check that the weekly prices are only stale once the last trading day of the week has closed
+    """
+    calendar = MarketCalendar()
+    retrieved_on = datetime(2024, 6, 24, 10, 0, tzinfo=NEW_YORK)
+    assert calendar.is_current_weekly(retrieved_on, now=datetime(2024, 6, 27, 17, 0, tzinfo=NEW_YORK))
+    assert not calendar.is_current_weekly(retrieved_on, now=datetime(2024, 6, 28, 16, 0, tzinfo=NEW_YORK))
@@ -0,0 +1,101 @@
+"""
+This file (test_market_data_client.py) contains the unit tests for the market_data/client.py file.
+"""
+from project import market_data_client
+from project.models import get_current_stock_price
+from project.market_data.client import MarketDataClient
+from tests.conftest import MockSuccessResponseQuote, MockSuccessResponseWeekly
+from threading import Event, Thread
+import requests
+
+
+def test_session_is_reused():
+    """
+    GIVEN a MarketDataClient
+    WHEN the session is accessed multiple times
+    THEN check that the same pooled session is returned with gzip and keep-alive enabled
+    """
+    client = MarketDataClient()
+    client.pool_size = 4
+    session = client.session
+    assert client.session is session
+    assert session.headers['Accept-Encoding'] == 'gzip, deflate'
+    assert session.headers['Connection'] == 'keep-alive'
+    assert session.get_adapter('https://www.alphavantage.co')._pool_maxsize == 4
+    client.close()
+    assert client.session is not session
+
+
+def test_get_uses_timeouts(new_stock, monkeypatch):
+    """
+    GIVEN a Flask application configured for testing and a monkeypatched version of requests.Session.get()
+    WHEN a GET call is made using the market data client
+    THEN check that the connect and read timeouts from the configuration are used
+    """
+    calls = []
+
+    def mock_get(self, url, **kwargs):
+        calls.append(kwargs)
+        return MockSuccessResponseQuote(url)
+
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
+    market_data_client.get('https://www.alphavantage.co/query?function=GLOBAL_QUOTE&symbol=AAPL&apikey=demo')
+    assert calls == [{'timeout': (3.05, 10.0), 'stream': False}]
+
+
+def test_get_parsed_streams_response(new_stock, monkeypatch):
+    """
+    GIVEN a Flask application configured for testing and a monkeypatched version of requests.Session.get()
+    WHEN concurrent GET calls with the same key are made to parse the response body
+    THEN check that the response is streamed, parsed once and closed, and that the parsed result is shared
+    """
+    calls = []
+    closed = []
+    started = Event()
+    release = Event()
+
+    class MockStreamedResponse(MockSuccessResponseWeekly):
+        def close(self):
+            closed.append(self.url)
+
+    def mock_get(self, url, **kwargs):
+        calls.append(kwargs)
+        return MockStreamedResponse(url)
+
+    def parse(r):
+        started.set()
+        release.wait()
+        return b''.join(r.iter_content())
+
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
+    url = 'https://www.alphavantage.co/query?function=TIME_SERIES_WEEKLY_ADJUSTED&symbol=AAPL&apikey=demo'
+    results = []
+    leader = Thread(target=lambda: results.append(market_data_client.get_parsed(url, parse, url)))
+    leader.start()
+    started.wait()
+    coalesced = market_data_client.single_flight.coalesced
+    follower = Thread(target=lambda: results.append(market_data_client.get_parsed(url, parse, url)))
+    follower.start()
+    while market_data_client.single_flight.coalesced == coalesced:
+        pass
+    release.set()
+    leader.join()
+    follower.join()
+
+    assert calls == [{'timeout': (3.05, 10.0), 'stream': True}]
+    assert closed == [url]
+    assert len(results) == 2 and results[0] is results[1]
+    assert b'379.2400' in results[0]
+
+
+def test_get_current_stock_price_network_error(new_stock, monkeypatch):
+    """
+    GIVEN a Flask application configured for testing and a monkeypatched version of requests.Session.get()
+    WHEN the GET call times out
+    THEN check that a price of zero is returned
+    """
+    def mock_get(self, url, **kwargs):
+        raise requests.exceptions.Timeout()
+
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
+    assert get_current_stock_price('AAPL') == 0.0
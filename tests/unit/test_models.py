@@ -3,6 +3,16 @@ This file (test_models.py) contains the unit tests for the models.py file.
 """
 from datetime import datetime
 from freezegun import freeze_time
+from project import database, quote_cache
+from project.market_data.refresh import refresh_stock_prices
+from project.models import PortfolioSummary, PriceHistory, SecurityFundamentals, Stock, WatchStock, get_current_stock_price, \
+    get_current_stock_prices
+from tests.conftest import MockSuccessResponseQuote, MockSuccessResponseBulkQuotes, MockApiRateLimitExceededResponse, \
+    MockSuccessResponseWeekly, MockSuccessResponseOverview
+from sqlalchemy import event, func
+from flask import current_app
+import requests
+import time
 
 
 def test_new_stock(new_stock):
@@ -141,6 +151,104 @@ def test_get_stock_data_success_two_calls(new_stock, mock_requests_get_success_q
     assert new_stock.position_value == (14834*16)
 
 
+def test_get_stock_data_uses_quote_cache(new_stock, new_watch_stock, monkeypatch):
+    """
+    GIVEN a Flask application configured for testing and a monkeypatched version of requests.get()
+    WHEN the current price is retrieved for a Stock and then for a WatchStock
+    THEN check that only one call is made to the API and the cached price is used for both
+    """
+    urls = []
+
+    def mock_get(self, url, **kwargs):
+        urls.append(url)
+        return MockSuccessResponseQuote(url)
+
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
+    new_stock.get_stock_data()
+    new_watch_stock.stock_symbol = 'AAPL'
+    new_watch_stock.retrieve_current_share_price()
+    assert len(urls) == 1
+    assert new_stock.current_price == 14834  # $148.34 -> integer
+    assert new_watch_stock.current_share_price == 14834  # $148.34 -> integer
+    assert quote_cache.stats()['hits'] == 1
+
+
+def test_get_current_stock_prices_concurrent(new_stock, monkeypatch):
+    """
+    GIVEN a Flask application configured for testing and a slow, monkeypatched version of requests.get()
+    WHEN the current prices of multiple stocks are retrieved
+    THEN check that the calls are made concurrently and a price is returned for each stock
+    """
+    def mock_get(self, url, **kwargs):
+        time.sleep(0.2)
+        return MockSuccessResponseQuote(url)
+
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
+    start_time = time.monotonic()
+    current_prices = get_current_stock_prices(['AAPL', 'COST', 'MSFT', 'QCOM', 'AAPL'])
+    assert (time.monotonic() - start_time) < 0.6
+    assert current_prices == {'AAPL': 148.34, 'COST': 148.34, 'MSFT': 148.34, 'QCOM': 148.34}
+
+
+def test_get_current_stock_prices_no_symbols(new_stock):
+    """
+    GIVEN a Flask application configured for testing
+    WHEN the current prices are retrieved for an empty list of stocks
+    THEN check that no prices are returned
+    """
+    assert get_current_stock_prices([]) == {}
+
+
+def test_get_current_stock_prices_bulk(new_stock, monkeypatch):
+    """
+    GIVEN a Flask application configured for testing with bulk quotes enabled and a monkeypatched
+          version of requests.Session.get()
+    WHEN the current prices of multiple stocks are retrieved
+    THEN check that the stocks are retrieved in chunks of bulk calls and the prices are cached,
+         and that a stock missing from the bulk response is retrieved individually
+    """
+    urls = []
+
+    def mock_get(self, url, **kwargs):
+        urls.append(url)
+        if 'function=REALTIME_BULK_QUOTES' in url:
+            return MockSuccessResponseBulkQuotes(url)
+        return MockSuccessResponseQuote(url)
+
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
+    monkeypatch.setitem(current_app.config, 'ALPHA_VANTAGE_BULK_QUOTES', True)
+    monkeypatch.setitem(current_app.config, 'ALPHA_VANTAGE_BULK_QUOTES_MAX_SYMBOLS', 2)
+    current_prices = get_current_stock_prices(['AAPL', 'cost', 'MSFT'])
+    assert len(urls) == 3
+    assert all('function=REALTIME_BULK_QUOTES' in url for url in urls[:2])
+    assert 'function=GLOBAL_QUOTE' in urls[2] and 'symbol=MSFT' in urls[2]
+    assert current_prices == {'AAPL': 148.34, 'cost': 312.78, 'MSFT': 148.34}
+    assert get_current_stock_price('AAPL') == 148.34
+    assert len(urls) == 3
+
+
+def test_get_current_stock_prices_bulk_unavailable(new_stock, monkeypatch):
+    """
+    GIVEN a Flask application configured for testing with bulk quotes enabled and a monkeypatched
+          version of requests.Session.get()
+    WHEN the bulk call is not available for the API key
+    THEN check that the current price of each stock is retrieved individually
+    """
+    urls = []
+
+    def mock_get(self, url, **kwargs):
+        urls.append(url)
+        if 'function=REALTIME_BULK_QUOTES' in url:
+            return MockApiRateLimitExceededResponse(url)
+        return MockSuccessResponseQuote(url)
+
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
+    monkeypatch.setitem(current_app.config, 'ALPHA_VANTAGE_BULK_QUOTES', True)
+    current_prices = get_current_stock_prices(['AAPL', 'COST'])
+    assert len(urls) == 3
+    assert current_prices == {'AAPL': 148.34, 'COST': 148.34}
+
+
 @freeze_time('2020-07-28')
 def test_get_weekly_stock_data_success(new_stock, mock_requests_get_success_weekly):
     """
@@ -155,9 +263,9 @@ def test_get_weekly_stock_data_success(new_stock, mock_requests_get_success_week
     assert labels[1].date() == datetime(2020, 7, 17).date()
     assert labels[2].date() == datetime(2020, 7, 24).date()
     assert len(values) == 3
-    assert values[0] == '354.3400'
-    assert values[1] == '362.7600'
-    assert values[2] == '379.2400'
+    assert values[0] == 354.34
+    assert values[1] == 362.76
+    assert values[2] == 379.24
     assert datetime.now() == datetime(2020, 7, 28)
 
 
@@ -173,6 +281,62 @@ def test_get_weekly_stock_data_failure(new_stock, mock_requests_get_failure):
     assert len(values) == 0
 
 
+@freeze_time('2020-07-28')
+def test_get_weekly_stock_data_stored(new_stock, mock_requests_get_success_weekly):
+    """
+    GIVEN a Flask application configured for testing and a monkeypatched version of requests.Session.get()
+    WHEN the weekly stock data is retrieved
+    THEN check that the weekly prices are stored in the database
+    """
+    new_stock.get_weekly_stock_data()
+    query = database.select(PriceHistory).where(PriceHistory.stock_symbol == 'AAPL').order_by(PriceHistory.date)
+    weekly_prices = database.session.execute(query).scalars().all()
+    assert len(weekly_prices) == 4
+    assert weekly_prices[0].date == datetime(2020, 2, 25)
+    assert weekly_prices[0].close_price == 43298  # $432.98 -> integer
+    assert weekly_prices[3].date == datetime(2020, 7, 24)
+    assert weekly_prices[3].close_price == 37924  # $379.24 -> integer
+    assert weekly_prices[3].retrieved_on == datetime(2020, 7, 28)
+
+
+def test_get_weekly_stock_data_no_api_call_when_synced(new_stock, mock_requests_get_success_weekly, monkeypatch):
+    """
+    GIVEN a Flask application configured for testing and weekly prices retrieved earlier in the day
+    WHEN the weekly stock data is retrieved again and the API call would fail
+    THEN check that the chart data is returned from the database without an API call
+    """
+    with freeze_time('2020-07-28 09:00:00'):
+        new_stock.get_weekly_stock_data()
+
+    def mock_get(self, url, **kwargs):
+        raise requests.exceptions.ConnectionError()
+
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
+    with freeze_time('2020-07-28 15:00:00'):
+        title, labels, values = new_stock.get_weekly_stock_data()
+    assert title == 'Weekly Prices (AAPL)'
+    assert values == [354.34, 362.76, 379.24]
+
+
+def test_get_weekly_stock_data_incremental_sync(new_stock, monkeypatch):
+    """
+    GIVEN a Flask application configured for testing and weekly prices stored in the database
+    WHEN the weekly stock data is retrieved on a later day
+    THEN check that the latest stored week is replaced and only newer weeks are added
+    """
+    database.session.add(PriceHistory('AAPL', datetime(2020, 7, 17), '362.7600', datetime(2020, 7, 17)))
+    database.session.add(PriceHistory('AAPL', datetime(2020, 7, 22), '370.0000', datetime(2020, 7, 22)))
+
+    def mock_get(self, url, **kwargs):
+        return MockSuccessResponseWeekly(url)
+
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
+    with freeze_time('2020-07-28'):
+        title, labels, values = new_stock.get_weekly_stock_data()
+    assert [label.date() for label in labels] == [datetime(2020, 7, 17).date(), datetime(2020, 7, 24).date()]
+    assert values == [362.76, 379.24]
+
+
 def test_new_admin_user(new_admin_user):
     """
     GIVEN a User model
@@ -405,3 +569,194 @@ def test_update_stock_only_purchase_date_changed(new_stock_updated):
     assert new_stock_updated.current_price == 14834  # $148.34 -> integer
     assert new_stock_updated.current_price_date.date() == datetime.now().date()
     assert new_stock_updated.position_value == (14834*16)
+
+
+def test_get_watchstock_data_shared(new_watch_stock, monkeypatch):
+    """
+    GIVEN a monkeypatched (successful response) version of requests.get()
+    WHEN the analysis data is retrieved for two WatchStock objects for the same stock
+    THEN check that the analysis data is retrieved once and shared by both WatchStock objects
+    """
+    urls = []
+
+    def mock_get(self, url, **kwargs):
+        urls.append(url)
+        return MockSuccessResponseOverview(url)
+
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
+    other_watch_stock = WatchStock('COST', 24)
+    database.session.add_all([new_watch_stock, other_watch_stock])
+    new_watch_stock.retrieve_stock_analysis_data()
+    other_watch_stock.retrieve_stock_analysis_data()
+    database.session.commit()
+    assert len(urls) == 1
+    assert other_watch_stock.company_name == 'Costco Wholesale Corporation'
+    assert other_watch_stock.get_pe_ratio() == 37.15
+
+    # Check that the analysis data is loaded with the watchstocks
+    database.session.expunge_all()
+    watchstocks = database.session.execute(database.select(WatchStock)).scalars().all()
+    assert [watchstock.company_name for watchstock in watchstocks] == ['Costco Wholesale Corporation'] * 2
+    assert database.session.execute(database.select(func.count()).select_from(SecurityFundamentals)).scalar() == 1
+
+
+def test_update_current_prices(new_stock):
+    """
+    GIVEN Stock objects with a stale price, a current price, and a current price that has changed
+    WHEN the current prices are applied to the stocks twice
+    THEN check that the stocks and the total value of the portfolio are each updated in a single
+         UPDATE statement the first time, and that no statement is executed the second time
+    """
+    current_stock = Stock('COST', '10', '301.23', 17, datetime(2020, 7, 1))
+    current_stock.current_price = 31250
+    current_stock.current_price_date = datetime.now()
+    changed_stock = Stock('MSFT', '5', '212.34', 17, datetime(2020, 7, 1))
+    changed_stock.current_price = 21234
+    changed_stock.current_price_date = datetime.now()
+    stocks = [new_stock, current_stock, changed_stock]
+    for stock in stocks:
+        database.session.add(stock)
+    database.session.commit()
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # The objects are reloaded after each commit, so only the statements that write are checked
+        if not statement.startswith('SELECT'):
+            statements.append(statement)
+
+    engine = database.session.get_bind()
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        current_prices = {'AAPL': 148.34, 'COST': 312.5, 'MSFT': 215.0}
+        assert Stock.update_current_prices(stocks, current_prices) == 2
+        assert len(statements) == 2
+        assert statements[0].startswith('UPDATE portfolio_summary') and statements[1].startswith('UPDATE stocks')
+        assert not database.session.dirty
+        database.session.commit()
+
+        statements.clear()
+        assert Stock.update_current_prices(stocks, current_prices) == 0
+        assert statements == []
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+    database.session.expire_all()
+    assert new_stock.current_price == 14834
+    assert new_stock.position_value == 14834 * 16
+    assert new_stock.current_price_date is not None
+    assert changed_stock.current_price == 21500
+    assert changed_stock.position_value == 21500 * 5
+    assert current_stock.current_price == 31250
+    summary = PortfolioSummary.get(17)
+    assert summary.total_value == sum(stock.position_value for stock in stocks)
+    assert summary.cost_basis == sum(stock.get_cost_basis() for stock in stocks)
+    assert summary.number_of_positions == 3
+    assert summary.last_refreshed is not None
+
+
+def test_portfolio_summary_change_totals(new_stock):
+    """
+    GIVEN a user without a row in the portfolio_summary table
+    WHEN changes are added to the totals of the portfolio of the user
+    THEN check that the row is created by the first change and that the later changes are added to it
+    """
+    summary = PortfolioSummary.get(17)
+    assert (summary.total_value, summary.cost_basis, summary.number_of_positions) == (0, 0, 0)
+
+    refreshed = datetime(2024, 1, 5, 16, 30)
+    PortfolioSummary.change_totals(17, 0, new_stock.get_cost_basis(), 1)
+    PortfolioSummary.change_totals(17, total_value=237344, last_refreshed=refreshed)
+    PortfolioSummary.change_totals(17, -1000, -2000)
+    database.session.commit()
+
+    summary = PortfolioSummary.get(17)
+    assert summary.total_value == 236344
+    assert summary.cost_basis == 40678 * 16 - 2000
+    assert summary.number_of_positions == 1
+    assert summary.last_refreshed == refreshed
+    assert summary.get_total_value() == 2363.44
+
+
+def test_portfolio_summary_locked_before_refresh(new_stock):
+    """
+    GIVEN Stock objects in the portfolios of two users
+    WHEN the current price of a stock is applied by the bulk UPDATE statements
+    THEN check that the totals of the portfolios are locked (SELECT ... FOR UPDATE) before the totals
+         and the stocks are updated
+    """
+    database.session.add_all([new_stock, Stock('AAPL', '7', '99.10', 18)])
+    database.session.commit()
+    statements = []
+
+    def do_orm_execute(orm_execute_state):
+        statements.append(orm_execute_state.statement)
+
+    event.listen(database.session, 'do_orm_execute', do_orm_execute)
+    try:
+        assert Stock.bulk_update_prices((Stock.stock_symbol == 'AAPL',), 14834, datetime.now()) == 2
+        database.session.commit()
+    finally:
+        event.remove(database.session, 'do_orm_execute', do_orm_execute)
+
+    assert len(statements) == 3
+    assert statements[0].is_select
+    assert statements[0]._for_update_arg is not None
+    assert statements[0].get_final_froms()[0].name == 'portfolio_summary'
+    assert statements[1].is_update and statements[1].table.name == 'portfolio_summary'
+    assert statements[2].is_update and statements[2].table.name == 'stocks'
+    assert PortfolioSummary.get(17).total_value == 14834 * 16
+    assert PortfolioSummary.get(18).total_value == 14834 * 7
+
+
+def test_portfolio_summary_matches_stocks(new_stock, monkeypatch):
+    """
+    GIVEN Stock objects in the portfolios of two users
+    WHEN the stocks are added, updated, moved and deleted through the session, and the current
+         prices are applied by the bulk UPDATE statements
+    THEN check that the totals of every portfolio match the SUM/COUNT over the stocks after each change
+    """
+    def mock_get(self, url, **kwargs):
+        return MockSuccessResponseQuote(url)
+
+    def check_portfolio_summaries():
+        query = (database.select(Stock.user_id,
+                                 func.sum(Stock.position_value),
+                                 func.sum(Stock.number_of_shares * Stock.purchase_price),
+                                 func.count())
+                 .group_by(Stock.user_id))
+        totals = {user_id: (total_value, cost_basis, number_of_positions)
+                  for user_id, total_value, cost_basis, number_of_positions in database.session.execute(query)}
+        summaries = database.session.execute(database.select(PortfolioSummary)).scalars().all()
+        assert {summary.user_id: (summary.total_value, summary.cost_basis, summary.number_of_positions)
+                for summary in summaries if summary.number_of_positions} == totals
+
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
+    quote_cache.clear()
+    stocks = [new_stock, Stock('COST', '10', '301.23', 17), Stock('MSFT', '5', '212.34', 18), Stock('AAPL', '7', '99.10', 18)]
+    database.session.add_all(stocks)
+    database.session.commit()
+    check_portfolio_summaries()
+
+    stocks[1].update_current_price(312.5)
+    stocks[2].update_current_price(215.0)
+    database.session.commit()
+    check_portfolio_summaries()
+    assert PortfolioSummary.get(18).last_refreshed == stocks[2].current_price_date
+
+    stocks[1].update(number_of_shares='20', purchase_price='290.00')
+    stocks[3].user_id = 17
+    database.session.commit()
+    check_portfolio_summaries()
+
+    database.session.delete(stocks[2])
+    database.session.commit()
+    check_portfolio_summaries()
+
+    assert Stock.update_current_prices(stocks, {'AAPL': 150.0, 'COST': 315.0}) == 3
+    database.session.commit()
+    check_portfolio_summaries()
+
+    assert refresh_stock_prices(['AAPL', 'COST']) == 2
+    check_portfolio_summaries()
+    assert PortfolioSummary.get(17).total_value == 14834 * (16 + 20 + 7)
@@ -0,0 +1,92 @@
+"""
+This file (test_negative_cache.py) contains the unit tests for the market_data/negative_cache.py file.
+"""
+from project import negative_cache
+from project.market_data.negative_cache import NegativeCache
+from project.market_data.providers import get_market_data_provider
+from tests.conftest import MockApiRateLimitExceededResponse, MockInvalidSymbolResponseQuote
+import requests
+
+
+def test_negative_cache_backoff():
+    """
+    GIVEN a NegativeCache
+    WHEN a stock symbol is recorded as invalid multiple times
+    THEN check that the calls are suppressed for an exponentially increasing time up to the maximum
+    """
+    cache = NegativeCache(base_ttl=60.0, max_ttl=200.0)
+    assert not cache.is_suppressed('GLOBAL_QUOTE', 'XYZ')
+    assert cache.record_invalid('GLOBAL_QUOTE', 'XYZ') == 60.0
+    assert cache.record_invalid('GLOBAL_QUOTE', 'xyz') == 120.0
+    assert cache.record_invalid('GLOBAL_QUOTE', 'XYZ') == 200.0
+    assert cache.is_suppressed('GLOBAL_QUOTE', 'XYZ')
+    assert not cache.is_suppressed('OVERVIEW', 'XYZ')
+    assert cache.stats() == {'size': 1, 'symbols': ['XYZ'], 'suppressed': 1}
+
+    cache.record_valid('GLOBAL_QUOTE', 'XYZ')
+    assert not cache.is_suppressed('GLOBAL_QUOTE', 'XYZ')
+
+
+def test_negative_cache_expiry():
+    """
+    GIVEN a NegativeCache
+    WHEN the backoff time for an invalid stock symbol has elapsed
+    THEN check that the calls are no longer suppressed
+    """
+    cache = NegativeCache(base_ttl=0.0)
+    cache.record_invalid('OVERVIEW', 'XYZ')
+    assert not cache.is_suppressed('OVERVIEW', 'XYZ')
+
+
+def test_negative_cache_max_size():
+    """
+    GIVEN a NegativeCache with a maximum size of 2
+    WHEN three stock symbols are recorded as invalid
+    THEN check that the oldest stock symbol is evicted
+    """
+    cache = NegativeCache(max_size=2)
+    for symbol in ['AAA', 'BBB', 'CCC']:
+        cache.record_invalid('GLOBAL_QUOTE', symbol)
+    assert len(cache) == 2
+    assert not cache.is_suppressed('GLOBAL_QUOTE', 'AAA')
+
+
+def test_invalid_symbol_suppressed(new_stock, monkeypatch):
+    """
+    GIVEN a Flask application configured for testing and a monkeypatched version of requests.Session.get()
+    WHEN the current price of an invalid stock symbol is retrieved multiple times
+    THEN check that only the first call is made to the API
+    """
+    urls = []
+
+    def mock_get(self, url, **kwargs):
+        urls.append(url)
+        return MockInvalidSymbolResponseQuote(url)
+
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
+    provider = get_market_data_provider()
+    assert provider.get_quote('XYZ') == 0.0
+    assert provider.get_quote('XYZ') == 0.0
+    assert provider.get_quote('XYZ') == 0.0
+    assert len(urls) == 1
+    assert negative_cache.stats()['suppressed'] == 2
+
+
+def test_rate_limit_not_cached_as_invalid(new_stock, monkeypatch):
+    """
+    GIVEN a Flask application configured for testing and a monkeypatched version of requests.Session.get()
+    WHEN the API rate limit is exceeded when retrieving the current price
+    THEN check that the stock symbol is not recorded as invalid
+    """
+    urls = []
+
+    def mock_get(self, url, **kwargs):
+        urls.append(url)
+        return MockApiRateLimitExceededResponse(url)
+
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
+    provider = get_market_data_provider()
+    assert provider.get_quote('AAPL') == 0.0
+    assert provider.get_quote('AAPL') == 0.0
+    assert len(urls) == 2
+    assert len(negative_cache) == 0
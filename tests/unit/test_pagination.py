@@ -0,0 +1,48 @@
+"""
+This file (test_pagination.py) contains the unit tests for the pagination.py file.
+"""
+from project.models import Stock
+from project.pagination import SortOption, decode_cursor, encode_cursor
+from sqlalchemy import func
+from datetime import datetime
+import pytest
+
+
+@pytest.mark.parametrize('sort_key', [17, 'COST', datetime(2020, 7, 1), None])
+def test_cursor(sort_key):
+    """
+    GIVEN a sort key and ID of the last row on a page
+    WHEN the cursor for the next page is encoded and then decoded
+    THEN check that the sort key and ID are returned
+    """
+    cursor = encode_cursor(sort_key, 42)
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == (sort_key, 42)
+
+
+@pytest.mark.parametrize('cursor', ['invalid', encode_cursor('COST', 42)[:-3], 'WzE3LCJhIl0'])
+def test_cursor_invalid(cursor):
+    """
+    GIVEN an invalid cursor
+    WHEN the cursor is decoded
+    THEN check that a ValueError is raised
+    """
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+@pytest.mark.parametrize('expression, valid_sort_key, invalid_sort_keys', [
+    (Stock.number_of_shares, 17, ['17', True, None]),
+    (func.coalesce(Stock.stock_symbol, ''), 'COST', [17, None]),
+    (func.coalesce(Stock.purchase_date, datetime(1, 1, 1)), datetime(2020, 7, 1), ['2020-07-01', 17]),
+])
+def test_sort_option_sort_key_type(expression, valid_sort_key, invalid_sort_keys):
+    """
+    GIVEN a sort option
+    WHEN the sort key decoded from a cursor is checked
+    THEN check that only a sort key of the type of the expression is valid
+    """
+    sort_option = SortOption(expression)
+    assert sort_option.is_valid_sort_key(valid_sort_key)
+    for sort_key in invalid_sort_keys:
+        assert not sort_option.is_valid_sort_key(sort_key)
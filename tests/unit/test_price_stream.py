@@ -0,0 +1,90 @@
+"""
+This file (test_price_stream.py) contains the unit tests for the market_data/price_stream.py file.
+"""
+from project.market_data.price_stream import PriceStreamer, PriceSubscription
+from flask import current_app
+from tests.conftest import MockSuccessResponseQuote
+import pytest
+import requests
+
+
+@pytest.fixture(scope='function')
+def price_streamer(new_stock):
+    price_streamer = PriceStreamer()
+    yield price_streamer
+    price_streamer.reset()
+
+
+def test_price_subscription_drops_oldest_update():
+    """
+    GIVEN a PriceSubscription with a maximum of 2 queued updates
+    WHEN 3 updates are published without being read
+    THEN check that the oldest update is dropped
+    """
+    subscription = PriceSubscription(['aapl'], max_queued=2)
+    assert subscription.symbols == {'AAPL'}
+    for price in (148.34, 148.35, 148.36):
+        subscription.publish({'symbol': 'AAPL', 'price': price})
+    assert subscription.get(timeout=0.1) == {'symbol': 'AAPL', 'price': 148.35}
+    assert subscription.get(timeout=0.1) == {'symbol': 'AAPL', 'price': 148.36}
+    assert subscription.get(timeout=0.01) is None
+
+
+def test_publish_fans_out_changed_prices(price_streamer, monkeypatch):
+    """
+    GIVEN a PriceStreamer with subscribers for overlapping sets of stocks
+    WHEN the current prices are published twice
+    THEN check that each subscriber only receives the changed prices of its stocks
+    """
+    monkeypatch.setattr(price_streamer, '_start_poller', lambda app: None)
+    subscription1 = price_streamer.subscribe(current_app, ['AAPL', 'COST'])
+    subscription2 = price_streamer.subscribe(current_app, ['AAPL'])
+    price_streamer.publish({'AAPL': 148.34, 'COST': 312.78, 'MSFT': 0.0})
+    price_streamer.publish({'AAPL': 148.34, 'COST': 313.00})
+
+    assert subscription1.get(timeout=0.1) == {'symbol': 'AAPL', 'price': 148.34}
+    assert subscription1.get(timeout=0.1) == {'symbol': 'COST', 'price': 312.78}
+    assert subscription1.get(timeout=0.1) == {'symbol': 'COST', 'price': 313.00}
+    assert subscription1.get(timeout=0.01) is None
+    assert subscription2.get(timeout=0.1) == {'symbol': 'AAPL', 'price': 148.34}
+    assert subscription2.get(timeout=0.01) is None
+
+    # A new subscriber receives the latest prices immediately
+    subscription3 = price_streamer.subscribe(current_app, ['COST'])
+    assert subscription3.get(timeout=0.1) == {'symbol': 'COST', 'price': 313.00}
+
+
+def test_shared_poller(price_streamer, monkeypatch):
+    """
+    GIVEN a PriceStreamer and a monkeypatched version of requests.Session.get()
+    WHEN multiple subscribers stream the price of the same stock
+    THEN check that the price is polled once and sent to every subscriber
+    """
+    urls = []
+
+    def mock_get(self, url, **kwargs):
+        urls.append(url)
+        return MockSuccessResponseQuote(url)
+
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
+    monkeypatch.setitem(current_app.config, 'PRICE_STREAM_INTERVAL', 60)
+    subscriptions = [price_streamer.subscribe(current_app._get_current_object(), ['AAPL']) for _ in range(5)]
+    for subscription in subscriptions:
+        assert subscription.get(timeout=2.0) == {'symbol': 'AAPL', 'price': 148.34}
+    assert len(urls) == 1
+
+
+def test_iter_events(price_streamer, monkeypatch):
+    """
+    GIVEN a PriceStreamer
+    WHEN the events are generated for a stream without any price updates
+    THEN check that keep-alive comments are sent and that the subscription is removed once the stream is closed
+    """
+    monkeypatch.setattr(price_streamer, '_start_poller', lambda app: None)
+    events = price_streamer.iter_events(current_app, ['AAPL'], heartbeat=0.01, max_duration=0.05)
+    assert next(events) == 'retry: 5000\n\n'
+    assert price_streamer.stats()['subscribers'] == 1
+    price_streamer.publish({'AAPL': 148.34})
+    assert next(events) == 'event: price\ndata: {"symbol": "AAPL", "price": 148.34}\n\n'
+    assert set(events) == {': keep-alive\n\n'}
+    assert price_streamer.stats()['subscribers'] == 0
@@ -0,0 +1,182 @@
+"""
+This file (test_providers.py) contains the unit tests for the market_data/providers.py file.
+"""
+from project.market_data.providers import AlphaVantageProvider, ReplayProvider, get_market_data_provider
+from project.models import get_current_stock_prices, fetch_weekly_stock_data
+from flask import current_app
+from tests.conftest import MockSuccessResponseQuote, MockSuccessResponseWeekly, MockFailedResponse
+import json
+import pytest
+import requests
+
+
+@pytest.fixture(scope='function')
+def replay_path(tmp_path):
+    quotes = {'AAPL': '148.3400', 'COST': '312.7800'}
+    for symbol, price in quotes.items():
+        with open(tmp_path / f'GLOBAL_QUOTE_{symbol}.json', 'w') as replay_file:
+            json.dump({'Global Quote': {'01. symbol': symbol, '05. price': price}}, replay_file)
+
+    with open(tmp_path / 'TIME_SERIES_WEEKLY_ADJUSTED.json', 'w') as replay_file:
+        json.dump({'Weekly Adjusted Time Series': {'2020-07-17': {'4. close': '385.3100'}}}, replay_file)
+
+    return str(tmp_path)
+
+
+def test_default_provider(new_stock):
+    """
+    GIVEN a Flask application configured for testing
+    WHEN the market data provider is accessed
+    THEN check that the Alpha Vantage provider is used
+    """
+    assert isinstance(get_market_data_provider(), AlphaVantageProvider)
+
+
+def test_alpha_vantage_provider_quote(new_stock, monkeypatch):
+    """
+    GIVEN a Flask application configured for testing and a monkeypatched version of requests.Session.get()
+    WHEN the current price is retrieved from the Alpha Vantage provider
+    THEN check that the price is parsed from the response
+    """
+    urls = []
+
+    def mock_get(self, url, **kwargs):
+        urls.append(url)
+        return MockSuccessResponseQuote(url)
+
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
+    assert get_market_data_provider().get_quote('AAPL') == 148.34
+    assert urls == ['https://www.alphavantage.co/query?function=GLOBAL_QUOTE&symbol=AAPL&apikey=demo']
+
+
+def test_alpha_vantage_provider_failed_response(new_stock, monkeypatch):
+    """
+    GIVEN a Flask application configured for testing and a monkeypatched version of requests.Session.get()
+    WHEN the Alpha Vantage provider receives a failed response
+    THEN check that no data is returned
+    """
+    def mock_get(self, url, **kwargs):
+        return MockFailedResponse(url)
+
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
+    provider = get_market_data_provider()
+    assert provider.get_quote('AAPL') == 0.0
+    assert provider.get_weekly_series('AAPL') is None
+    assert provider.get_overview('AAPL') is None
+    assert provider.get_batch_quotes(['AAPL']) is None
+
+
+def test_alpha_vantage_provider_record(new_stock, monkeypatch, tmp_path):
+    """
+    GIVEN a Flask application configured for testing and a monkeypatched version of requests.Session.get()
+    WHEN the Alpha Vantage provider records the payloads
+    THEN check that the recorded payload is served by the replay provider
+    """
+    def mock_get(self, url, **kwargs):
+        return MockSuccessResponseQuote(url)
+
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
+    AlphaVantageProvider('demo', record_path=str(tmp_path)).get_quote('AAPL')
+    assert (tmp_path / 'GLOBAL_QUOTE_AAPL.json').exists()
+
+    def mock_get_unavailable(self, url, **kwargs):
+        raise AssertionError('The replay provider must not make any network calls')
+
+    monkeypatch.setattr(requests.Session, 'get', mock_get_unavailable)
+    assert ReplayProvider(str(tmp_path)).get_quote('AAPL') == 148.34
+
+
+def test_alpha_vantage_provider_weekly_csv(new_stock, monkeypatch):
+    """
+    GIVEN a Flask application configured for testing and a monkeypatched version of requests.Session.get()
+    WHEN the weekly prices are retrieved from the Alpha Vantage provider
+    THEN check that the weekly prices are retrieved as CSV, streaming the response body to the parser
+    """
+    urls = []
+    streams = []
+
+    def mock_get(self, url, **kwargs):
+        urls.append(url)
+        streams.append(kwargs['stream'])
+        return MockSuccessResponseWeekly(url)
+
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
+    assert fetch_weekly_stock_data('AAPL')['2020-07-24'] == {'4. close': '379.2400'}
+    assert urls == ['https://www.alphavantage.co/query?function=TIME_SERIES_WEEKLY_ADJUSTED'
+                    '&symbol=AAPL&apikey=demo&datatype=csv']
+    assert streams == [True]
+
+
+def test_alpha_vantage_provider_weekly_json_fallback(new_stock, monkeypatch):
+    """
+    GIVEN a Flask application configured for testing and a monkeypatched version of requests.Session.get()
+    WHEN the CSV payload of the weekly prices cannot be parsed
+    THEN check that the weekly prices are retrieved as JSON
+    """
+    class MockUnexpectedCsvResponse(MockSuccessResponseWeekly):
+        def iter_content(self, chunk_size=1, decode_unicode=False):
+            if 'datatype=csv' in self.url:
+                yield b'date,price\n2020-07-24,379.2400\n'
+            else:
+                yield from super().iter_content(chunk_size, decode_unicode)
+
+    urls = []
+
+    def mock_get(self, url, **kwargs):
+        urls.append(url)
+        return MockUnexpectedCsvResponse(url)
+
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
+    assert len(fetch_weekly_stock_data('AAPL')) == 4
+    assert [url.endswith('&datatype=csv') for url in urls] == [True, False]
+
+
+def test_replay_provider(new_stock, replay_path):
+    """
+    GIVEN a replay provider with recorded payloads
+    WHEN the market data is retrieved
+    THEN check that the recorded payloads are served, including the default payload for any stock
+    """
+    provider = ReplayProvider(replay_path)
+    assert provider.get_quote('AAPL') == 148.34
+    assert provider.get_quote('aapl') == 148.34
+    assert provider.get_batch_quotes(['AAPL', 'COST', 'MSFT']) == {'AAPL': 148.34, 'COST': 312.78}
+    assert provider.get_weekly_series('MSFT') == {'2020-07-17': {'4. close': '385.3100'}}
+
+
+def test_replay_provider_missing_payload(new_stock, replay_path):
+    """
+    GIVEN a replay provider with recorded payloads
+    WHEN market data without a recorded payload is retrieved
+    THEN check that no data is returned
+    """
+    provider = ReplayProvider(replay_path)
+    assert provider.get_quote('MSFT') == 0.0
+    assert provider.get_overview('AAPL') is None
+
+
+def test_replay_provider_error_injection(new_stock, replay_path):
+    """
+    GIVEN a replay provider with an error rate of 100%
+    WHEN the current price is retrieved
+    THEN check that the injected network error results in a price of zero
+    """
+    provider = ReplayProvider(replay_path, error_rate=1.0)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        provider.get_json('GLOBAL_QUOTE', 'AAPL')
+    assert provider.get_quote('AAPL') == 0.0
+
+
+def test_models_use_replay_provider(new_stock, monkeypatch, replay_path):
+    """
+    GIVEN a Flask application configured to use the replay provider
+    WHEN the current prices and weekly prices are retrieved
+    THEN check that the market data is served by the replay provider without any network calls
+    """
+    def mock_get(self, url, **kwargs):
+        raise AssertionError('The replay provider must not make any network calls')
+
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
+    monkeypatch.setitem(current_app.extensions, 'market_data_provider', ReplayProvider(replay_path))
+    assert get_current_stock_prices(['AAPL', 'COST']) == {'AAPL': 148.34, 'COST': 312.78}
+    assert fetch_weekly_stock_data('AAPL') == {'2020-07-17': {'4. close': '385.3100'}}
@@ -0,0 +1,101 @@
+"""
+This file (test_rate_limit.py) contains the unit tests for the market_data/rate_limit.py file.
+"""
+from project import market_data_client, quote_cache
+from project.market_data.rate_limit import RateLimiter, SingleFlight, TokenBucket
+from project.models import get_current_stock_price
+from tests.conftest import MockSuccessResponseQuote
+from flask import current_app
+from freezegun import freeze_time
+from threading import Event, Thread
+import requests
+
+
+def test_token_bucket_refill():
+    """
+    GIVEN a TokenBucket with 5 tokens per minute
+    WHEN all the tokens are taken
+    THEN check that a new token is available after 12 seconds
+    """
+    with freeze_time('2020-07-28 10:00:00') as frozen_time:
+        bucket = TokenBucket(5, 60.0)
+        for _ in range(5):
+            assert bucket.has_token()
+            bucket.take_token()
+        assert not bucket.has_token()
+        frozen_time.tick(12)
+        assert bucket.has_token()
+
+
+def test_rate_limiter_per_minute_budget(new_stock, monkeypatch):
+    """
+    GIVEN a RateLimiter configured for 2 calls per minute and 100 calls per day
+    WHEN 3 calls are attempted
+    THEN check that the third call is throttled
+    """
+    monkeypatch.setitem(current_app.config, 'ALPHA_VANTAGE_CALLS_PER_MINUTE', 2)
+    monkeypatch.setitem(current_app.config, 'ALPHA_VANTAGE_CALLS_PER_DAY', 100)
+    rate_limiter = RateLimiter()
+    rate_limiter.init_app(current_app)
+    assert rate_limiter.try_acquire()
+    assert rate_limiter.try_acquire()
+    assert not rate_limiter.try_acquire()
+    assert rate_limiter.stats()['allowed'] == 2
+    assert rate_limiter.stats()['throttled'] == 1
+    assert rate_limiter.stats()['remaining_per_day'] == 98
+
+
+def test_single_flight_coalesces_calls():
+    """
+    GIVEN a SingleFlight
+    WHEN a second call for the same key is made while the first call is in flight
+    THEN check that the function is only called once and both callers receive the result
+    """
+    single_flight = SingleFlight()
+    started = Event()
+    release = Event()
+    calls = []
+    results = []
+
+    def slow_call():
+        calls.append(1)
+        started.set()
+        release.wait()
+        return 148.34
+
+    leader = Thread(target=lambda: results.append(single_flight.do('AAPL', slow_call)))
+    leader.start()
+    started.wait()
+    follower = Thread(target=lambda: results.append(single_flight.do('AAPL', slow_call)))
+    follower.start()
+    while single_flight.coalesced == 0:
+        pass
+    release.set()
+    leader.join()
+    follower.join()
+    assert len(calls) == 1
+    assert results == [148.34, 148.34]
+
+
+def test_get_current_stock_price_budget_exhausted(new_stock, monkeypatch):
+    """
+    GIVEN a Flask application configured with a budget of 1 call per minute and a monkeypatched
+          version of requests.Session.get()
+    WHEN the current price is retrieved after the cached price has expired and the budget is used up
+    THEN check that no call is made and the last known price is returned
+    """
+    urls = []
+
+    def mock_get(self, url, **kwargs):
+        urls.append(url)
+        return MockSuccessResponseQuote(url)
+
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
+    monkeypatch.setattr(market_data_client.rate_limiter, '_buckets', [TokenBucket(1, 60.0)])
+    monkeypatch.setattr(market_data_client.rate_limiter, 'throttled', 0)
+    monkeypatch.setattr(quote_cache, 'ttl', -1)  # Cached prices expire immediately
+
+    assert get_current_stock_price('AAPL') == 148.34
+    assert get_current_stock_price('AAPL') == 148.34
+    assert len(urls) == 1
+    assert market_data_client.stats()['throttled'] == 1
@@ -0,0 +1,185 @@
+"""
+This file (test_resilience.py) contains the unit tests for the market_data/resilience.py file.
+"""
+from project import market_data_client, quote_cache
+from project.market_data.resilience import BackgroundRevalidator, CircuitBreaker
+from project.models import SecurityFundamentals, get_current_stock_prices, get_market_data_deadline, run_concurrently
+from flask import current_app
+from threading import Event
+from tests.conftest import MockSuccessResponseQuote
+import requests
+import time
+
+
+def test_circuit_breaker_opens_after_consecutive_failures():
+    """
+    GIVEN a CircuitBreaker with a failure threshold of 3
+    WHEN there are 3 consecutive failures
+    THEN check that the circuit is opened and the calls are rejected
+    """
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60.0)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == 'closed'
+    assert breaker.allow_request()
+
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert not breaker.allow_request()
+    assert breaker.stats()['rejected'] == 1
+
+
+def test_circuit_breaker_half_open():
+    """
+    GIVEN an open CircuitBreaker
+    WHEN the reset timeout has elapsed
+    THEN check that a single trial call is allowed and that a successful call closes the circuit
+    """
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.state == 'half-open'
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    assert breaker.allow_request()
+
+
+def test_circuit_breaker_disabled():
+    """
+    GIVEN a CircuitBreaker with a failure threshold of 0
+    WHEN there are many consecutive failures
+    THEN check that the calls are still allowed
+    """
+    breaker = CircuitBreaker(failure_threshold=0)
+    for _ in range(10):
+        breaker.record_failure()
+    assert breaker.allow_request()
+
+
+def test_client_circuit_breaker(new_stock, monkeypatch):
+    """
+    GIVEN a Flask application with the circuit breaker enabled and a monkeypatched version of requests.Session.get()
+    WHEN the GET calls repeatedly time out
+    THEN check that the calls are no longer made once the circuit is open
+    """
+    calls = []
+
+    def mock_get(self, url, **kwargs):
+        calls.append(url)
+        raise requests.exceptions.Timeout()
+
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
+    monkeypatch.setattr(market_data_client, 'circuit_breaker', CircuitBreaker(failure_threshold=2))
+    monkeypatch.setitem(current_app.config, 'MARKET_DATA_MAX_CONCURRENCY', 1)
+    current_prices = get_current_stock_prices(['AAPL', 'COST', 'MSFT', 'SAM'])
+    assert current_prices == {'AAPL': 0.0, 'COST': 0.0, 'MSFT': 0.0, 'SAM': 0.0}
+    assert len(calls) == 2
+    assert market_data_client.stats()['circuit_state'] == 'open'
+
+
+def test_run_concurrently_deadline(new_stock):
+    """
+    GIVEN a Flask application configured for testing
+    WHEN one of the calls does not complete before the deadline
+    THEN check that the default result is returned for that call without waiting for it
+    """
+    unblock = Event()
+
+    def function(item):
+        if item == 'hung':
+            unblock.wait(5.0)
+        return item
+
+    start = time.monotonic()
+    assert run_concurrently(function, ['AAPL', 'hung'], default=None,
+                            deadline=time.monotonic() + 0.1) == ['AAPL', None]
+    assert time.monotonic() - start < 1.0
+    unblock.set()
+
+
+def test_get_current_stock_prices_deadline(new_stock, monkeypatch):
+    """
+    GIVEN a Flask application and a monkeypatched version of requests.Session.get() that hangs
+    WHEN the current prices are retrieved within a request
+    THEN check that the last known price is returned once the deadline is exceeded
+    """
+    unblock = Event()
+
+    def mock_get(self, url, **kwargs):
+        unblock.wait(5.0)
+        return MockSuccessResponseQuote(url)
+
+    # Store an expired price for one of the stocks
+    monkeypatch.setattr(quote_cache, 'ttl', -1.0)
+    quote_cache.set('AAPL', 140.25)
+
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
+    monkeypatch.setitem(current_app.config, 'MARKET_DATA_DEADLINE', 0.1)
+    with current_app.test_request_context('/stocks'):
+        assert get_current_stock_prices(['AAPL', 'COST']) == {'AAPL': 140.25, 'COST': 0.0}
+    unblock.set()
+
+
+def test_get_market_data_deadline_shared_by_request(new_stock, monkeypatch):
+    """
+    GIVEN a Flask application with a deadline for the market data
+    WHEN the deadline is requested several times within the same request
+    THEN check that the same deadline is returned, and that there is no deadline outside of a request
+    """
+    monkeypatch.setitem(current_app.config, 'MARKET_DATA_DEADLINE', 8.0)
+    assert get_market_data_deadline() is None
+    with current_app.test_request_context('/watchlist'):
+        deadline = get_market_data_deadline()
+        time.sleep(0.01)
+        assert get_market_data_deadline() == deadline
+
+
+def test_retrieve_stale_stock_analysis_data_deadline(new_stock, monkeypatch):
+    """
+    GIVEN a Flask application and a monkeypatched version of requests.Session.get() that hangs
+    WHEN the stale stock analysis data is retrieved within a request
+    THEN check that the retrieval returns once the deadline is exceeded, without any data stored
+    """
+    unblock = Event()
+
+    def mock_get(self, url, **kwargs):
+        unblock.wait(5.0)
+        return MockSuccessResponseQuote(url)
+
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
+    monkeypatch.setitem(current_app.config, 'MARKET_DATA_DEADLINE', 0.1)
+    start = time.monotonic()
+    with current_app.test_request_context('/watchlist'):
+        assert SecurityFundamentals.retrieve_stale(['AAPL', 'COST']) == {}
+    assert time.monotonic() - start < 1.0
+    unblock.set()
+
+
+def test_background_revalidator(new_stock):
+    """
+    GIVEN a BackgroundRevalidator
+    WHEN the same refresh is submitted while it is in progress
+    THEN check that the refresh is only run once
+    """
+    revalidator = BackgroundRevalidator(max_workers=2)
+    unblock = Event()
+    calls = []
+
+    def refresh(symbol):
+        unblock.wait(5.0)
+        calls.append(symbol)
+
+    app = current_app._get_current_object()
+    assert revalidator.submit(app, 'AAPL', refresh, 'AAPL')
+    assert not revalidator.submit(app, 'AAPL', refresh, 'AAPL')
+    unblock.set()
+    revalidator.wait()
+    assert calls == ['AAPL']
+    assert revalidator.submit(app, 'AAPL', refresh, 'AAPL')
+    revalidator.wait()
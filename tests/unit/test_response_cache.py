@@ -0,0 +1,148 @@
+"""
+This file (test_response_cache.py) contains the unit tests for the market_data/response_cache.py file.
+"""
+from project import response_cache
+from project.market_data.providers import get_market_data_provider
+from project.market_data.response_cache import ResponseCache
+from flask import current_app
+from tests.conftest import MockApiRateLimitExceededResponse, MockSuccessResponseQuote, MockSuccessResponseWeekly
+from datetime import datetime
+import pytest
+import requests
+
+
+@pytest.fixture(scope='function')
+def enabled_response_cache(new_stock, monkeypatch, tmp_path):
+    monkeypatch.setitem(current_app.config, 'MARKET_DATA_RESPONSE_CACHE', True)
+    monkeypatch.setitem(current_app.config, 'MARKET_DATA_RESPONSE_CACHE_PATH', str(tmp_path / 'cache.sqlite'))
+    response_cache.init_app(current_app)
+    yield response_cache
+    response_cache.enabled = False
+
+
+def test_response_cache_set_get(tmp_path):
+    """
+    GIVEN a ResponseCache
+    WHEN a response is stored
+    THEN check that the response is returned by any ResponseCache using the same database
+    """
+    cache = ResponseCache()
+    cache.enabled = True
+    cache.path = str(tmp_path / 'cache.sqlite')
+    cache._create_table()
+    cache.set('GLOBAL_QUOTE', 'aapl', {'Global Quote': {'05. price': '148.3400'}})
+    assert cache.get('GLOBAL_QUOTE', 'AAPL') == {'Global Quote': {'05. price': '148.3400'}}
+    assert cache.get('OVERVIEW', 'AAPL') is None
+
+    other_cache = ResponseCache()
+    other_cache.path = cache.path
+    assert other_cache.get('GLOBAL_QUOTE', 'AAPL') == {'Global Quote': {'05. price': '148.3400'}}
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_response_cache_expiry(tmp_path):
+    """
+    GIVEN a ResponseCache
+    WHEN a stored response has expired
+    THEN check that the response is not returned
+    """
+    cache = ResponseCache()
+    cache.path = str(tmp_path / 'cache.sqlite')
+    cache._create_table()
+    cache.ttls['GLOBAL_QUOTE'] = -1.0
+    cache.set('GLOBAL_QUOTE', 'AAPL', {'Global Quote': {}})
+    assert cache.get('GLOBAL_QUOTE', 'AAPL') is None
+
+
+def test_response_cache_eviction(tmp_path):
+    """
+    GIVEN a ResponseCache with a maximum size
+    WHEN the stored responses exceed the maximum size
+    THEN check that the responses that expire first are evicted, however recently they were read
+    """
+    cache = ResponseCache()
+    cache.enabled = True
+    cache.path = str(tmp_path / 'cache.sqlite')
+    cache._create_table()
+    cache.set('OVERVIEW', 'AAPL', {'Description': 'A' * 1000})
+    cache.max_bytes = cache.stats()['size'] * 2
+    cache.set('OVERVIEW', 'COST', {'Description': 'C' * 1000})
+    assert cache.get('OVERVIEW', 'AAPL') is not None
+    cache.set('OVERVIEW', 'MSFT', {'Description': 'M' * 1000})
+    assert cache.get('OVERVIEW', 'AAPL') is None
+    assert cache.get('OVERVIEW', 'COST') is not None
+    assert cache.get('OVERVIEW', 'MSFT') is not None
+    assert cache.stats()['evictions'] == 1
+
+
+def test_response_cache_get_is_read_only(tmp_path):
+    """
+    GIVEN a ResponseCache with a stored response
+    WHEN the response is retrieved
+    THEN check that the database is not written and that the connection of the thread is reused
+    """
+    cache = ResponseCache()
+    cache.enabled = True
+    cache.path = str(tmp_path / 'cache.sqlite')
+    cache._create_table()
+    cache.set('GLOBAL_QUOTE', 'AAPL', {'Global Quote': {'05. price': '148.3400'}})
+    connection = cache._connect()
+    total_changes = connection.total_changes
+
+    assert cache.get('GLOBAL_QUOTE', 'AAPL') == {'Global Quote': {'05. price': '148.3400'}}
+    assert cache._connect() is connection
+    assert connection.total_changes == total_changes
+
+
+def test_provider_uses_response_cache(enabled_response_cache, monkeypatch):
+    """
+    GIVEN a Flask application with the response cache enabled and a monkeypatched version of requests.Session.get()
+    WHEN the current price is retrieved twice
+    THEN check that the API is only called once
+    """
+    urls = []
+
+    def mock_get(self, url, **kwargs):
+        urls.append(url)
+        return MockSuccessResponseQuote(url)
+
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
+    assert get_market_data_provider().get_quote('AAPL') == 148.34
+    assert get_market_data_provider().get_quote('AAPL') == 148.34
+    assert len(urls) == 1
+
+
+def test_provider_does_not_cache_invalid_response(enabled_response_cache, monkeypatch):
+    """
+    GIVEN a Flask application with the response cache enabled and a monkeypatched version of requests.Session.get()
+    WHEN the API rate limit is exceeded
+    THEN check that the response is not stored in the response cache
+    """
+    def mock_get(self, url, **kwargs):
+        return MockApiRateLimitExceededResponse(url)
+
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
+    assert get_market_data_provider().get_quote('AAPL') == 0.0
+    assert enabled_response_cache.stats()['entries'] == 0
+
+
+def test_provider_does_not_cache_partial_time_series(enabled_response_cache, monkeypatch):
+    """
+    GIVEN a Flask application with the response cache enabled and a monkeypatched version of requests.Session.get()
+    WHEN the weekly prices since a start date are retrieved
+    THEN check that only the weeks since the start date are parsed and that they are not stored in the response cache
+    """
+    def mock_get(self, url, **kwargs):
+        return MockSuccessResponseWeekly(url)
+
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
+    provider = get_market_data_provider()
+    assert provider.get_weekly_series('AAPL', datetime(2020, 7, 20)) == {
+        '2020-07-24': {'4. close': '379.2400'},
+        '2020-07-17': {'4. close': '362.7600'},
+    }
+    assert enabled_response_cache.stats()['entries'] == 0
+
+    assert len(provider.get_weekly_series('AAPL')) == 4
+    assert enabled_response_cache.stats()['entries'] == 1
@@ -0,0 +1,136 @@
+"""
+This file (test_series.py) contains the unit tests for the market_data/series.py file.
+"""
+from project.market_data.series import WeeklySeries, parse_time_series, parse_time_series_csv
+from tests.conftest import MockSuccessResponseWeekly
+from datetime import datetime
+import json
+import pytest
+
+
+def test_weekly_series_sorted_oldest_to_latest():
+    """
+    GIVEN a weekly time series from Alpha Vantage (ordered latest to oldest)
+    WHEN a WeeklySeries is created
+    THEN check that the dates and closing prices are sorted from oldest to latest
+    """
+    time_series = MockSuccessResponseWeekly('').json()['Weekly Adjusted Time Series']
+    weekly_series = WeeklySeries.from_time_series(time_series)
+    assert len(weekly_series) == 4
+    assert weekly_series.dates == ['2020-02-25', '2020-06-11', '2020-07-17', '2020-07-24']
+    assert weekly_series.values() == [432.98, 354.34, 362.76, 379.24]
+
+
+def test_weekly_series_since():
+    """
+    GIVEN a WeeklySeries
+    WHEN the weeks since a start date are requested
+    THEN check that the weeks after (or from) the start date are returned
+    """
+    time_series = MockSuccessResponseWeekly('').json()['Weekly Adjusted Time Series']
+    weekly_series = WeeklySeries.from_time_series(time_series)
+    assert weekly_series.since(datetime(2020, 6, 11)).dates == ['2020-07-17', '2020-07-24']
+    assert weekly_series.since(datetime(2020, 6, 11), inclusive=True).dates == ['2020-06-11', '2020-07-17', '2020-07-24']
+    assert weekly_series.since(datetime(2020, 5, 5)).labels() == [datetime(2020, 6, 11),
+                                                                 datetime(2020, 7, 17),
+                                                                 datetime(2020, 7, 24)]
+    assert weekly_series.since(datetime(2020, 5, 5)).values() == [354.34, 362.76, 379.24]
+    assert len(weekly_series.since(datetime(2020, 7, 24))) == 0
+
+
+def test_weekly_series_from_time_series_start_date():
+    """
+    GIVEN a weekly time series from Alpha Vantage
+    WHEN a WeeklySeries is created with a start date
+    THEN check that only the weeks from the start date are included
+    """
+    time_series = MockSuccessResponseWeekly('').json()['Weekly Adjusted Time Series']
+    weekly_series = WeeklySeries.from_time_series(time_series, datetime(2020, 7, 17), inclusive=True)
+    assert weekly_series.dates == ['2020-07-17', '2020-07-24']
+    assert weekly_series.values() == [362.76, 379.24]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 64, 100000])
+def test_parse_time_series(chunk_size):
+    """
+    GIVEN the JSON payload of a weekly time series from Alpha Vantage split into chunks
+    WHEN the time series is parsed from the chunks
+    THEN check that only the closing prices are kept for every week
+    """
+    content = json.dumps(MockSuccessResponseWeekly('').json(), indent=2).encode()
+    chunks = [content[index:index + chunk_size] for index in range(0, len(content), chunk_size)]
+    assert parse_time_series(chunks, 'Weekly Adjusted Time Series') == {
+        'Weekly Adjusted Time Series': {
+            '2020-07-24': {'4. close': '379.2400'},
+            '2020-07-17': {'4. close': '362.7600'},
+            '2020-06-11': {'4. close': '354.3400'},
+            '2020-02-25': {'4. close': '432.9800'},
+        }
+    }
+
+
+def test_parse_time_series_start_date():
+    """
+    GIVEN the JSON payload of a weekly time series from Alpha Vantage
+    WHEN the time series is parsed with a start date
+    THEN check that the parsing stops at the first week before the start date
+    """
+    def chunks():
+        content = json.dumps(MockSuccessResponseWeekly('').json())
+        yield content[:120]
+        yield content[120:]
+        raise AssertionError('The chunks after the start date must not be read')
+
+    time_series = parse_time_series(chunks(), 'Weekly Adjusted Time Series', start_date=datetime(2020, 7, 20))
+    assert list(time_series['Weekly Adjusted Time Series']) == ['2020-07-24', '2020-07-17']
+
+
+def test_parse_time_series_without_time_series():
+    """
+    GIVEN the JSON payload from Alpha Vantage when the API rate limit has been exceeded
+    WHEN the time series is parsed
+    THEN check that the entire payload is returned
+    """
+    content = b'{"Note": "Thank you for using Alpha Vantage!"}'
+    chunks = [content[index:index + 5] for index in range(0, len(content), 5)]
+    assert parse_time_series(chunks, 'Weekly Adjusted Time Series') == {'Note': 'Thank you for using Alpha Vantage!'}
+    assert parse_time_series([b'{"Weekly Adjusted Time Series": {}}'], 'Weekly Adjusted Time Series') == \
+        {'Weekly Adjusted Time Series': {}}
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 64, 100000])
+def test_parse_time_series_csv(chunk_size):
+    """
+    GIVEN the CSV payload of a weekly time series from Alpha Vantage split into chunks
+    WHEN the time series is parsed from the chunks
+    THEN check that the closing prices are returned in the same format as the JSON payload
+    """
+    content = MockSuccessResponseWeekly('datatype=csv')
+    chunks = b''.join(content.iter_content())
+    chunks = [chunks[index:index + chunk_size] for index in range(0, len(chunks), chunk_size)]
+    assert parse_time_series_csv(chunks, 'Weekly Adjusted Time Series') == \
+        parse_time_series(MockSuccessResponseWeekly('').iter_content(), 'Weekly Adjusted Time Series')
+    time_series = parse_time_series_csv(chunks, 'Weekly Adjusted Time Series', start_date=datetime(2020, 7, 20))
+    assert list(time_series['Weekly Adjusted Time Series']) == ['2020-07-24', '2020-07-17']
+
+
+def test_parse_time_series_csv_json_payload():
+    """
+    GIVEN the JSON payload from Alpha Vantage when the API rate limit has been exceeded (with datatype=csv)
+    WHEN the time series is parsed as CSV
+    THEN check that the JSON payload is returned
+    """
+    assert parse_time_series_csv([b'\n{"Note": ', b'"Thank you"}'], 'Weekly Adjusted Time Series') == \
+        {'Note': 'Thank you'}
+
+
+def test_parse_time_series_csv_invalid():
+    """
+    GIVEN a CSV payload without the expected columns
+    WHEN the time series is parsed as CSV
+    THEN check that a ValueError is raised
+    """
+    with pytest.raises(ValueError):
+        parse_time_series_csv([b'date,price\n2020-07-24,379.24\n'], 'Weekly Adjusted Time Series')
+    with pytest.raises(ValueError):
+        parse_time_series_csv([], 'Weekly Adjusted Time Series')